@@ -8,12 +8,21 @@ Descripción:
     Calcula las transacciones por segundo (TPS) de un Gateway específico 
     en Diafaan utilizando una consulta a SQL Server.
     Retorna códigos compatibles con Nagios y métricas para PNP4Nagios.
+    Con --todas o --gateways calcula el TPS de varios gateways con una sola
+    consulta agrupada (GROUP BY Gateway) y umbrales por gateway.
+    Las consultas son parametrizadas y se ejecutan a través del pool de
+    sqlserver_db.py, que reutiliza conexiones y sentencias preparadas.
+    Con --tiempos agrega a la salida los tiempos de espera, conexión,
+    ejecución y lectura de la consulta como perfdata.
 
 Uso:
-    python GW_TPS.py <GatewayName>
+    python GW_TPS.py <GatewayName> [--warning N] [--critical N] [--umbral GW=WARN:CRIT]
+    python GW_TPS.py --todas [--umbral GW=WARN:CRIT ...]
+    python GW_TPS.py --gateways GW1,GW2 [--warning N] [--critical N]
 
 Ejemplo:
     python GW_TPS.py SMPP_Gateway_1
+    python GW_TPS.py --todas --umbral SMPP_Gateway_1=10:2
 
 Dependencias:
     - Python 3.x
@@ -21,104 +30,276 @@ Dependencias:
 
 Archivos requeridos:
     - Setting.ini   → contiene parámetros de conexión SQL (sección [sqlodbc])
+                      y opcionalmente umbrales por gateway (sección [tps_umbrales],
+                      formato: NombreGateway = warning, critical)
     - License.py    → contiene función get_expiration_date()
 
-
+Las funciones de consulta y evaluación pueden ser importadas por
+monitor_daemon.py para servir el check desde una conexión persistente.
 """
 
 import pyodbc
 import argparse
-import sys
-import configparser
-import importlib.util
-from datetime import datetime
-
-# Archivos de configuración (ajustar según entorno)
-db_config_path = r'C:\turuta\Monitor\OTP\Setting.ini'
-license_config_path = r'C:\turuta\Monitor\OTP\License.py'
-
-# Leer configuración de base de datos desde Setting.ini
-db_config = configparser.ConfigParser()
-db_config.read(db_config_path)
-
-# Cargar License.py desde la ruta especificada
-spec = importlib.util.spec_from_file_location("license_config", license_config_path)
-license_config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(license_config)
-
-# Validar fecha de expiración de licencia
-try:
-    expiration_date_str = license_config.get_expiration_date()
-    expiration_date = datetime.strptime(expiration_date_str, '%Y-%m-%d').date()
-
-    if datetime.today().date() > expiration_date:
-        print("CRITICAL: El script ha caducado.")
-        sys.exit(2)
-except AttributeError:
-    print("ERROR: No se encontró la fecha de expiración en License.py")
-    sys.exit(1)
-
-# Argumentos de entrada
-parser = argparse.ArgumentParser(
-    description="Script para calcular las transacciones por segundo (TPS) de un gateway específico."
+
+from sqlserver_db import db_desde_config, perfdata_tiempos
+
+from monitor_comun import (
+    DB_CONFIG_PATH, LICENSE_CONFIG_PATH, STATE_OK, STATE_WARNING,
+    STATE_CRITICAL, STATE_UNKNOWN, claves_originales, leer_configuracion, salir,
+    verificar_licencia_o_salir,
 )
-parser.add_argument("gateway_name", help="Nombre del gateway a verificar.")
-args = parser.parse_args()
 
-gateway_name = args.gateway_name
 warning_threshold = 4
 critical_threshold = 1
 
-# Validar parámetros de conexión
-if 'sqlodbc' in db_config:
-    conn_str = (
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        description="Script para calcular las transacciones por segundo (TPS) de un gateway específico."
+    )
+    parser.add_argument("gateway_name", nargs='?', help="Nombre del gateway a verificar.")
+    parser.add_argument("--todas", action='store_true',
+                        help="Calcular el TPS de todos los gateways con una sola consulta agrupada.")
+    parser.add_argument("--gateways", help="Lista de gateways separados por coma (una sola consulta agrupada).")
+    parser.add_argument("--umbral", action='append', default=[], metavar='GW=WARN:CRIT',
+                        help="Umbral por gateway (repetible; también con un solo gateway).")
+    parser.add_argument("--warning", type=float, default=warning_threshold,
+                        help=f"Umbral de advertencia por defecto (default: {warning_threshold}).")
+    parser.add_argument("--critical", type=float, default=critical_threshold,
+                        help=f"Umbral crítico por defecto (default: {critical_threshold}).")
+    parser.add_argument("--tiempos", action='store_true',
+                        help="Agregar los tiempos de la consulta SQL como perfdata.")
+    return parser
+
+
+def validar_args(args):
+    """
+    Devuelve un mensaje de error si la combinación de argumentos no es válida, o None.
+    """
+    multiple = args.todas or args.gateways
+    if args.gateway_name and multiple:
+        return "ERROR: Indicar un gateway o --todas/--gateways, no ambos."
+    if not args.gateway_name and not multiple:
+        return "ERROR: Indicar el nombre del gateway, --todas o --gateways."
+    return None
+
+
+def cadena_conexion(db_config):
+    """
+    Construye la cadena ODBC desde la sección [sqlodbc], o None si no existe.
+    """
+    if 'sqlodbc' not in db_config:
+        return None
+    return (
         f"DRIVER={db_config.get('sqlodbc', 'driver')};"
         f"SERVER={db_config.get('sqlodbc', 'server')};"
         f"DATABASE={db_config.get('sqlodbc', 'database')};"
         f"UID={db_config.get('sqlodbc', 'uid')};"
         f"PWD={db_config.get('sqlodbc', 'pwd')};"
     )
-else:
-    print("ERROR: No se encontró la sección 'sqlodbc' en el archivo de configuración.")
-    sys.exit(1)
 
-# Ejecutar consulta a SQL Server
-try:
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
 
-    sql_query = f"""
+# Texto fijo de la consulta: el gateway viaja como parámetro y SQL Server reutiliza el plan
+tps_query = """
+    SELECT 
+        CAST (COUNT(*) AS decimal(18,10)) / 60.0 AS TPS
+    FROM dbo.messagelog
+    WHERE SendTime >= DATEADD(second, -60, GETDATE())
+    AND Gateway = ?;
+"""
+
+
+def consultar_tps(db, gateway_name):
+    """
+    Ejecuta la consulta de TPS de un gateway y devuelve (fila, tiempos).
+    """
+    filas, tiempos = db.consulta(tps_query, (gateway_name,))
+    return (filas[0] if filas else None), tiempos
+
+
+def cargar_umbrales(db_config, args):
+    """
+    Combina los umbrales de la sección [tps_umbrales] y de --umbral.
+    Devuelve un dict {nombre_en_minúsculas: (warning, critical)}.
+    configparser normaliza las claves a minúsculas, por eso la búsqueda
+    de gateways no distingue mayúsculas.
+    """
+    umbrales = {}
+    if db_config is not None and 'tps_umbrales' in db_config:
+        for nombre, valor in db_config.items('tps_umbrales'):
+            warning, critical = (float(v) for v in valor.split(','))
+            umbrales[nombre.lower()] = (warning, critical)
+    for definicion in args.umbral:
+        nombre, valor = definicion.rsplit('=', 1)
+        warning, critical = (float(v) for v in valor.split(':'))
+        umbrales[nombre.lower()] = (warning, critical)
+    return umbrales
+
+
+def consultar_tps_agrupado(db, gateways=None):
+    """
+    Ejecuta una sola consulta agrupada por Gateway sobre el último minuto.
+    Si se entrega una lista de gateways se filtra con parámetros.
+    Devuelve ({gateway: tps}, tiempos).
+    """
+    sql_query = """
         SELECT 
+            Gateway,
             CAST (COUNT(*) AS decimal(18,10)) / 60.0 AS TPS
         FROM dbo.messagelog
         WHERE SendTime >= DATEADD(second, -60, GETDATE())
-        AND Gateway = '{gateway_name}';
     """
+    params = []
+    if gateways:
+        sql_query += f"AND Gateway IN ({','.join('?' for _ in gateways)})\n"
+        params = list(gateways)
+    sql_query += "GROUP BY Gateway;"
+
+    filas, tiempos = db.consulta(sql_query, params)
+    return {gateway: tps for gateway, tps in filas}, tiempos
+
+
+def evaluar_tps_multiple(tps_por_gateway, esperados, umbrales, default_warning, default_critical):
+    """
+    Evalúa el TPS de cada gateway contra su umbral y devuelve (estado, salida).
+    Los gateways esperados sin tráfico en el intervalo se reportan con 0 TPS.
+    La comparación no distingue mayúsculas, igual que la intercalación de
+    SQL Server: un esperado con tráfico queda con el nombre que trae la base.
+    """
+    resultados = dict(tps_por_gateway)
+    conocidos = {g.lower() for g in resultados}
+    for gateway in esperados:
+        if gateway.lower() not in conocidos:
+            resultados[gateway] = 0
+            conocidos.add(gateway.lower())
+
+    if not resultados:
+        return STATE_UNKNOWN, "UNKNOWN: No se encontraron transacciones en el intervalo de tiempo especificado."
+
+    estado = STATE_OK
+    criticos, advertencias, perfdata = [], [], []
+    for gateway in sorted(resultados):
+        tps = resultados[gateway]
+        warning, critical = umbrales.get(gateway.lower(), (default_warning, default_critical))
+        # Etiqueta en minúsculas: estable aunque el nombre venga de [tps_umbrales]
+        perfdata.append(f"'tps_{gateway.lower()}'={tps:.2f};{warning:g};{critical:g};0;")
+        if tps < critical:
+            criticos.append(f"{gateway}={tps:.2f}")
+            estado = STATE_CRITICAL
+        elif tps < warning:
+            advertencias.append(f"{gateway}={tps:.2f}")
+            estado = max(estado, STATE_WARNING)
+
+    total = len(resultados)
+    performance_data = " ".join(perfdata)
+    if estado == STATE_CRITICAL:
+        detalle = ", ".join(criticos + advertencias)
+        return estado, f"CRITICAL: {len(criticos)}/{total} gateways bajo umbral crítico de TPS ({detalle}) | {performance_data}"
+    elif estado == STATE_WARNING:
+        return estado, f"WARNING: {len(advertencias)}/{total} gateways bajo umbral de TPS ({', '.join(advertencias)}) | {performance_data}"
+    return estado, f"OK: TPS sobre umbral en {total} gateways | {performance_data}"
+
+
+def umbral_gateway(gateway_name, umbrales, args):
+    """
+    (warning, critical) de un gateway: el de [tps_umbrales]/--umbral o los
+    de --warning/--critical.
+    """
+    return umbrales.get(gateway_name.lower(), (args.warning, args.critical))
 
-    cursor.execute(sql_query)
-    result = cursor.fetchone()
 
+def evaluar_tps(gateway_name, result, warning=warning_threshold, critical=critical_threshold):
+    """
+    Evalúa el resultado de la consulta y devuelve (estado, salida) para Nagios.
+    """
     if result:
         tps = result[0]
-        performance_data = f"tps={tps:.2f};{warning_threshold};{critical_threshold};0;"
-
-        if tps < critical_threshold:
-            print(f"CRITICAL: {tps:.2f} TPS en gateway {gateway_name} | {performance_data}")
-            sys.exit(2)
-        elif tps < warning_threshold:
-            print(f"WARNING: {tps:.2f} TPS en gateway {gateway_name} | {performance_data}")
-            sys.exit(1)
+        performance_data = f"tps={tps:.2f};{warning:g};{critical:g};0;"
+
+        if tps < critical:
+            return STATE_CRITICAL, f"CRITICAL: {tps:.2f} TPS en gateway {gateway_name} | {performance_data}"
+        elif tps < warning:
+            return STATE_WARNING, f"WARNING: {tps:.2f} TPS en gateway {gateway_name} | {performance_data}"
         else:
-            print(f"OK: {tps:.2f} TPS en gateway {gateway_name} | {performance_data}")
-            sys.exit(0)
+            return STATE_OK, f"OK: {tps:.2f} TPS en gateway {gateway_name} | {performance_data}"
+    else:
+        return STATE_UNKNOWN, f"UNKNOWN: No se encontraron transacciones para el gateway '{gateway_name}' en el intervalo de tiempo especificado."
+
+
+def agregar_tiempos(salida, tiempos):
+    """
+    Agrega los tiempos de la consulta a la perfdata de la salida.
+    """
+    separador = " " if "|" in salida else " | "
+    return f"{salida}{separador}{perfdata_tiempos(tiempos)}"
+
+
+def ejecutar_check(db, args, db_config=None, config_path=DB_CONFIG_PATH):
+    """
+    Ejecuta el check completo sobre el pool de SQL Server y devuelve (estado, salida).
+    `args` es el resultado de crear_parser().parse_args(); `config_path` es
+    el Setting.ini de `db_config` (nombres originales de [tps_umbrales]).
+    """
+    try:
+        estado, salida, tiempos = _ejecutar(db, args, db_config, config_path)
+    except ValueError as e:
+        return STATE_UNKNOWN, f"UNKNOWN: Umbral de TPS inválido: {e}"
+    except pyodbc.Error as e:
+        return STATE_UNKNOWN, f"UNKNOWN: Error al conectarse a la base de datos o ejecutar la consulta: {e}"
+    if args.tiempos:
+        salida = agregar_tiempos(salida, tiempos)
+    return estado, salida
+
+
+def _ejecutar(db, args, db_config, config_path):
+    umbrales = cargar_umbrales(db_config, args)
+    if args.gateway_name:
+        fila, tiempos = consultar_tps(db, args.gateway_name)
+        warning, critical = umbral_gateway(args.gateway_name, umbrales, args)
+        return (*evaluar_tps(args.gateway_name, fila, warning, critical), tiempos)
+
+    if args.gateways:
+        esperados = [g.strip() for g in args.gateways.split(',') if g.strip()]
+        tps_por_gateway, tiempos = consultar_tps_agrupado(db, esperados)
     else:
-        print(f"UNKNOWN: No se encontraron transacciones para el gateway '{gateway_name}' en el intervalo de tiempo especificado.")
-        sys.exit(3)
+        # En modo --todas, los gateways con umbral configurado se esperan aunque no tengan tráfico
+        esperados = []
+        if db_config is not None and 'tps_umbrales' in db_config:
+            # configparser entrega las claves en minúsculas; se reportan como están escritas
+            originales = claves_originales(config_path, 'tps_umbrales')
+            esperados = [originales.get(g, g) for g in db_config['tps_umbrales']]
+        tps_por_gateway, tiempos = consultar_tps_agrupado(db)
+    estado, salida = evaluar_tps_multiple(tps_por_gateway, esperados, umbrales, args.warning, args.critical)
+    return estado, salida, tiempos
+
+
+def main():
+    # Leer configuración de base de datos desde Setting.ini
+    db_config = leer_configuracion(DB_CONFIG_PATH)
+
+    # Validar fecha de expiración de licencia
+    verificar_licencia_o_salir(LICENSE_CONFIG_PATH)
+
+    # Argumentos de entrada
+    args = crear_parser().parse_args()
+    error = validar_args(args)
+    if error:
+        salir(STATE_UNKNOWN, error)
+
+    # Validar parámetros de conexión
+    conn_str = cadena_conexion(db_config)
+    if conn_str is None:
+        salir(1, "ERROR: No se encontró la sección 'sqlodbc' en el archivo de configuración.")
+
+    # Ejecutar consulta a SQL Server
+    db = db_desde_config(db_config, conn_str)
+    try:
+        estado, salida = ejecutar_check(db, args, db_config)
+    finally:
+        db.cerrar()
+
+    salir(estado, salida)
 
-except pyodbc.Error as e:
-    print(f"UNKNOWN: Error al conectarse a la base de datos o ejecutar la consulta: {e}")
-    sys.exit(3)
 
-finally:
-    if 'conn' in locals() and conn is not None:
-        conn.close()
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,21 @@
 #    Verifica el estado de un Gateway en Diafaan a través de su API XML.
 #    Integra con Nagios y envía alertas por correo electrónico cuando 
 #    se detectan cambios de estado (caída o recuperación).
-#    Además registra eventos en un log y guarda el estado previo en un archivo.
+#    Las alertas se encolan en el spool de notificador.py, que las envía
+#    en segundo plano (una conexión SMTP reutilizada, resúmenes y límite
+#    de envíos), por lo que el check no espera al servidor de correo.
+#    Además registra eventos en un log y guarda el estado previo de cada
+#    gateway en un almacén SQLite en modo WAL (estado_gateways.py): upsert
+#    atómico por gateway, seguro con muchos checks en paralelo, con la fecha
+#    del último cambio y una instantánea de los contadores.
+#    El XML se lee desde la caché compartida (diafaan_xml.py), de modo que
+#    los checks de todas las gateways comparten una sola descarga por ciclo.
+#    Con --todas evalúa todas las gateways en una sola pasada del XML
+#    (lectura incremental con iterparse) y un solo check de Nagios.
 #
 #Uso:
 #    python GW_status_email.py <GatewayName>
+#    python GW_status_email.py --todas
 #
 #Ejemplo:
 #    python GW_status_email.py SMPP_Gateway_1
@@ -19,29 +30,36 @@
 #Dependencias:
 #    - Python 3.x
 #    - requests
-#    - smtplib (incluido en librería estándar)
+#    - notificador.py en ejecución (despacha el spool de alertas)
 #
 #Archivos requeridos:
-#    - Setting.ini   → contiene la URL del XML
+#    - Setting.ini   → contiene la URL del XML y opcionalmente la sección
+#                      [cache] (xml_ttl, xml_dir) de la caché compartida
+#                      y [smtp] (servidor, credenciales y spool de alertas)
 #    - License.py    → contiene función get_expiration_date()
-#    - gateway_status.txt → almacena el estado previo de gateways
-#    - gateway_events.log → registra los eventos con timestamp
+#    - gateway_status.sqlite → almacena el estado previo de gateways
+#                             (importa gateway_status.txt la primera vez)
+#    - gateway_events.log → registra los eventos con timestamp (con buffer,
+#                           rotación y formato texto o JSON lines, ver
+#                           registro_eventos.py y la sección [eventos])
 #
 #Nota de seguridad:
-#    ⚠️ Reemplazar credenciales de correo por valores configurables en 
-#    variables de entorno o Setting.ini. Nunca exponer datos sensibles 
+#    ⚠️ Las credenciales de correo se configuran en la sección [smtp] de
+#    Setting.ini (ver notificador.py). Nunca exponer datos sensibles 
 #    en repositorios públicos.
 #"""
 
 import requests
 import xml.etree.ElementTree as ET
+from diafaan_xml import cache_desde_config
+from estado_gateways import EstadoGateways
+from notificador import Spool, ruta_spool
+from registro_eventos import registro_desde_config
+from monitor_comun import DB_CONFIG_PATH, LICENSE_CONFIG_PATH, leer_configuracion, cargar_fecha_expiracion
 import sys
-import configparser
 import datetime
-import importlib.util
 import os
-import smtplib
-from email.mime.text import MIMEText
+import sqlite3
 
 # Estados Nagios
 STATE_OK = 0
@@ -49,15 +67,18 @@ STATE_WARNING = 1
 STATE_CRITICAL = 2
 STATE_UNKNOWN = 3
 
-# Rutas (ajustar según entorno)
-setting_config_path = r'C:\T-Voip\Monitor\OTP\Setting.ini'
-license_config_path = r'C:\T-Voip\Monitor\OTP\License.py'
-status_file_path = r'C:\T-Voip\Monitor\OTP\gateway_status.txt'
-log_file_path = r'C:\T-Voip\Monitor\OTP\gateway_events.log'
+# Rutas comunes de monitor_comun.py (ajustar allí o con DIAFAAN_SETTING /
+# DIAFAAN_LICENSE); el estado, el log y el spool de alertas quedan junto al
+# mismo Setting.ini que lee notificador.py
+setting_config_path = DB_CONFIG_PATH
+license_config_path = LICENSE_CONFIG_PATH
+base_dir = os.path.dirname(setting_config_path)
+status_file_path = os.path.join(base_dir, 'gateway_status.txt')
+state_db_path = os.path.join(base_dir, 'gateway_status.sqlite')
+log_file_path = os.path.join(base_dir, 'gateway_events.log')
 
-# Leer configuración
-setting_config = configparser.ConfigParser()
-setting_config.read(setting_config_path)
+# Leer configuración (con la caché entre ejecuciones de monitor_comun.py)
+setting_config = leer_configuracion(setting_config_path)
 
 if 'URL' in setting_config and 'url' in setting_config['URL']:
     url = setting_config.get('URL', 'url')
@@ -65,14 +86,12 @@ else:
     print("Error: La sección o clave URL no se encontró en Setting.ini")
     sys.exit(STATE_UNKNOWN)
 
-# Verificar licencia
-spec = importlib.util.spec_from_file_location("license_config", license_config_path)
-license_config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(license_config)
+# Caché compartida del XML (una descarga por ventana TTL para todas las gateways)
+xml_cache = cache_desde_config(setting_config)
 
+# Verificar licencia (fecha cacheada mientras License.py no cambie)
 try:
-    expiration_date_str = license_config.get_expiration_date()
-    expiration_date = datetime.datetime.strptime(expiration_date_str, '%Y-%m-%d').date()
+    expiration_date = cargar_fecha_expiracion(license_config_path)
     if datetime.date.today() > expiration_date:
         print("CRITICAL: El script ha caducado.")
         sys.exit(STATE_CRITICAL)
@@ -80,78 +99,168 @@ except AttributeError:
     print("Error: No se encontró la fecha de expiración en License.py")
     sys.exit(STATE_UNKNOWN)
 
-# Registrar evento en log
-def log_event(message):
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    with open(log_file_path, 'a') as log_file:
-        log_file.write(f"[{timestamp}] {message}\n")
+# Log de eventos con buffer y rotación (se escribe al salir del check)
+event_log = registro_desde_config(setting_config, log_file_path)
 
-# Enviar correo con SMTP_SSL
-def send_email(subject, body):
-    msg = MIMEText(body)
-    msg['Subject'] = subject
-    msg['From'] = "T-Voip Alerta <alerta@t-voip.com>"
-    msg['To'] = "soporte@t-voip.com"
+# Registrar evento en log (los campos extra se guardan en formato json)
+def log_event(message, **fields):
+    event_log.evento(message, **fields)
 
+# Encolar el correo para notificador.py (sin conexión SMTP en el check)
+def send_email(subject, body):
     try:
-        server = smtplib.SMTP_SSL("t-voip.com", 465)
-        # ⚠️ Reemplazar por credenciales seguras en producción
-        server.login("alerta@t-voip.com", "password_aqui")
-        server.sendmail(msg['From'], [msg['To']], msg.as_string())
-        server.quit()
-    except Exception as e:
-        log_event(f"ERROR al enviar correo: {e}")
-        print(f"UNKNOWN: No se pudo enviar el correo: {e}")
+        notifier_spool.encolar(subject, body)
+    except sqlite3.Error as e:
+        log_event(f"ERROR al encolar correo: {e}")
+        print(f"UNKNOWN: No se pudo encolar el correo: {e}")
         sys.exit(STATE_UNKNOWN)
 
-# Verificar estado de gateway
-def check_gateway_status(url, gateway_name):
+# Estado anterior de las gateways (importa gateway_status.txt la primera vez)
+try:
+    state_store = EstadoGateways(state_db_path)
+    state_store.importar_archivo(status_file_path)
+except sqlite3.Error as e:
+    print(f"UNKNOWN: No se pudo abrir el estado de las gateways: {e}")
+    sys.exit(STATE_UNKNOWN)
+
+# Spool de alertas despachado por notificador.py
+try:
+    notifier_spool = Spool(ruta_spool(setting_config, setting_config_path))
+except sqlite3.Error as e:
+    print(f"UNKNOWN: No se pudo abrir el spool de alertas: {e}")
+    sys.exit(STATE_UNKNOWN)
+
+# Verificar estado de gateway; devuelve (estado, salida) sin imprimir
+# (usado también por nagios_pasivo.py)
+def evaluar_gateway(url, gateway_name):
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
-
-        for gateway in root.findall('.//Gateway'):
-            name = gateway.get('Name')
-            if name == gateway_name:
-                active = gateway.get('Active')
-                update_status(gateway_name, active == '1', gateway, root)
-                if active == '1':
-                    print(f'OK: La gateway "{gateway_name}" está activa. | gateway_status=1')
-                    return STATE_OK
+        gateways, server_stats = xml_cache.obtener_gateways(url)
+
+        for gateway in gateways:
+            if gateway['Name'] == gateway_name:
+                active = gateway['Active']
+                previous = state_store.registrar(gateway_name, active, gateway)
+                update_status(gateway_name, active, gateway, server_stats, previous)
+                if active:
+                    return STATE_OK, f'OK: La gateway "{gateway_name}" está activa. | gateway_status=1'
                 else:
-                    print(f'WARNING: La gateway "{gateway_name}" no está activa. | gateway_status=0')
-                    return STATE_WARNING
+                    return STATE_WARNING, f'WARNING: La gateway "{gateway_name}" no está activa. | gateway_status=0'
+
+        return STATE_CRITICAL, f'CRITICAL: No se encontró la gateway con el nombre "{gateway_name}". | gateway_status=0'
+
+    except requests.RequestException as e:
+        log_event(f"ERROR de conexión al obtener XML: {e}")
+        return STATE_UNKNOWN, f'UNKNOWN: Error al obtener el XML: {e} | gateway_status=0'
+    except ET.ParseError as e:
+        log_event(f"ERROR al analizar XML: {e}")
+        return STATE_UNKNOWN, f'UNKNOWN: Error al analizar el XML: {e} | gateway_status=0'
+    except sqlite3.Error as e:
+        log_event(f"ERROR al guardar el estado: {e}")
+        return STATE_UNKNOWN, f'UNKNOWN: Error al guardar el estado de la gateway: {e} | gateway_status=0'
 
-        print(f'CRITICAL: No se encontró la gateway con el nombre "{gateway_name}". | gateway_status=0')
-        return STATE_CRITICAL
+def check_gateway_status(url, gateway_name):
+    estado, salida = evaluar_gateway(url, gateway_name)
+    print(salida)
+    return estado
 
+# Verificar todas las gateways en una sola pasada del XML
+def evaluar_todas(url):
+    try:
+        gateways, server_stats = xml_cache.obtener_gateways(url)
     except requests.RequestException as e:
         log_event(f"ERROR de conexión al obtener XML: {e}")
-        print(f'UNKNOWN: Error al obtener el XML: {e} | gateway_status=0')
-        return STATE_UNKNOWN
+        return STATE_UNKNOWN, f'UNKNOWN: Error al obtener el XML: {e} | gateways_activas=0'
     except ET.ParseError as e:
         log_event(f"ERROR al analizar XML: {e}")
-        print(f'UNKNOWN: Error al analizar el XML: {e} | gateway_status=0')
-        return STATE_UNKNOWN
+        return STATE_UNKNOWN, f'UNKNOWN: Error al analizar el XML: {e} | gateways_activas=0'
+
+    if not gateways:
+        return STATE_CRITICAL, 'CRITICAL: No se encontraron gateways en el XML. | gateways_activas=0'
+
+    try:
+        previous = state_store.registrar_varios([(g['Name'], g['Active'], g) for g in gateways])
+    except sqlite3.Error as e:
+        log_event(f"ERROR al guardar el estado: {e}")
+        return STATE_UNKNOWN, f'UNKNOWN: Error al guardar el estado de las gateways: {e} | gateways_activas=0'
+
+    inactive = []
+    perfdata = []
+    for i, gateway in enumerate(gateways):
+        try:
+            update_status(gateway['Name'], gateway['Active'], gateway, server_stats, previous[gateway['Name']])
+        except SystemExit:
+            # update_status ya revirtió la gateway que falló; las siguientes quedaron
+            # guardadas con su estado nuevo sin notificarse y también se revierten
+            for pendiente in gateways[i + 1:]:
+                anterior = previous[pendiente['Name']]
+                if cambio_estado(anterior, pendiente['Active']):
+                    state_store.revertir(pendiente['Name'], pendiente['Active'], anterior)
+            raise
+        if not gateway['Active']:
+            inactive.append(gateway['Name'])
+        perfdata.append(f"'{gateway['Name']}'={1 if gateway['Active'] else 0};;;0;1")
 
-# Leer/actualizar estado y registrar cambios
-def update_status(gateway_name, is_active, gateway_data, xml_root):
-    status = {}
+    total = len(gateways)
+    perfdata.insert(0, f"gateways_activas={total - len(inactive)};;;0;{total}")
+    if inactive:
+        return STATE_WARNING, f'WARNING: {len(inactive)}/{total} gateways no están activas: {", ".join(inactive)} | {" ".join(perfdata)}'
+    return STATE_OK, f'OK: {total}/{total} gateways activas. | {" ".join(perfdata)}'
 
-    # Leer estado anterior
-    if os.path.exists(status_file_path):
-        with open(status_file_path, 'r') as f:
-            for line in f:
-                name, value = line.strip().split('=')
-                status[name] = value == 'active'
+def check_all_gateways(url):
+    estado, salida = evaluar_todas(url)
+    print(salida)
+    return estado
 
-    prev_state = status.get(gateway_name, True)
+# Una gateway nueva se considera activa hasta su primer registro
+def cambio_estado(previous, is_active):
+    prev_state = previous['activa'] if previous else True
+    return prev_state != is_active
+
+# Registrar y notificar cambios respecto del registro previo del almacén
+# (previous es None si la gateway no se había visto antes)
+def update_status(gateway_name, is_active, gateway_data, server_stats, previous):
     timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    # Extraer datos del XML de la sección Gateway
-    status_text = gateway_data.findtext('Status', default='N/A')
-    statistics = gateway_data.find('Statistics')
-    sent = statistics.findtext('SentMessages', default='0') if statistics is not None else '0'
-    failed = statistics.findtext('FailedMessages', default='0') if statistics is not None else '0'
-    received = statistics
+    # Datos del registro de la gateway extraído del XML
+    status_text = gateway_data.get('Status') or 'N/A'
+    sent = gateway_data.get('SentMessages') or '0'
+    failed = gateway_data.get('FailedMessages') or '0'
+    received = gateway_data.get('ReceivedMessages') or '0'
+    in_queue = server_stats.get('MessagesInSendQueue') or 'N/A'
+
+    # Registrar y notificar solo cuando cambia el estado
+    if cambio_estado(previous, is_active):
+        if is_active:
+            subject = f"RECUPERACIÓN: Gateway {gateway_name} activa"
+        else:
+            subject = f"ALERTA: Gateway {gateway_name} inactiva"
+        body = (
+            f"Gateway: {gateway_name}\n"
+            f"Estado: {'ACTIVA' if is_active else 'INACTIVA'} ({status_text})\n"
+            f"Fecha: {timestamp}\n"
+            f"Mensajes enviados: {sent}\n"
+            f"Mensajes fallidos: {failed}\n"
+            f"Mensajes recibidos: {received}\n"
+            f"Mensajes en cola (servidor): {in_queue}\n"
+        )
+        if previous:
+            body += f"Estado anterior desde: {previous['ultimo_cambio']}\n"
+        log_event(f"{subject} - Estado: {status_text}", gateway=gateway_name,
+                  activa=is_active, estado=status_text, enviados=sent, fallidos=failed)
+        try:
+            send_email(subject, body)
+        except SystemExit:
+            # Si no se pudo encolar, el cambio se deshace para que el próximo check lo reintente
+            state_store.revertir(gateway_name, is_active, previous)
+            raise
+
+def main():
+    if len(sys.argv) != 2:
+        print("Uso: python GW_status_email.py <GatewayName> | --todas")
+        sys.exit(STATE_UNKNOWN)
+    if sys.argv[1] == '--todas':
+        sys.exit(check_all_gateways(url))
+    sys.exit(check_gateway_status(url, sys.argv[1]))
+
+if __name__ == "__main__":
+    main()
@@ -9,12 +9,14 @@ Descripción:
     para un conjunto de `gatewayid` activos definidos manualmente.
     Retorna todos los resultados en una sola línea para integración con Nagios 
     o herramientas de monitoreo.
+    La base se abre en solo lectura (sqlite_ro.py) y el tiempo de espera por
+    locks se reporta como perfdata (lock_wait).
 
 Uso:
     python Q_completo.py
 
 Ejemplo de salida:
-    2=10  3=0  5=4  6=0  7=2 ...
+    2=10  3=0  5=4  6=0  7=2 ... | lock_wait=0.000s
 
 Dependencias:
     - Python 3.x
@@ -24,69 +26,22 @@ Dependencias:
 Archivos requeridos:
     - Setting.ini   → contiene la ruta del archivo SQLite (sección [BDSQLite])
     - License.py    → contiene función get_expiration_date()
+
+Las funciones de consulta pueden ser importadas por monitor_daemon.py
+para servir el check desde una conexión persistente.
 """
 
-import sys
 import sqlite3
-import time
-import importlib.util
-from datetime import datetime
-import configparser
-
-# Archivos de configuración (ajustar según entorno)
-db_config_path = r'C:\turuta\Monitor\OTP\Setting.ini'
-license_config_path = r'C:\turuta\Monitor\OTP\License.py'
-
-# Configuración de reintentos y timeout
-TIMEOUT = 60   # segundos de espera en conexión SQLite
-RETRIES = 3    # número de reintentos en caso de error
-
-# Leer configuración de la base de datos desde Setting.ini
-db_config = configparser.ConfigParser()
-db_config.read(db_config_path)
-
-if 'BDSQLite' in db_config and 'db_path' in db_config['BDSQLite']:
-    db_path = db_config.get('BDSQLite', 'db_path')
-else:
-    print("Error: No se encontró la sección [BDSQLite] o la clave db_path en Setting.ini")
-    sys.exit(1)
-
-# Cargar License.py y validar expiración
-spec = importlib.util.spec_from_file_location("license_config", license_config_path)
-license_config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(license_config)
-
-try:
-    expiration_date_str = license_config.get_expiration_date()
-    expiration_date = datetime.strptime(expiration_date_str, '%Y-%m-%d').date()
-    if datetime.today().date() > expiration_date:
-        print("CRITICAL: El script ha caducado.")
-        sys.exit(2)
-except AttributeError:
-    print("ERROR: No se encontró la fecha de expiración en License.py")
-    sys.exit(1)
+
+from sqlite_ro import consultar, ejecutar_consulta, perfdata_lock_wait
+from monitor_comun import (
+    DB_CONFIG_PATH, LICENSE_CONFIG_PATH, STATE_OK, leer_configuracion, salir,
+    verificar_licencia_o_salir,
+)
 
 # Lista de gatewayid activos a monitorear (ajustar según entorno)
 active_gateways = [2, 3, 5, 6, 7, 8, 9, 15, 16, 19]
 
-def execute_query_with_retries(db_path, query, params=(), retries=RETRIES):
-    """
-    Ejecuta una consulta SQLite con reintentos en caso de fallo.
-    """
-    attempt = 0
-    while attempt < retries:
-        try:
-            conn = sqlite3.connect(db_path, timeout=TIMEOUT)
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            resultados = cursor.fetchall()
-            conn.close()
-            return resultados
-        except sqlite3.OperationalError:
-            attempt += 1
-            time.sleep(2)  # espera antes de reintentar
-    raise sqlite3.OperationalError("No se pudo ejecutar la consulta después de varios intentos.")
-
 # Consulta SQL para contar mensajes por gatewayid activo
 count_query = f"""
 SELECT gatewayid,
@@ -96,16 +51,61 @@ WHERE gatewayid IN ({','.join('?' for _ in active_gateways)})
 GROUP BY gatewayid;
 """
 
-try:
-    resultados = execute_query_with_retries(db_path, count_query, params=active_gateways)
+# Profundidad de todas las gateways con mensajes en cola (exporter y pronostico_cola.py);
+# los mensajes sin gatewayid no pertenecen a ninguna cola
+profundidad_query = """
+SELECT gatewayid,
+       COUNT(*) AS total_registros
+FROM sendqueue
+WHERE gatewayid IS NOT NULL
+GROUP BY gatewayid;
+"""
+
 
-    # Convertir resultados en diccionario
-    counts = {int(gatewayid): count for gatewayid, count in resultados}
+def obtener_db_path(db_config):
+    """
+    Devuelve la ruta SQLite de la sección [BDSQLite], o None si no existe.
+    """
+    if 'BDSQLite' in db_config and 'db_path' in db_config['BDSQLite']:
+        return db_config.get('BDSQLite', 'db_path')
+    return None
 
-    # Generar salida (ejemplo: "2=10  3=0  5=4")
+
+def formatear_resultados(resultados, lock_wait):
+    """
+    Convierte las filas (gatewayid, total) en la línea de salida "2=10  3=0  5=4 | lock_wait=...".
+    """
+    counts = {int(gatewayid): count for gatewayid, count in resultados}
     messages = [f"{gatewayid}={counts.get(gatewayid, 0)}" for gatewayid in active_gateways]
-    print("  ".join(messages))
+    return f"{'  '.join(messages)} | {perfdata_lock_wait(lock_wait)}"
+
+
+def ejecutar_check(conn):
+    """
+    Ejecuta la consulta sobre una conexión abierta y devuelve (estado, salida).
+    """
+    try:
+        resultados, lock_wait = consultar(conn, count_query, active_gateways)
+        return STATE_OK, formatear_resultados(resultados, lock_wait)
+    except sqlite3.Error as e:
+        return 1, f"Error: {e}"
+
+
+def main():
+    # Leer configuración de la base de datos desde Setting.ini
+    db_path = obtener_db_path(leer_configuracion(DB_CONFIG_PATH))
+    if db_path is None:
+        salir(1, "Error: No se encontró la sección [BDSQLite] o la clave db_path en Setting.ini")
+
+    # Cargar License.py y validar expiración
+    verificar_licencia_o_salir(LICENSE_CONFIG_PATH)
+
+    try:
+        resultados, lock_wait = ejecutar_consulta(db_path, count_query, active_gateways)
+        print(formatear_resultados(resultados, lock_wait))
+    except sqlite3.Error as e:
+        salir(1, f"Error: {e}")
+
 
-except sqlite3.OperationalError as e:
-    print(f"Error: {e}")
-    sys.exit(1)
+if __name__ == "__main__":
+    main()
@@ -9,12 +9,25 @@ Descripción:
     a partir del campo StatusCode en la base de datos SQLite 
     de Diafaan Message Server.
     Retorna códigos estándar de Nagios y métricas para PNP4Nagios.
+    La base se abre en solo lectura con reintentos ante bloqueos (sqlite_ro.py)
+    y el tiempo de espera por locks se reporta como perfdata (lock_wait).
+
+    Con --matriz calcula en una sola consulta agrupada la matriz completa
+    StatusCode × GatewayId, con umbrales por código y perfdata por celda:
+        --ventana S    → solo los mensajes con SendTime en los últimos S segundos
+                         (recorrido acotado; usar el índice que sugiere index_advisor.py)
+        --incremental  → solo las filas nuevas desde el último rowid visto, que se
+                         guarda en un archivo de estado con una marca por base y
+                         códigos (la primera ejecución solo fija la marca)
 
 Uso:
     python GW_errors.py <GatewayId> <ErrorCode> [--error_threshold N] [--critical_threshold N]
+    python GW_errors.py --matriz [--ventana 300 | --incremental] [--codigos 300,500]
+                        [--umbral CODIGO=WARN:CRIT ...]
 
 Ejemplo:
     python GW_errors.py 2 300 --error_threshold 5000 --critical_threshold 10000
+    python GW_errors.py --matriz --ventana 900 --umbral 300=50:200
 
 Dependencias:
     - Python 3.x
@@ -22,75 +35,320 @@ Dependencias:
 
 Archivos requeridos:
     - MessageLog.sqlite (ubicación configurada en db_path)
+    - Setting.ini (solo --matriz, opcional) → umbrales por código en la sección
+      [error_umbrales] (formato: StatusCode = warning, critical) y la ruta de
+      MessageLog.sqlite en [BDSQLite] messagelog_path (default: db_path)
 
 Nota de seguridad:
     ⚠️ Ajustar la ruta de la base de datos (`db_path`) según entorno.
+
+Las funciones de consulta pueden ser importadas por monitor_daemon.py
+para servir el check desde una conexión persistente.
 """
 
+import os
+import json
 import sqlite3
 import sys
+import datetime
 import argparse
 
-# Ruta de la base de datos SQLite (ajustar según entorno)
-db_path = r'C:\ProgramData\Diafaan\Diafaan Message Server\MessageLog.sqlite'
+from sqlite_ro import consultar, ejecutar_consulta, perfdata_lock_wait
+from monitor_comun import DB_CONFIG_PATH, STATE_OK, STATE_WARNING, STATE_CRITICAL, STATE_UNKNOWN
+
+# Ruta de la base de datos SQLite (ajustar según entorno o con DIAFAAN_MESSAGELOG)
+db_path = os.environ.get('DIAFAAN_MESSAGELOG', r'C:\ProgramData\Diafaan\Diafaan Message Server\MessageLog.sqlite')
 
-# Argumentos CLI
-parser = argparse.ArgumentParser(description="Script para verificar errores en un gateway específico.")
-parser.add_argument("gateway_id", help="ID del gateway a verificar.")
-parser.add_argument("error_code", help="Código de error a verificar (e.g., 300).")
-parser.add_argument("--error_threshold", type=int, default=5000, help="Umbral de advertencia (default: 5000).")
-parser.add_argument("--critical_threshold", type=int, default=10000, help="Umbral crítico (default: 10000).")
-args = parser.parse_args()
+# Marca de agua del modo --matriz --incremental (junto a Setting.ini)
+estado_matriz_path = os.path.join(os.path.dirname(DB_CONFIG_PATH), 'sms_gw_status_marca.json')
+
+# Consulta SQL para contar errores
+query = """
+SELECT COUNT(*) AS TotalError
+FROM MessageOut
+WHERE StatusCode = ?
+AND GatewayId = ?;
+"""
 
-gateway_id = args.gateway_id
-error_code = args.error_code
-error_threshold = args.error_threshold
-critical_threshold = args.critical_threshold
+# Último rowid de MessageOut (límite superior del modo incremental)
+maximo_query = "SELECT MAX(rowid) FROM MessageOut;"
+
+# Ventana por defecto del modo --matriz (segundos)
+ventana_matriz = 300
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Script para verificar errores en un gateway específico.")
+    parser.add_argument("gateway_id", nargs='?', help="ID del gateway a verificar.")
+    parser.add_argument("error_code", nargs='?', help="Código de error a verificar (e.g., 300).")
+    parser.add_argument("--error_threshold", type=int, default=5000, help="Umbral de advertencia (default: 5000).")
+    parser.add_argument("--critical_threshold", type=int, default=10000, help="Umbral crítico (default: 10000).")
+    parser.add_argument("--matriz", action='store_true',
+                        help="Matriz StatusCode × GatewayId en una sola consulta agrupada.")
+    parser.add_argument("--ventana", type=int,
+                        help=f"Con --matriz, segundos hacia atrás según SendTime (default: {ventana_matriz}).")
+    parser.add_argument("--incremental", action='store_true',
+                        help="Con --matriz, contar solo las filas nuevas desde la ejecución anterior.")
+    parser.add_argument("--estado", default=estado_matriz_path,
+                        help="Archivo con la marca de agua del modo incremental.")
+    parser.add_argument("--codigos", help="Con --matriz, StatusCode a incluir separados por coma (default: todos los distintos de 0).")
+    parser.add_argument("--umbral", action='append', default=[], metavar='CODIGO=WARN:CRIT',
+                        help="Umbral por StatusCode en modo --matriz (repetible).")
+    return parser
+
+
+def obtener_db_path(db_config):
+    """
+    Ruta de MessageLog.sqlite: [BDSQLite] messagelog_path del Setting.ini
+    (cada instancia de instancias.py tiene la suya) o, si no está, db_path.
+    """
+    if db_config is not None:
+        return db_config.get('BDSQLite', 'messagelog_path', fallback=db_path)
+    return db_path
+
+
+def validar_args(args):
+    """
+    Devuelve un mensaje de error si la combinación de argumentos no es válida, o None.
+    """
+    if args.matriz:
+        if args.gateway_id or args.error_code:
+            return "UNKNOWN: Indicar <GatewayId> <ErrorCode> o --matriz, no ambos."
+        if args.incremental and args.ventana is not None:
+            return "UNKNOWN: --ventana e --incremental son excluyentes."
+        if args.ventana is not None and args.ventana <= 0:
+            return "UNKNOWN: --ventana debe ser mayor que 0."
+        return None
+    if args.ventana is not None or args.incremental or args.codigos or args.umbral:
+        return "UNKNOWN: --ventana, --incremental, --codigos y --umbral solo aplican con --matriz."
+    if not args.gateway_id or not args.error_code:
+        return "UNKNOWN: Indicar <GatewayId> <ErrorCode> o --matriz."
+    return None
 
 
 def execute_query(db_path, query, params):
     """
-    Ejecuta una consulta SQLite y devuelve resultados.
-    Retorna lista de filas o lanza excepción si ocurre error.
+    Ejecuta una consulta SQLite de solo lectura y devuelve (resultados, lock_wait).
+    Termina con UNKNOWN si ocurre un error de base de datos.
     """
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        resultados = cursor.fetchall()
-        conn.close()
-        return resultados
+        return ejecutar_consulta(db_path, query, params)
     except sqlite3.Error as e:
         print(f"UNKNOWN: Error de base de datos: {e}")
         sys.exit(3)
 
 
-# Consulta SQL para contar errores
-query = """
-SELECT COUNT(*) AS TotalError
-FROM MessageOut
-WHERE StatusCode = ?
-AND GatewayId = ?;
-"""
-
-try:
-    resultados = execute_query(db_path, query, (error_code, gateway_id))
+def evaluar_errores(args, resultados, lock_wait=0.0):
+    """
+    Evalúa el total de errores contra los umbrales y devuelve (estado, salida).
+    """
     total_error = resultados[0][0] if resultados else 0
 
     # Datos de rendimiento para Nagios/PNP4Nagios
-    performance_data = f"total_error={total_error};{error_threshold};{critical_threshold};0;"
+    performance_data = (f"total_error={total_error};{args.error_threshold};{args.critical_threshold};0; "
+                        f"{perfdata_lock_wait(lock_wait)}")
 
     # Evaluar estado según thresholds
-    if total_error > critical_threshold:
-        print(f"CRITICAL: {total_error} errors with code {error_code} in gateway {gateway_id} | {performance_data}")
-        sys.exit(2)
-    elif total_error > error_threshold:
-        print(f"WARNING: {total_error} errors with code {error_code} in gateway {gateway_id} | {performance_data}")
-        sys.exit(1)
+    if total_error > args.critical_threshold:
+        return STATE_CRITICAL, f"CRITICAL: {total_error} errors with code {args.error_code} in gateway {args.gateway_id} | {performance_data}"
+    elif total_error > args.error_threshold:
+        return STATE_WARNING, f"WARNING: {total_error} errors with code {args.error_code} in gateway {args.gateway_id} | {performance_data}"
+    else:
+        return STATE_OK, f"OK: {total_error} errors with code {args.error_code} in gateway {args.gateway_id} | {performance_data}"
+
+
+# -- Modo --matriz -------------------------------------------------------------
+
+def consulta_matriz(codigos=None, incremental=False):
+    """
+    Consulta agrupada StatusCode × GatewayId. Los parámetros son
+    (desde_sendtime,) o (rowid_desde, rowid_hasta) seguidos de los códigos.
+    Los mensajes sin GatewayId (nunca asignados a una gateway) no forman
+    parte de la matriz.
+    """
+    filtro = "rowid > ? AND rowid <= ?" if incremental else "SendTime >= ?"
+    filtro += "\n  AND GatewayId IS NOT NULL"
+    if codigos:
+        filtro += f"\n  AND StatusCode IN ({','.join('?' for _ in codigos)})"
     else:
-        print(f"OK: {total_error} errors with code {error_code} in gateway {gateway_id} | {performance_data}")
-        sys.exit(0)
+        filtro += "\n  AND StatusCode <> 0"
+    return f"""
+SELECT StatusCode, GatewayId, COUNT(*)
+FROM MessageOut
+WHERE {filtro}
+GROUP BY StatusCode, GatewayId;
+"""
+
+
+def parse_codigos(texto):
+    if not texto:
+        return []
+    return [int(c) for c in texto.split(',') if c.strip()]
+
+
+def cargar_umbrales(db_config, args):
+    """
+    Combina los umbrales de la sección [error_umbrales] (`300 = warn, crit`)
+    y de --umbral. Devuelve un dict {StatusCode: (warning, critical)}.
+    """
+    umbrales = {}
+    if db_config is not None and 'error_umbrales' in db_config:
+        for codigo, valor in db_config.items('error_umbrales'):
+            warning, critical = (int(v) for v in valor.split(','))
+            umbrales[int(codigo)] = (warning, critical)
+    for definicion in args.umbral:
+        codigo, valor = definicion.split('=', 1)
+        warning, critical = (int(v) for v in valor.split(':'))
+        umbrales[int(codigo)] = (warning, critical)
+    return umbrales
+
+
+def leer_marca(ruta, clave):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f).get(clave)
+    except (OSError, ValueError):
+        return None
+
+
+def guardar_marca(ruta, clave, marca):
+    """
+    Guarda la marca de agua de forma atómica (archivo temporal + os.replace).
+    """
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            marcas = json.load(f)
+    except (OSError, ValueError):
+        marcas = {}
+    marcas[clave] = marca
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(marcas, f)
+    os.replace(temporal, ruta)
+
+
+def evaluar_matriz(resultados, umbrales, default_warning, default_critical, descripcion, lock_wait=0.0):
+    """
+    Evalúa la matriz de filas (StatusCode, GatewayId, total) y devuelve (estado, salida).
+    Cada celda se compara con el umbral de su código.
+    """
+    estado = STATE_OK
+    criticos, advertencias, perfdata = [], [], []
+    total = 0
+    for codigo, gatewayid, cantidad in sorted(resultados, key=lambda f: (int(f[0]), int(f[1]))):
+        codigo, gatewayid = int(codigo), int(gatewayid)
+        total += cantidad
+        warning, critical = umbrales.get(codigo, (default_warning, default_critical))
+        perfdata.append(f"'err_{codigo}_gw_{gatewayid}'={cantidad};{warning};{critical};0;")
+        if cantidad > critical:
+            criticos.append(f"{codigo}/gw{gatewayid}={cantidad}")
+            estado = STATE_CRITICAL
+        elif cantidad > warning:
+            advertencias.append(f"{codigo}/gw{gatewayid}={cantidad}")
+            estado = max(estado, STATE_WARNING)
+    perfdata.insert(0, f"total_error={total};;;0;")
+    perfdata.append(perfdata_lock_wait(lock_wait))
+
+    performance_data = " ".join(perfdata)
+    celdas = len(resultados)
+    if estado == STATE_CRITICAL:
+        detalle = ", ".join(criticos + advertencias)
+        return estado, (f"CRITICAL: {len(criticos)}/{celdas} celdas sobre el umbral crítico ({detalle}), "
+                        f"{total} errores {descripcion} | {performance_data}")
+    elif estado == STATE_WARNING:
+        return estado, (f"WARNING: {len(advertencias)}/{celdas} celdas sobre el umbral ({', '.join(advertencias)}), "
+                        f"{total} errores {descripcion} | {performance_data}")
+    return estado, f"OK: {total} errores en {celdas} celdas código/gateway {descripcion} | {performance_data}"
+
+
+def ejecutar_matriz(consulta, args, db_config=None, origen=None):
+    """
+    Ejecuta el modo --matriz con una función consulta(sql, params) -> (filas, lock_wait)
+    (conexión abierta, archivo o las consultas compartidas de nagios_pasivo.py).
+    Con --incremental la marca se guarda por `origen` (la ruta de la base) y
+    códigos, de modo que varias bases pueden compartir el archivo de estado.
+    """
+    try:
+        codigos = parse_codigos(args.codigos)
+        umbrales = cargar_umbrales(db_config, args)
+    except ValueError:
+        return STATE_UNKNOWN, "UNKNOWN: --codigos o umbral de error inválido (formato CODIGO=WARN:CRIT)"
+
+    sql = consulta_matriz(codigos, args.incremental)
+    try:
+        if args.incremental:
+            clave = ",".join(str(c) for c in codigos) or "*"
+            if origen:
+                clave = f"{origen}|{clave}"
+            filas, espera = consulta(maximo_query, ())
+            maximo = filas[0][0] or 0
+            marca = leer_marca(args.estado, clave)
+            if marca is None or marca > maximo:
+                # Primera ejecución (o base recreada): solo se fija la marca
+                guardar_marca(args.estado, clave, maximo)
+                return STATE_OK, f"OK: Marca incremental inicializada en rowid {maximo} | total_error=0;;;0; {perfdata_lock_wait(espera)}"
+            resultados, lock_wait = consulta(sql, [marca, maximo] + codigos)
+            lock_wait += espera
+            descripcion = f"desde rowid {marca}"
+        else:
+            ventana = args.ventana or ventana_matriz
+            desde = (datetime.datetime.now() - datetime.timedelta(seconds=ventana)).strftime('%Y-%m-%d %H:%M:%S')
+            resultados, lock_wait = consulta(sql, [desde] + codigos)
+            descripcion = f"en los últimos {ventana} s"
+    except sqlite3.Error as e:
+        return STATE_UNKNOWN, f"UNKNOWN: Error de base de datos: {e}"
+    except OSError as e:
+        # Solo guardar_marca() de la primera ejecución escribe archivos dentro del try
+        return STATE_UNKNOWN, f"UNKNOWN: No se pudo guardar la marca incremental: {e}"
+
+    if args.incremental:
+        try:
+            guardar_marca(args.estado, clave, maximo)
+        except OSError as e:
+            return STATE_UNKNOWN, f"UNKNOWN: No se pudo guardar la marca incremental: {e}"
+    return evaluar_matriz(resultados, umbrales, args.error_threshold, args.critical_threshold,
+                          descripcion, lock_wait)
+
+
+def ejecutar_check(conn, args, db_config=None, origen=None):
+    """
+    Ejecuta el check sobre una conexión abierta y devuelve (estado, salida).
+    `origen` es la ruta de la base (clave de la marca de --incremental).
+    """
+    if args.matriz:
+        return ejecutar_matriz(lambda sql, params: consultar(conn, sql, params), args, db_config, origen)
+    try:
+        resultados, lock_wait = consultar(conn, query, (args.error_code, args.gateway_id))
+    except sqlite3.Error as e:
+        return STATE_UNKNOWN, f"UNKNOWN: Error de base de datos: {e}"
+    return evaluar_errores(args, resultados, lock_wait)
+
+
+def main():
+    args = crear_parser().parse_args()
+    mensaje = validar_args(args)
+    if mensaje:
+        print(mensaje)
+        sys.exit(STATE_UNKNOWN)
+
+    if args.matriz:
+        from monitor_comun import leer_configuracion
+        db_config = leer_configuracion(DB_CONFIG_PATH)
+        ruta = obtener_db_path(db_config)
+        estado, salida = ejecutar_matriz(lambda sql, params: ejecutar_consulta(ruta, sql, params),
+                                         args, db_config, ruta)
+        print(salida)
+        sys.exit(estado)
+
+    try:
+        resultados, lock_wait = execute_query(db_path, query, (args.error_code, args.gateway_id))
+        estado, salida = evaluar_errores(args, resultados, lock_wait)
+    except Exception as e:
+        estado, salida = STATE_UNKNOWN, f"UNKNOWN: Failed to execute check. Error: {str(e)}"
+
+    print(salida)
+    sys.exit(estado)
+
 
-except Exception as e:
-    print(f"UNKNOWN: Failed to execute check. Error: {str(e)}")
-    sys.exit(3)
+if __name__ == "__main__":
+    main()
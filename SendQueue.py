@@ -6,6 +6,8 @@ Fecha de creación: 2024-09-25
 Versión: 1.0
 Descripción:
     Consulta el valor de `MessagesInSendQueue` desde la API XML de Diafaan.
+    El XML se obtiene a través de la caché compartida (diafaan_xml.py), de modo
+    que este check y los de estado de gateways comparten una sola descarga.
     Integra con Nagios, retornando:
         - 0 = OK si se obtiene el valor correctamente.
         - 2 = CRITICAL en caso de error de conexión o parsing.
@@ -22,63 +24,72 @@ Dependencias:
 
 Archivos requeridos:
     - Setting.ini   → contiene la URL de la API (sección [URL], clave api_url)
+                      y opcionalmente la sección [cache] (xml_ttl, xml_dir)
     - License.py    → contiene función get_expiration_date()
 
 Nota de seguridad:
     ⚠️ No exponer Setting.ini ni License.py en repositorios públicos.
+
+Las funciones de consulta pueden ser importadas por monitor_daemon.py,
+que reutiliza una sesión HTTP persistente y el árbol XML ya parseado.
 """
 
 import requests
 import xml.etree.ElementTree as ET
-import sys
-import configparser
-import datetime
-import importlib.util
+
+from diafaan_xml import cache_desde_config
+from monitor_comun import (
+    DB_CONFIG_PATH, LICENSE_CONFIG_PATH, STATE_OK, STATE_CRITICAL,
+    leer_configuracion, salir, verificar_licencia_o_salir,
+)
 
 # Archivos de configuración (ajustar según entorno)
-url_config_path = r'C:\turuta\Monitor\OTP\Setting.ini'
-license_config_path = r'C:\turuta\Monitor\OTP\License.py'
-
-# Leer configuración de la URL desde Setting.ini
-url_config = configparser.ConfigParser()
-url_config.read(url_config_path)
-
-if 'URL' in url_config and 'api_url' in url_config['URL']:
-    url = url_config.get('URL', 'api_url')
-else:
-    print("Error: La sección [URL] o la clave api_url no se encontró en Setting.ini")
-    sys.exit(1)
-
-# Validar licencia desde License.py
-spec = importlib.util.spec_from_file_location("license_config", license_config_path)
-license_config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(license_config)
-
-try:
-    expiration_date_str = license_config.get_expiration_date()
-    expiration_date = datetime.datetime.strptime(expiration_date_str, '%Y-%m-%d').date()
-    if datetime.date.today() > expiration_date:
-        print("CRITICAL: El script ha caducado.")
-        sys.exit(2)
-except AttributeError:
-    print("ERROR: No se encontró la fecha de expiración en License.py")
-    sys.exit(1)
-
-# Consultar API XML
-try:
-    response = requests.get(url, timeout=10)
-    response.raise_for_status()
-except requests.exceptions.RequestException as e:
-    print(f"CRITICAL - Error al conectar con la API: {e}")
-    sys.exit(2)
-
-# Parsear XML y extraer valor
-try:
-    root = ET.fromstring(response.content)
-    statistics = root.find('.//Statistics')
-    messages_in_send_queue = statistics.find('MessagesInSendQueue').text
-    print(f"OK - MessagesInSendQueue: {messages_in_send_queue} | messages_in_send_queue={messages_in_send_queue}")
-    sys.exit(0)
-except Exception as e:
-    print(f"CRITICAL - Error al obtener MessagesInSendQueue: {e}")
-    sys.exit(2)
+url_config_path = DB_CONFIG_PATH
+license_config_path = LICENSE_CONFIG_PATH
+
+
+def obtener_url(url_config):
+    """
+    Devuelve la URL de la API de la sección [URL], o None si no existe.
+    """
+    if 'URL' in url_config and 'api_url' in url_config['URL']:
+        return url_config.get('URL', 'api_url')
+    return None
+
+
+def ejecutar_check(url, cache):
+    """
+    Consulta la API XML a través de la caché compartida y devuelve (estado, salida).
+    """
+    # Consultar API XML y parsear (una sola descarga por ventana TTL)
+    try:
+        root = cache.obtener_root(url)
+    except requests.exceptions.RequestException as e:
+        return STATE_CRITICAL, f"CRITICAL - Error al conectar con la API: {e}"
+    except ET.ParseError as e:
+        return STATE_CRITICAL, f"CRITICAL - Error al obtener MessagesInSendQueue: {e}"
+
+    # Extraer valor
+    try:
+        statistics = root.find('.//Statistics')
+        messages_in_send_queue = statistics.find('MessagesInSendQueue').text
+        return STATE_OK, f"OK - MessagesInSendQueue: {messages_in_send_queue} | messages_in_send_queue={messages_in_send_queue}"
+    except Exception as e:
+        return STATE_CRITICAL, f"CRITICAL - Error al obtener MessagesInSendQueue: {e}"
+
+
+def main():
+    # Leer configuración de la URL desde Setting.ini
+    url_config = leer_configuracion(url_config_path)
+    url = obtener_url(url_config)
+    if url is None:
+        salir(1, "Error: La sección [URL] o la clave api_url no se encontró en Setting.ini")
+
+    # Validar licencia desde License.py
+    verificar_licencia_o_salir(license_config_path)
+
+    salir(*ejecutar_check(url, cache_desde_config(url_config)))
+
+
+if __name__ == "__main__":
+    main()
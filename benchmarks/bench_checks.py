@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Script: bench_checks.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Benchmark de extremo a extremo de los checks contra datos sintéticos.
+    Cada check se ejecuta como proceso independiente (igual que desde Nagios)
+    con un Setting.ini y License.py temporales que apuntan a:
+        - las bases generadas por generar_datos.py (MessageLog / SendQueue)
+        - el endpoint XML falso de xml_falso.py (levantado en este proceso)
+    Por cada check mide la latencia (p50/p95/máx), la memoria máxima del
+    proceso (VmHWM / ru_maxrss, solo POSIX) y el tiempo de espera por locks que el
+    propio check reporta en su perfdata (lock_wait).
+    Con --escritor un hilo simula a Diafaan escribiendo en las bases
+    (transacciones exclusivas) para provocar contención.
+    Con --guardar se escribe una línea base JSON; con --comparar se marca
+    como regresión cualquier check cuya latencia p50 o memoria empeore más
+    que --tolerancia respecto de la línea base.
+
+Uso:
+    python benchmarks/bench_checks.py [--datos DIR] [--filas 100000] [--gateways 200]
+                                      [--repeticiones 10] [--escritor]
+                                      [--guardar base.json] [--comparar base.json] [--tolerancia 0.25]
+
+Salida:
+    0 → sin regresiones
+    1 → hay regresiones respecto de la línea base
+    2 → algún check terminó con error (UNKNOWN o excepción)
+
+Dependencias:
+    - Python 3.x
+    - requests (para SendQueue.py y GW_status_email.py)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import generar_datos
+from xml_falso import EstadoFalso, iniciar_servidor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (nombre, script, argumentos)
+CHECKS = [
+    ("Q_completo", "Q_completo.py", []),
+    ("total_Priority", "total_Priority.py", ["1"]),
+    ("total_Priority_todas", "total_Priority.py", ["--todas", "--por-gateway"]),
+    ("SMS_GW_Status", "SMS_GW_Status.py", ["2", "300"]),
+    ("SendQueue", "SendQueue.py", []),
+    ("GW_status_email", "GW_status_email.py", ["SMPP_Gateway_1"]),
+    ("GW_status_email_todas", "GW_status_email.py", ["--todas"]),
+]
+
+LOCK_WAIT_RE = re.compile(r"lock_wait=([0-9.]+)s")
+
+setting_template = """[BDSQLite]
+db_path = {sendqueue}
+
+[URL]
+url = {url}
+api_url = {url}
+
+[cache]
+xml_dir = {cache_dir}
+xml_ttl = 0
+
+[smtp]
+spool = {spool}
+"""
+
+license_template = """def get_expiration_date():
+    return '2999-12-31'
+"""
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    k = (len(ordenados) - 1) * p / 100.0
+    inferior = int(k)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (k - inferior)
+
+
+# Lanzador del check: lo ejecuta como __main__ y al salir deja su memoria
+# máxima (KB) en BENCH_RSS_FILE. Se mide dentro del hijo porque en Linux el
+# ru_maxrss de un hijo hereda el máximo del proceso padre al hacer fork/exec.
+lanzador = r"""
+import atexit, os, runpy, sys
+def _rss():
+    kb = None
+    try:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith('VmHWM:'):
+                    kb = int(linea.split()[1])
+    except OSError:
+        try:
+            import resource
+        except ImportError:
+            return
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            kb //= 1024
+    if kb is not None:
+        with open(os.environ['BENCH_RSS_FILE'], 'w') as f:
+            f.write(str(kb))
+atexit.register(_rss)
+sys.argv = sys.argv[1:]
+sys.path[0] = os.path.dirname(sys.argv[0])
+runpy.run_path(sys.argv[0], run_name='__main__')
+"""
+
+
+def ejecutar(script, argumentos, env):
+    """
+    Ejecuta un check y devuelve (rc, salida, segundos, rss_mb o None).
+    """
+    fd, rss_file = tempfile.mkstemp(prefix='bench_rss_')
+    os.close(fd)
+    try:
+        inicio = time.perf_counter()
+        proceso = subprocess.run([sys.executable, '-c', lanzador, os.path.join(RAIZ, script)] + argumentos,
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                 env=dict(env, BENCH_RSS_FILE=rss_file), cwd=RAIZ)
+        segundos = time.perf_counter() - inicio
+        with open(rss_file) as f:
+            contenido = f.read().strip()
+        rss = int(contenido) / 1024 if contenido else None
+    finally:
+        os.remove(rss_file)
+    return proceso.returncode, proceso.stdout.decode('utf-8', 'replace'), segundos, rss
+
+
+def medir(nombre, script, argumentos, env, repeticiones):
+    tiempos, memorias, esperas = [], [], []
+    rc, salida = 0, ""
+    for _ in range(repeticiones):
+        rc, salida, segundos, rss = ejecutar(script, argumentos, env)
+        tiempos.append(segundos * 1000)
+        if rss is not None:
+            memorias.append(rss)
+        coincidencia = LOCK_WAIT_RE.search(salida)
+        if coincidencia:
+            esperas.append(float(coincidencia.group(1)) * 1000)
+    return {
+        'check': nombre,
+        'rc': rc,
+        'error': rc == 3 or 'Traceback' in salida,
+        'salida': salida.strip().splitlines()[0] if salida.strip() else "",
+        'p50_ms': percentil(tiempos, 50),
+        'p95_ms': percentil(tiempos, 95),
+        'max_ms': max(tiempos),
+        'rss_mb': max(memorias) if memorias else None,
+        'lock_wait_ms': max(esperas) if esperas else None,
+    }
+
+
+class Escritor(threading.Thread):
+    """
+    Simula a Diafaan: transacciones exclusivas periódicas sobre las bases.
+    """
+
+    def __init__(self, rutas, duracion_ms=50, pausa_ms=100):
+        super().__init__(name='escritor', daemon=True)
+        self.rutas = rutas
+        self.duracion = duracion_ms / 1000.0
+        self.pausa = pausa_ms / 1000.0
+        self.detener = threading.Event()
+
+    def run(self):
+        conexiones = [sqlite3.connect(r, timeout=30, isolation_level=None) for r in self.rutas]
+        while not self.detener.is_set():
+            for conn in conexiones:
+                conn.execute("BEGIN EXCLUSIVE;")
+                time.sleep(self.duracion)
+                conn.execute("COMMIT;")
+            self.detener.wait(self.pausa)
+        for conn in conexiones:
+            conn.close()
+
+
+def _fmt(valor, formato="{:.1f}"):
+    return "-" if valor is None else formato.format(valor)
+
+
+def imprimir(resultados, regresiones):
+    print(f"\n{'Check':<24}{'rc':>3}{'p50 ms':>10}{'p95 ms':>10}{'máx ms':>10}{'RSS MB':>9}{'lock ms':>9}")
+    for r in resultados:
+        marca = "  << regresión" if r['check'] in regresiones else ""
+        print(f"{r['check']:<24}{r['rc']:>3}{_fmt(r['p50_ms']):>10}{_fmt(r['p95_ms']):>10}"
+              f"{_fmt(r['max_ms']):>10}{_fmt(r['rss_mb']):>9}{_fmt(r['lock_wait_ms']):>9}{marca}")
+
+
+def comparar(resultados, base, tolerancia):
+    """
+    Devuelve {check: [descripciones]} de las métricas que empeoraron más que la tolerancia.
+    """
+    previos = {r['check']: r for r in base['resultados']}
+    regresiones = {}
+    for r in resultados:
+        previo = previos.get(r['check'])
+        if previo is None:
+            continue
+        for metrica in ('p50_ms', 'rss_mb'):
+            antes, ahora = previo.get(metrica), r.get(metrica)
+            if antes and ahora and ahora > antes * (1 + tolerancia):
+                regresiones.setdefault(r['check'], []).append(f"{metrica} {antes:.1f} → {ahora:.1f}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo de los checks.")
+    parser.add_argument("--datos", help="Directorio con MessageLog.sqlite y SendQueue.sqlite (se generan si faltan).")
+    parser.add_argument("--filas", type=int, default=100000, help="Filas de MessageOut a generar (default: 100000).")
+    parser.add_argument("--gateways", type=int, default=200, help="Gateways del XML falso (default: 200).")
+    parser.add_argument("--flap", type=float, default=0.0, help="Probabilidad de cambio de estado en el XML falso.")
+    parser.add_argument("--repeticiones", type=int, default=10, help="Ejecuciones por check (default: 10).")
+    parser.add_argument("--checks", help="Lista de checks a ejecutar separados por coma (default: todos).")
+    parser.add_argument("--escritor", action='store_true', help="Simular escrituras concurrentes de Diafaan.")
+    parser.add_argument("--guardar", help="Guardar los resultados como línea base JSON.")
+    parser.add_argument("--comparar", help="Comparar contra una línea base JSON.")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Empeoramiento relativo tolerado antes de marcar regresión (default: 0.25).")
+    args = parser.parse_args()
+
+    trabajo = tempfile.mkdtemp(prefix='bench_checks_')
+    datos = args.datos or os.path.join(trabajo, 'datos')
+    messagelog = os.path.join(datos, 'MessageLog.sqlite')
+    sendqueue = os.path.join(datos, 'SendQueue.sqlite')
+    if not (os.path.exists(messagelog) and os.path.exists(sendqueue)):
+        print(f"Generando {args.filas} filas en {datos} ...")
+        generar_datos.generar(datos, args.filas, max(1000, args.filas // 20))
+
+    servidor = iniciar_servidor(EstadoFalso(args.gateways, args.flap))
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/"
+
+    config_dir = os.path.join(trabajo, 'config')
+    os.makedirs(config_dir)
+    setting = os.path.join(config_dir, 'Setting.ini')
+    licencia = os.path.join(config_dir, 'License.py')
+    with open(setting, 'w') as f:
+        f.write(setting_template.format(sendqueue=sendqueue, url=url, cache_dir=os.path.join(trabajo, 'cache'),
+                                        spool=os.path.join(trabajo, 'spool.sqlite')))
+    with open(licencia, 'w') as f:
+        f.write(license_template)
+
+    env = dict(os.environ, DIAFAAN_SETTING=setting, DIAFAAN_LICENSE=licencia, DIAFAAN_MESSAGELOG=messagelog)
+
+    seleccion = set(args.checks.split(',')) if args.checks else None
+    escritor = Escritor([messagelog, sendqueue]) if args.escritor else None
+    if escritor:
+        escritor.start()
+
+    resultados = []
+    try:
+        for nombre, script, argumentos in CHECKS:
+            if seleccion and nombre not in seleccion:
+                continue
+            print(f"{nombre} ...", flush=True)
+            resultados.append(medir(nombre, script, argumentos, env, args.repeticiones))
+    finally:
+        if escritor:
+            escritor.detener.set()
+            escritor.join()
+        servidor.shutdown()
+        # Los datos generados se descartan; con --datos se reutilizan entre corridas
+        shutil.rmtree(trabajo, ignore_errors=True)
+
+    regresiones = {}
+    if args.comparar:
+        with open(args.comparar) as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerancia)
+    imprimir(resultados, regresiones)
+
+    for r in resultados:
+        if r['error']:
+            print(f"ERROR en {r['check']}: {r['salida']}")
+    for check, detalles in regresiones.items():
+        print(f"REGRESIÓN en {check}: {', '.join(detalles)}")
+
+    if args.guardar:
+        with open(args.guardar, 'w') as f:
+            json.dump({'fecha': time.strftime('%Y-%m-%d %H:%M:%S'), 'filas': args.filas,
+                       'gateways': args.gateways, 'escritor': args.escritor, 'resultados': resultados}, f, indent=2)
+
+    if regresiones:
+        sys.exit(1)
+    if any(r['error'] for r in resultados):
+        sys.exit(2)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Script: bench_importtime.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Mide el costo de arranque de cada subcomando de diafaan-check con
+    `python -X importtime`: tiempo de importación del subcomando, tiempo de
+    proceso completo y las importaciones más pesadas. Sirve para verificar que
+    los subcomandos solo cargan sus dependencias (p. ej. que `queue` no
+    importa requests ni pyodbc) y, con --guardar/--comparar, para detectar
+    regresiones en el arranque.
+
+Uso:
+    python benchmarks/bench_importtime.py [--repeticiones 5] [--top 5] [subcomando ...]
+                                          [--guardar base.json] [--comparar base.json] [--tolerancia 0.25]
+
+Salida:
+    0 → sin regresiones
+    1 → hay regresiones respecto de la línea base
+
+Dependencias:
+    - Python 3.x
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import diafaan_check  # noqa: E402
+
+# Dependencias pesadas que conviene ver en la tabla cuando aparecen
+PESADAS = ('requests', 'pyodbc', 'asyncio', 'xml.etree.ElementTree', 'sqlite3')
+
+
+def importtime(subcomando):
+    """
+    Importa el subcomando en un proceso nuevo con -X importtime.
+    Devuelve (us_subcomando, {módulo: acumulado_us}, ms_proceso, error), donde
+    us_subcomando suma lo importado después de diafaan_check.
+    """
+    codigo = f"import diafaan_check; diafaan_check.cargar({subcomando!r})"
+    inicio = time.perf_counter()
+    proceso = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo],
+                             capture_output=True, text=True, cwd=RAIZ)
+    ms_proceso = (time.perf_counter() - inicio) * 1000
+
+    # importlib.import_module no queda registrado por -X importtime: las
+    # importaciones del subcomando aparecen en primer nivel después de diafaan_check
+    acumulados = {}
+    visto = False
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _, acumulado, nombre = linea[len('import time:'):].split('|', 2)
+        nombre = nombre[1:]
+        if nombre.startswith(' '):
+            continue
+        if visto:
+            acumulados[nombre] = int(acumulado)
+        visto = visto or nombre == 'diafaan_check'
+
+    error = None
+    if proceso.returncode != 0:
+        error = proceso.stderr.strip().splitlines()[-1]
+    return sum(acumulados.values()), acumulados, ms_proceso, error
+
+
+def medir(subcomando, repeticiones):
+    """
+    Repite la medición y devuelve el resultado con las medianas.
+    """
+    muestras_us, muestras_ms, ultimo = [], [], {}
+    for _ in range(repeticiones):
+        us, acumulados, ms, error = importtime(subcomando)
+        if error:
+            return {'error': error}
+        muestras_us.append(us)
+        muestras_ms.append(ms)
+        ultimo = acumulados
+    return {
+        'import_ms': round(statistics.median(muestras_us) / 1000, 2),
+        'proceso_ms': round(statistics.median(muestras_ms), 2),
+        'pesadas': sorted(m for m in ultimo if m in PESADAS),
+        'top': sorted(ultimo.items(), key=lambda x: x[1], reverse=True),
+    }
+
+
+def comparar(resultados, base, tolerancia):
+    """
+    Devuelve las regresiones de import_ms respecto de la línea base.
+    """
+    regresiones = []
+    for nombre, r in resultados.items():
+        previo = base.get(nombre)
+        if not previo or 'error' in r or 'error' in previo:
+            continue
+        limite = previo['import_ms'] * (1 + tolerancia)
+        if r['import_ms'] > limite:
+            regresiones.append(f"{nombre}: import_ms {previo['import_ms']} → {r['import_ms']}")
+        nuevas = set(r['pesadas']) - set(previo['pesadas'])
+        if nuevas:
+            regresiones.append(f"{nombre}: nuevas dependencias pesadas {', '.join(sorted(nuevas))}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Costo de arranque de los subcomandos de diafaan-check.")
+    parser.add_argument("subcomandos", nargs='*', help="Subcomandos a medir (default: todos).")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Mediciones por subcomando (default: 5).")
+    parser.add_argument("--top", type=int, default=5, help="Importaciones más pesadas a mostrar (default: 5).")
+    parser.add_argument("--guardar", help="Guarda los resultados como línea base JSON.")
+    parser.add_argument("--comparar", help="Compara contra una línea base JSON.")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Aumento relativo permitido antes de marcar regresión (default: 0.25).")
+    args = parser.parse_args()
+
+    nombres = args.subcomandos or list(diafaan_check.SUBCOMANDOS)
+    desconocidos = [n for n in nombres if n not in diafaan_check.SUBCOMANDOS]
+    if desconocidos:
+        parser.error(f"subcomandos desconocidos: {', '.join(desconocidos)}")
+
+    resultados = {}
+    print(f"{'subcomando':<16} {'import_ms':>10} {'proceso_ms':>11}  pesadas / más costosas")
+    for nombre in nombres:
+        r = medir(nombre, args.repeticiones)
+        if 'error' in r:
+            print(f"{nombre:<16} {'-':>10} {'-':>11}  ERROR: {r['error']}")
+        else:
+            top = ", ".join(f"{m} {us / 1000:.1f}ms" for m, us in r['top'][:args.top])
+            pesadas = ",".join(r['pesadas']) or "-"
+            print(f"{nombre:<16} {r['import_ms']:>10.2f} {r['proceso_ms']:>11.2f}  [{pesadas}] {top}")
+            del r['top']
+        resultados[nombre] = r
+
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(resultados, base, args.tolerancia)
+        if regresiones:
+            print("Regresiones:")
+            for r in regresiones:
+                print(f"  {r}")
+            sys.exit(1)
+        print("Sin regresiones.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Script: generar_datos.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Genera bases SQLite sintéticas con la forma de las de Diafaan para
+    pruebas de carga de los checks, sin tocar producción:
+        MessageLog.sqlite → tabla MessageOut (GatewayId, StatusCode, Priority, SendTime)
+        SendQueue.sqlite  → tabla SendQueue (gatewayid, Priority, CreateTime)
+    Distribuciones:
+        - Gateways: las de Q_completo.active_gateways más algunas inactivas,
+          con tráfico tipo Zipf (pocas gateways concentran la mayoría).
+        - Prioridad: mayoría 0, cola decreciente hasta 9.
+        - StatusCode: ~93% éxito (0), el resto repartido en códigos de error
+          habituales (300, 500, 202, 400, 301).
+        - SendTime: creciente con el rowid, repartido en los últimos `--dias`.
+    Escala de 10k a decenas de millones de filas (inserción por lotes con
+    journal desactivado; la base se puede volver a generar en cualquier momento).
+
+Uso:
+    python benchmarks/generar_datos.py --salida <directorio> [--filas 1000000] [--cola N]
+                                       [--dias 7] [--semilla 1] [--indices]
+
+Ejemplo:
+    python benchmarks/generar_datos.py --salida C:\\bench --filas 50000000 --cola 2000000
+
+Dependencias:
+    - Python 3.x
+    - sqlite3 (incluido en la librería estándar)
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import datetime
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Q_completo        # noqa: E402
+import index_advisor     # noqa: E402
+
+LOTE = 100000
+
+GATEWAYS_INACTIVAS = [1, 4, 10, 11, 12]
+PRIORIDADES = [(0, 70), (1, 15), (2, 7), (3, 3), (4, 2), (5, 1), (6, 0.8), (7, 0.6), (8, 0.4), (9, 0.2)]
+STATUS_CODES = [(0, 93), (300, 3), (500, 1.5), (202, 1), (400, 1), (301, 0.5)]
+
+schema_messagelog = """
+CREATE TABLE MessageOut (
+    Id         INTEGER PRIMARY KEY,
+    GatewayId  INTEGER,
+    StatusCode INTEGER,
+    Priority   INTEGER,
+    ToAddress  TEXT,
+    SendTime   TEXT
+);
+"""
+
+schema_sendqueue = """
+CREATE TABLE SendQueue (
+    Id         INTEGER PRIMARY KEY,
+    gatewayid  INTEGER,
+    Priority   INTEGER,
+    ToAddress  TEXT,
+    CreateTime TEXT
+);
+"""
+
+
+def distribucion_gateways():
+    """
+    Pesos tipo Zipf para las gateways activas; las inactivas casi sin tráfico.
+    """
+    pesos = [(gw, 1.0 / (rango + 1) ** 1.1) for rango, gw in enumerate(Q_completo.active_gateways)]
+    pesos += [(gw, 0.001) for gw in GATEWAYS_INACTIVAS]
+    return pesos
+
+
+def _muestreador(rnd, pares):
+    valores = [v for v, _ in pares]
+    acumulados = list(accumulate(p for _, p in pares))
+    return lambda k: rnd.choices(valores, cum_weights=acumulados, k=k)
+
+
+def _filas(rnd, total, inicio, fin, con_status):
+    gateways = _muestreador(rnd, distribucion_gateways())
+    prioridades = _muestreador(rnd, PRIORIDADES)
+    codigos = _muestreador(rnd, STATUS_CODES)
+    paso = (fin - inicio) / max(total, 1)
+    generadas = 0
+    while generadas < total:
+        n = min(LOTE, total - generadas)
+        gws, prios = gateways(n), prioridades(n)
+        stats = codigos(n) if con_status else None
+        lote = []
+        for k in range(n):
+            momento = datetime.datetime.fromtimestamp(inicio + (generadas + k) * paso).strftime('%Y-%m-%d %H:%M:%S')
+            destino = f"569{rnd.randrange(10000000, 99999999)}"
+            if con_status:
+                lote.append((gws[k], stats[k], prios[k], destino, momento))
+            else:
+                lote.append((gws[k], prios[k], destino, momento))
+        generadas += n
+        yield lote
+
+
+def _crear(path, schema):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    conn.execute(schema)
+    return conn
+
+
+def generar(salida, filas, cola, dias=7, semilla=1, indices=False):
+    """
+    Genera MessageLog.sqlite y SendQueue.sqlite en `salida`. Devuelve sus rutas.
+    """
+    os.makedirs(salida, exist_ok=True)
+    rnd = random.Random(semilla)
+    fin = time.time()
+    inicio = fin - dias * 86400
+
+    messagelog = os.path.join(salida, 'MessageLog.sqlite')
+    conn = _crear(messagelog, schema_messagelog)
+    for lote in _filas(rnd, filas, inicio, fin, con_status=True):
+        conn.executemany("INSERT INTO MessageOut (GatewayId, StatusCode, Priority, ToAddress, SendTime) "
+                         "VALUES (?, ?, ?, ?, ?);", lote)
+        conn.commit()
+
+    sendqueue = os.path.join(salida, 'SendQueue.sqlite')
+    conn_cola = _crear(sendqueue, schema_sendqueue)
+    # La cola representa los mensajes de la última hora aún no enviados
+    for lote in _filas(rnd, cola, fin - 3600, fin, con_status=False):
+        conn_cola.executemany("INSERT INTO SendQueue (gatewayid, Priority, ToAddress, CreateTime) "
+                              "VALUES (?, ?, ?, ?);", lote)
+        conn_cola.commit()
+
+    if indices:
+        for _, _, _, _, tabla, columnas in index_advisor.CONSULTAS_SQLITE:
+            destino = conn if tabla.lower() == 'messageout' else conn_cola
+            destino.execute(index_advisor.ddl_indice(tabla, columnas))
+        conn.commit()
+        conn_cola.commit()
+
+    for c in (conn, conn_cola):
+        c.execute("PRAGMA journal_mode=DELETE;")
+        c.close()
+    return messagelog, sendqueue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera bases SQLite sintéticas de Diafaan para benchmarks.")
+    parser.add_argument("--salida", required=True, help="Directorio de salida.")
+    parser.add_argument("--filas", type=int, default=1000000, help="Filas de MessageOut (default: 1000000).")
+    parser.add_argument("--cola", type=int, help="Filas de SendQueue (default: filas/20, mínimo 1000).")
+    parser.add_argument("--dias", type=float, default=7, help="Días cubiertos por SendTime (default: 7).")
+    parser.add_argument("--semilla", type=int, default=1, help="Semilla aleatoria (default: 1).")
+    parser.add_argument("--indices", action='store_true', help="Crear los índices sugeridos por index_advisor.py.")
+    args = parser.parse_args()
+
+    cola = args.cola if args.cola is not None else max(1000, args.filas // 20)
+    inicio = time.perf_counter()
+    messagelog, sendqueue = generar(args.salida, args.filas, cola, args.dias, args.semilla, args.indices)
+    print(f"{messagelog}: {args.filas} filas")
+    print(f"{sendqueue}: {cola} filas")
+    print(f"Generado en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Script: smsc_falso.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    SMSC SMPP mínimo para probar sonda_smpp.py sin un operador real.
+    - Acepta bind_transmitter / bind_receiver / bind_transceiver (con
+      --password valida la clave y responde ESME_RINVPASWD si no coincide).
+    - Responde enquire_link con un retardo configurable (--latencia-ms, más
+      un jitter uniforme de --jitter-ms) y descarta una fracción de las
+      respuestas (--perdida) para simular un SMSC degradado.
+    - Con --enquire-cada envía sus propios enquire_link a cada sesión.
+    - Cuenta conexiones, binds y enquire_link atendidos; se imprimen al
+      terminar, de modo que se puede verificar que la sonda no vuelve a hacer
+      bind en cada check.
+
+Uso:
+    python benchmarks/smsc_falso.py [--puerto 2775] [--latencia-ms 0] [--jitter-ms 0]
+                                    [--perdida 0.0] [--password CLAVE] [--enquire-cada 0]
+
+Dependencias:
+    - Python 3.x
+"""
+
+import os
+import sys
+import random
+import asyncio
+import argparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from sonda_smpp import (  # noqa: E402
+    ENQUIRE_LINK, GENERIC_NACK, MODOS, RESP, UNBIND, ErrorSMPP, leer_pdu, pdu,
+)
+
+ESME_RINVPASWD = 0x0000000E
+ESME_RINVCMDID = 0x00000003
+
+
+class SMSCFalso:
+    """
+    Estado y contadores del SMSC simulado.
+    """
+
+    def __init__(self, latencia_ms=0.0, jitter_ms=0.0, perdida=0.0, password=None, enquire_cada=0.0, semilla=1):
+        self.latencia = latencia_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.perdida = perdida
+        self.password = password
+        self.enquire_cada = enquire_cada
+        self.rnd = random.Random(semilla)
+        self.conexiones = 0
+        self.binds = 0
+        self.enquire_links = 0
+        self.descartados = 0
+
+    def _password(self, cuerpo):
+        partes = cuerpo.split(b'\x00')
+        return partes[1].decode('ascii', 'replace') if len(partes) > 1 else ''
+
+    async def _responder_tarde(self, writer, respuesta):
+        await asyncio.sleep(self.latencia + self.rnd.uniform(0, self.jitter))
+        if not writer.is_closing():
+            writer.write(respuesta)
+
+    async def _enquire_propio(self, writer):
+        secuencia = 0x40000000
+        while not writer.is_closing():
+            await asyncio.sleep(self.enquire_cada)
+            secuencia += 1
+            writer.write(pdu(ENQUIRE_LINK, secuencia))
+
+    async def atender(self, reader, writer):
+        self.conexiones += 1
+        enlazada = False
+        propio = None
+        try:
+            while True:
+                command_id, _, secuencia, cuerpo = await leer_pdu(reader)
+                if command_id in MODOS.values():
+                    if self.password is not None and self._password(cuerpo) != self.password:
+                        writer.write(pdu(command_id | RESP, secuencia, b'\x00', status=ESME_RINVPASWD))
+                        continue
+                    self.binds += 1
+                    enlazada = True
+                    writer.write(pdu(command_id | RESP, secuencia, b'smsc_falso\x00'))
+                    if self.enquire_cada and propio is None:
+                        propio = asyncio.ensure_future(self._enquire_propio(writer))
+                elif command_id == ENQUIRE_LINK and enlazada:
+                    self.enquire_links += 1
+                    if self.rnd.random() < self.perdida:
+                        self.descartados += 1
+                        continue
+                    respuesta = pdu(ENQUIRE_LINK | RESP, secuencia)
+                    if self.latencia or self.jitter:
+                        asyncio.ensure_future(self._responder_tarde(writer, respuesta))
+                    else:
+                        writer.write(respuesta)
+                elif command_id == UNBIND:
+                    writer.write(pdu(UNBIND | RESP, secuencia))
+                    await writer.drain()
+                    break
+                elif not command_id & RESP:
+                    writer.write(pdu(GENERIC_NACK, secuencia, status=ESME_RINVCMDID))
+        except (asyncio.IncompleteReadError, ConnectionError, ErrorSMPP):
+            pass
+        finally:
+            if propio is not None:
+                propio.cancel()
+            writer.close()
+
+    def resumen(self):
+        return (f"conexiones={self.conexiones} binds={self.binds} "
+                f"enquire_link={self.enquire_links} descartados={self.descartados}")
+
+
+async def iniciar_servidor(smsc, host='127.0.0.1', port=0):
+    """
+    Levanta el SMSC en el loop actual y devuelve el servidor asyncio
+    (server.sockets[0].getsockname() contiene el puerto asignado si port=0).
+    """
+    return await asyncio.start_server(smsc.atender, host, port)
+
+
+async def _main(args):
+    smsc = SMSCFalso(args.latencia_ms, args.jitter_ms, args.perdida, args.password, args.enquire_cada)
+    server = await iniciar_servidor(smsc, args.host, args.puerto)
+    puerto = server.sockets[0].getsockname()[1]
+    print(f"SMSC falso en {args.host}:{puerto} (latencia {args.latencia_ms:g} ms, pérdida {args.perdida:g})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        print(smsc.resumen())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SMSC SMPP falso para pruebas de sonda_smpp.py.")
+    parser.add_argument("--host", default='127.0.0.1', help="Dirección de escucha (default: 127.0.0.1).")
+    parser.add_argument("--puerto", type=int, default=2775, help="Puerto de escucha (default: 2775).")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Retardo de cada enquire_link_resp.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Jitter uniforme agregado al retardo.")
+    parser.add_argument("--perdida", type=float, default=0.0, help="Fracción de enquire_link sin respuesta.")
+    parser.add_argument("--password", help="Clave exigida en el bind (default: cualquiera).")
+    parser.add_argument("--enquire-cada", type=float, default=0.0,
+                        help="Segundos entre enquire_link enviados por el SMSC (default: 0, no envía).")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Script: xml_falso.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Endpoint HTTP local que imita el XML de estado de Diafaan, para probar
+    SendQueue.py, GW_status_email.py y el exporter sin el servidor real.
+    - Cantidad de gateways configurable; los contadores (SentMessages,
+      FailedMessages, ReceivedMessages) crecen con el tiempo.
+    - Con --flap cada gateway cambia de estado con esa probabilidad en cada
+      regeneración del documento (simula una caída masiva de operador).
+    - El documento se regenera como máximo cada --refresco segundos y se
+      sirve con ETag / Last-Modified; responde 304 a los GET condicionales.
+    - --latencia-ms agrega un retardo artificial a cada respuesta.
+
+Uso:
+    python benchmarks/xml_falso.py [--gateways 50] [--puerto 8099] [--flap 0.0]
+                                   [--refresco 1] [--latencia-ms 0]
+
+Dependencias:
+    - Python 3.x
+"""
+
+import time
+import random
+import argparse
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class EstadoFalso:
+    """
+    Estado simulado de las gateways y documento XML vigente.
+    """
+
+    def __init__(self, gateways=50, flap=0.0, refresco=1.0, semilla=1):
+        self.rnd = random.Random(semilla)
+        self.flap = flap
+        self.refresco = refresco
+        self.nombres = [f"SMPP_Gateway_{i}" for i in range(1, gateways + 1)]
+        self.activas = {n: self.rnd.random() > 0.05 for n in self.nombres}
+        self.tasas = {n: self.rnd.uniform(1, 200) for n in self.nombres}
+        self.inicio = time.time()
+        self.version = 0
+        self.generado = 0.0
+        self.documento = b""
+        self.modificado = formatdate(usegmt=True)
+        self._lock = threading.Lock()
+
+    def _generar(self):
+        transcurrido = time.time() - self.inicio
+        for nombre in self.nombres:
+            if self.flap and self.rnd.random() < self.flap:
+                self.activas[nombre] = not self.activas[nombre]
+        partes = [f"<DiafaanStatus><Statistics><MessagesInSendQueue>{self.rnd.randrange(0, 5000)}"
+                  f"</MessagesInSendQueue></Statistics><Gateways>"]
+        for nombre in self.nombres:
+            enviados = int(self.tasas[nombre] * transcurrido)
+            activa = self.activas[nombre]
+            partes.append(
+                f'<Gateway Name="{nombre}" Active="{1 if activa else 0}">'
+                f"<Status>{'Connected' if activa else 'Disconnected'}</Status><Statistics>"
+                f"<SentMessages>{enviados}</SentMessages>"
+                f"<FailedMessages>{enviados // 50}</FailedMessages>"
+                f"<ReceivedMessages>{enviados // 10}</ReceivedMessages>"
+                f"</Statistics></Gateway>")
+        partes.append("</Gateways></DiafaanStatus>")
+        self.documento = "".join(partes).encode('utf-8')
+        self.version += 1
+        self.modificado = formatdate(usegmt=True)
+
+    def actual(self):
+        """
+        Devuelve (documento, etag, last_modified), regenerando si venció el refresco.
+        """
+        with self._lock:
+            if time.monotonic() - self.generado >= self.refresco:
+                self._generar()
+                self.generado = time.monotonic()
+            return self.documento, f'"v{self.version}"', self.modificado
+
+
+class XMLFalsoHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        estado = self.server.estado
+        if self.server.latencia:
+            time.sleep(self.server.latencia)
+        documento, etag, modificado = estado.actual()
+        self.server.peticiones += 1
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(documento)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', modificado)
+        self.end_headers()
+        self.wfile.write(documento)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def iniciar_servidor(estado, host='127.0.0.1', port=0, latencia_ms=0):
+    """
+    Levanta el endpoint en un hilo de fondo y devuelve el servidor
+    (server.server_address contiene el puerto asignado si port=0).
+    """
+    server = ThreadingHTTPServer((host, port), XMLFalsoHandler)
+    server.daemon_threads = True
+    server.estado = estado
+    server.latencia = latencia_ms / 1000.0
+    server.peticiones = 0
+    threading.Thread(target=server.serve_forever, name='xml_falso', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoint XML falso de Diafaan para pruebas.")
+    parser.add_argument("--gateways", type=int, default=50, help="Cantidad de gateways (default: 50).")
+    parser.add_argument("--host", default='127.0.0.1', help="Dirección de escucha (default: 127.0.0.1).")
+    parser.add_argument("--puerto", type=int, default=8099, help="Puerto de escucha (default: 8099).")
+    parser.add_argument("--flap", type=float, default=0.0, help="Probabilidad de cambio de estado por regeneración.")
+    parser.add_argument("--refresco", type=float, default=1.0, help="Segundos entre regeneraciones (default: 1).")
+    parser.add_argument("--latencia-ms", type=float, default=0, help="Retardo artificial por respuesta.")
+    args = parser.parse_args()
+
+    estado = EstadoFalso(args.gateways, args.flap, args.refresco)
+    server = iniciar_servidor(estado, args.host, args.puerto, args.latencia_ms)
+    print(f"XML falso con {args.gateways} gateways en http://{args.host}:{server.server_address[1]}/")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
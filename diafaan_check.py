@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Script: diafaan_check.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Punto de entrada único para los checks de Nagios (`diafaan-check`).
+    Cada subcomando importa solo el script que le corresponde en el momento
+    de ejecutarlo, por lo que `diafaan-check queue` nunca carga requests ni
+    pyodbc, y el arranque de los checks SQLite se reduce a lo indispensable.
+    Setting.ini y la fecha de License.py se leen a través de la caché entre
+    ejecuciones de monitor_comun.py.
+    Los argumentos y la salida de cada subcomando son los del script original.
+    Las opciones antes del subcomando miden el check (instrumentacion.py):
+        --tiempos          → agrega a la perfdata los segundos de cada fase
+                             (t_config, t_license, t_db_connect, t_lock_wait,
+                             t_query, t_http_fetch, t_xml_parse, ..., t_total)
+        --traza ARCHIVO    → agrega los tiempos del check al archivo (JSON lines)
+        --perfilar [N]     → ejecuta el check con cProfile y muestra en stderr
+                             las N funciones con más tiempo propio (default: 20)
+    DIAFAAN_TIEMPOS=1 y DIAFAAN_TRAZA=ARCHIVO activan las dos primeras sin
+    modificar los comandos de Nagios.
+
+Uso:
+    diafaan-check [--tiempos] [--traza ARCHIVO] [--perfilar [N]] <subcomando> [argumentos del script]
+    python diafaan_check.py <subcomando> [argumentos del script]
+
+Subcomandos:
+    tps              → GW_TPS.py
+    tps-incremental  → tps_incremental.py
+    tps-xml          → tasas_xml.py
+    queue            → Q_completo.py
+    sendqueue        → SendQueue.py
+    priority         → total_Priority.py
+    errors           → SMS_GW_Status.py
+    status           → GW_status_email.py
+    latency          → latencia_GW.py
+    smpp             → sonda_smpp.py
+
+Ejemplo:
+    diafaan-check priority --todas --por-gateway
+    diafaan-check errors 2 300 --error_threshold 5000
+    diafaan-check --tiempos --traza /var/log/diafaan_tiempos.jsonl queue
+
+Dependencias:
+    - Python 3.x
+    - pyodbc (tps), requests (tps-xml, sendqueue, status)
+"""
+
+import os
+import sys
+import importlib
+
+from instrumentacion import fase, ejecutar_instrumentado
+
+STATE_UNKNOWN = 3
+PERFILAR_TOP = 20
+
+# subcomando → (módulo, descripción)
+SUBCOMANDOS = {
+    'tps': ('GW_TPS', 'TPS por gateway en el último minuto (SQL Server).'),
+    'tps-incremental': ('tps_incremental', 'TPS por ventanas desde un motor incremental.'),
+    'tps-xml': ('tasas_xml', 'TPS y fallos por gateway desde los contadores del XML.'),
+    'queue': ('Q_completo', 'Mensajes en SendQueue por gatewayid (SQLite).'),
+    'sendqueue': ('SendQueue', 'MessagesInSendQueue desde el XML de Diafaan.'),
+    'priority': ('total_Priority', 'Mensajes pendientes por prioridad (SQLite).'),
+    'errors': ('SMS_GW_Status', 'Errores por StatusCode y gateway (SQLite).'),
+    'status': ('GW_status_email', 'Estado de gateways desde el XML con alertas por correo.'),
+    'latency': ('latencia_GW', 'Latencia TCP a uno o varios destinos.'),
+    'smpp': ('sonda_smpp', 'Round-trip de enquire_link SMPP (bind, N muestras, unbind).'),
+}
+
+
+def uso():
+    lineas = ["Uso: diafaan-check [--tiempos] [--traza ARCHIVO] [--perfilar [N]] <subcomando> [argumentos]",
+              "", "Subcomandos:"]
+    for nombre, (modulo, descripcion) in SUBCOMANDOS.items():
+        lineas.append(f"  {nombre:<16} {descripcion} ({modulo}.py)")
+    return "\n".join(lineas)
+
+
+def cargar(subcomando):
+    """
+    Importa el módulo del subcomando y devuelve su función main.
+    """
+    return importlib.import_module(SUBCOMANDOS[subcomando][0]).main
+
+
+def ejecutar(subcomando, argumentos):
+    """
+    Importa el script del subcomando y ejecuta su main con sus argumentos.
+    La importación queda dentro de la medición: varios scripts leen
+    Setting.ini y License.py al cargarse.
+    """
+    try:
+        with fase('import'):
+            funcion = cargar(subcomando)
+    except ImportError as e:
+        print(f"UNKNOWN: Falta una dependencia para '{subcomando}': {e}")
+        sys.exit(STATE_UNKNOWN)
+
+    # El parser del script ve sus propios argumentos
+    sys.argv = [f"diafaan-check {subcomando}"] + argumentos
+    funcion()
+
+
+def opciones_globales(argv):
+    """
+    Separa las opciones de instrumentación que preceden al subcomando.
+    Devuelve (opciones, resto de argv); lanza ValueError si una opción es inválida.
+    """
+    opciones = {
+        'tiempos': os.environ.get('DIAFAAN_TIEMPOS', '') not in ('', '0'),
+        'traza': os.environ.get('DIAFAAN_TRAZA') or None,
+        'perfilar': 0,
+    }
+    argv = list(argv)
+    while argv and argv[0].startswith('--') and argv[0] != '--help':
+        opcion = argv.pop(0)
+        if opcion == '--tiempos':
+            opciones['tiempos'] = True
+        elif opcion == '--traza':
+            if not argv:
+                raise ValueError("--traza requiere un archivo")
+            opciones['traza'] = argv.pop(0)
+        elif opcion == '--perfilar':
+            opciones['perfilar'] = int(argv.pop(0)) if argv and argv[0].isdigit() else PERFILAR_TOP
+        else:
+            raise ValueError(f"opción desconocida '{opcion}'")
+    return opciones, argv
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        opciones, argv = opciones_globales(argv)
+    except ValueError as e:
+        print(f"UNKNOWN: {e}\n{uso()}")
+        sys.exit(STATE_UNKNOWN)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(uso())
+        sys.exit(0 if argv else STATE_UNKNOWN)
+
+    subcomando = argv[0]
+    if subcomando not in SUBCOMANDOS:
+        print(f"UNKNOWN: Subcomando desconocido '{subcomando}'\n{uso()}")
+        sys.exit(STATE_UNKNOWN)
+
+    if opciones['tiempos'] or opciones['traza'] or opciones['perfilar']:
+        ejecutar_instrumentado(lambda: ejecutar(subcomando, argv[1:]), subcomando, argv[1:],
+                               opciones['tiempos'], opciones['traza'], opciones['perfilar'])
+    ejecutar(subcomando, argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: diafaan_xml.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Caché compartida del XML de estado de la API de Diafaan.
+    Todos los checks que leen el XML (GW_status_email.py, SendQueue.py y el
+    daemon) obtienen el documento a través de esta caché: dentro de la
+    ventana TTL se reutiliza la última descarga guardada en disco, y al
+    expirar se hace un GET condicional (ETag / Last-Modified) de modo que
+    N checks por ciclo producen una sola descarga.
+    Un archivo de lock evita que varios procesos descarguen el XML a la vez.
+    Si el directorio de la caché no se puede usar (permisos, disco lleno)
+    el XML se descarga sin caché y se avisa una vez en stderr.
+
+    Para instalaciones con cientos de gateways, iterar_gateways() recorre el
+    documento una sola vez con iterparse y entrega un registro compacto por
+    gateway, liberando cada elemento apenas se lee (memoria constante).
+    La espera del lock, la descarga y el parseo se registran como fases
+    xml_lock, http_fetch y xml_parse en instrumentacion.py.
+
+Configuración (Setting.ini, sección opcional [cache]):
+    xml_ttl = 30          → segundos de validez de la copia (0 = sin caché)
+    xml_dir = C:\\ruta    → directorio de la caché (default: directorio temporal)
+
+Dependencias:
+    - Python 3.x
+    - requests
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import xml.etree.ElementTree as ET
+
+import requests
+
+from instrumentacion import fase
+
+DEFAULT_TTL = 30          # segundos
+DEFAULT_TIMEOUT = 10      # segundos de espera en la petición HTTP
+LOCK_WAIT = 15            # segundos máximos esperando a otro proceso que descarga
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'diafaan_xml_cache')
+
+
+class XMLSnapshotCache:
+    """
+    Caché del XML de estado respaldada en disco, con TTL y GET condicional.
+    Mantiene además en memoria el último árbol parseado por URL, de modo que
+    un proceso de larga duración no vuelve a parsear un documento sin cambios.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT, session=None):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = session if session is not None else requests
+        self._parsed = {}
+        self._gateways = {}
+        self._aviso_cache = False
+
+    # -- Rutas ---------------------------------------------------------------
+
+    def _base(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def _leer_meta(self, base):
+        try:
+            with open(base + '.json', 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _leer_contenido(self, base):
+        try:
+            with open(base + '.xml', 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _escribir(self, base, contenido, meta):
+        """
+        Escribe contenido y metadatos de forma atómica (archivo temporal + replace).
+        """
+        if contenido is not None:
+            tmp = f"{base}.xml.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(contenido)
+            os.replace(tmp, base + '.xml')
+        tmp = f"{base}.json.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, base + '.json')
+
+    def _vigente(self, meta):
+        return meta is not None and time.time() - meta.get('checked_at', 0) < self.ttl
+
+    # -- Lock entre procesos -------------------------------------------------
+
+    def _adquirir_lock(self, base):
+        """
+        Intenta crear el archivo de lock. Devuelve True si se obtuvo, False si
+        se agotó la espera (en ese caso el proceso descarga sin lock).
+        """
+        lock_path = base + '.lock'
+        limite = time.monotonic() + LOCK_WAIT
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    # Lock huérfano de un proceso que terminó sin liberarlo
+                    if time.time() - os.path.getmtime(lock_path) > self.timeout + LOCK_WAIT:
+                        os.remove(lock_path)
+                        continue
+                except OSError:
+                    continue
+            if time.monotonic() >= limite:
+                return False
+            time.sleep(0.05)
+
+    def _liberar_lock(self, base):
+        try:
+            os.remove(base + '.lock')
+        except OSError:
+            pass
+
+    # -- API pública ---------------------------------------------------------
+
+    def obtener_contenido(self, url):
+        """
+        Devuelve (contenido, version) del XML. `version` cambia solo cuando el
+        documento descargado cambia. Lanza requests.RequestException si falla la descarga.
+        """
+        contenido, version, _ = self.obtener_muestra(url)
+        return contenido, version
+
+    def obtener_muestra(self, url):
+        """
+        Como obtener_contenido(), pero devuelve (contenido, version, revisado):
+        `revisado` es el instante (epoch) en que el servidor confirmó por
+        última vez el documento, por descarga o por revalidación (304).
+        Se mantiene mientras la copia siga vigente dentro del TTL.
+        """
+        if self.ttl <= 0:
+            return self._descargar_sin_cache(url)
+        try:
+            return self._obtener_con_cache(url)
+        except requests.RequestException:
+            # RequestException hereda de OSError: un error de red no se reintenta sin caché
+            raise
+        except OSError as e:
+            self._avisar_cache(e)
+            return self._descargar_sin_cache(url)
+
+    def _descargar_sin_cache(self, url):
+        with fase('http_fetch'):
+            response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content, None, time.time()
+
+    def _avisar_cache(self, error):
+        if not self._aviso_cache:
+            self._aviso_cache = True
+            print(f"Aviso: caché del XML no disponible en {self.cache_dir} ({error}); se descarga sin caché",
+                  file=sys.stderr)
+
+    def _obtener_con_cache(self, url):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        base = self._base(url)
+        meta = self._leer_meta(base)
+        if self._vigente(meta):
+            contenido = self._leer_contenido(base)
+            if contenido is not None:
+                return contenido, meta.get('version'), meta.get('checked_at')
+
+        with fase('xml_lock'):
+            con_lock = self._adquirir_lock(base)
+        try:
+            # Otro proceso pudo haber refrescado la copia mientras se esperaba el lock
+            meta = self._leer_meta(base)
+            contenido = self._leer_contenido(base) if meta else None
+            if contenido is not None and self._vigente(meta):
+                return contenido, meta.get('version'), meta.get('checked_at')
+            return self._descargar(url, base, meta, contenido)
+        finally:
+            if con_lock:
+                self._liberar_lock(base)
+
+    def _descargar(self, url, base, meta, contenido):
+        headers = {}
+        if contenido is not None and meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        with fase('http_fetch'):
+            response = self.session.get(url, timeout=self.timeout, headers=headers)
+        ahora = time.time()
+
+        if response.status_code == 304 and contenido is not None:
+            meta['checked_at'] = ahora
+            self._guardar(base, None, meta)
+            return contenido, meta.get('version'), ahora
+
+        response.raise_for_status()
+        meta = {
+            'url': url,
+            'checked_at': ahora,
+            'version': f"{ahora:.6f}",
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        self._guardar(base, response.content, meta)
+        return response.content, meta['version'], ahora
+
+    def _guardar(self, base, contenido, meta):
+        # La descarga ya se hizo: si la copia no se puede guardar se usa igual
+        try:
+            self._escribir(base, contenido, meta)
+        except OSError as e:
+            self._avisar_cache(e)
+
+    def obtener_root(self, url):
+        """
+        Devuelve el elemento raíz del XML. Si el documento no cambió desde la
+        última llamada en este proceso se reutiliza el árbol ya parseado.
+        Lanza requests.RequestException o ET.ParseError.
+        """
+        contenido, version = self.obtener_contenido(url)
+        previo = self._parsed.get(url)
+        if version is not None and previo is not None and previo[0] == version:
+            return previo[1]
+        with fase('xml_parse'):
+            root = ET.fromstring(contenido)
+        self._parsed[url] = (version, root)
+        return root
+
+    def obtener_gateways(self, url):
+        """
+        Devuelve (gateways, servidor): la lista de registros compactos de
+        iterar_gateways() y las estadísticas globales del servidor.
+        Se reutiliza la extracción previa si el documento no cambió.
+        Lanza requests.RequestException o ET.ParseError.
+        """
+        contenido, version = self.obtener_contenido(url)
+        previo = self._gateways.get(url)
+        if version is not None and previo is not None and previo[0] == version:
+            return previo[1], previo[2]
+        servidor = {}
+        with fase('xml_parse'):
+            gateways = list(iterar_gateways(contenido, servidor))
+        self._gateways[url] = (version, gateways, servidor)
+        return gateways, servidor
+
+
+def iterar_gateways(contenido, servidor=None):
+    """
+    Recorre el XML una sola vez (iterparse) y entrega por cada <Gateway> un
+    dict compacto: Name, Active (bool), Status y los valores de su sección
+    Statistics (SentMessages, FailedMessages, ReceivedMessages, ...).
+    Cada elemento Gateway se libera y se desprende de su padre apenas se
+    procesa, por lo que la memoria no crece con el número de gateways.
+    Si se entrega el dict `servidor`, se completa con las estadísticas
+    globales (Statistics fuera de cualquier Gateway), p. ej. MessagesInSendQueue.
+    Lanza ET.ParseError si el documento no es válido.
+    """
+    pila = []
+    for evento, elem in ET.iterparse(io.BytesIO(contenido), events=('start', 'end')):
+        if evento == 'start':
+            pila.append(elem)
+            continue
+        pila.pop()
+
+        if elem.tag == 'Gateway':
+            registro = {
+                'Name': elem.get('Name'),
+                'Active': elem.get('Active') == '1',
+                'Status': elem.findtext('Status', default='N/A'),
+            }
+            statistics = elem.find('Statistics')
+            if statistics is not None:
+                for hijo in statistics:
+                    registro[hijo.tag] = hijo.text
+            elem.clear()
+            if pila:
+                pila[-1].remove(elem)
+            yield registro
+        elif elem.tag == 'Statistics' and servidor is not None and not any(e.tag == 'Gateway' for e in pila):
+            for hijo in elem:
+                servidor[hijo.tag] = hijo.text
+
+
+def cache_desde_config(config, session=None):
+    """
+    Crea la caché a partir de la sección opcional [cache] de Setting.ini.
+    """
+    ttl = config.getfloat('cache', 'xml_ttl', fallback=DEFAULT_TTL)
+    cache_dir = config.get('cache', 'xml_dir', fallback=DEFAULT_CACHE_DIR)
+    return XMLSnapshotCache(cache_dir=cache_dir, ttl=ttl, session=session)
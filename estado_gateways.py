@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: estado_gateways.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Almacén persistente del estado de las gateways para GW_status_email.py,
+    en reemplazo de gateway_status.txt.
+    - SQLite en modo WAL: los checks concurrentes leen sin bloquearse y las
+      escrituras se serializan en transacciones cortas (BEGIN IMMEDIATE).
+    - Upsert atómico por gateway: leer el estado previo y escribir el nuevo
+      ocurre en la misma transacción, por lo que dos checks simultáneos de la
+      misma gateway nunca detectan (ni notifican) el mismo cambio dos veces.
+    - Búsqueda por clave primaria (no se relee el archivo completo).
+    - Guarda la fecha del último cambio de estado, la última vez que se vio
+      la gateway y una instantánea de sus contadores del XML.
+    - La primera vez importa el contenido del gateway_status.txt existente.
+
+Dependencias:
+    - Python 3.x
+    - sqlite3 (incluido en la librería estándar, SQLite >= 3.24 para upsert)
+"""
+
+import os
+import sqlite3
+import datetime
+
+BUSY_TIMEOUT = 30   # segundos que una escritura espera a otra antes de fallar
+
+CAMPOS = ('nombre', 'activa', 'ultimo_cambio', 'ultima_vista', 'estado',
+          'enviados', 'fallidos', 'recibidos')
+
+schema = """
+CREATE TABLE IF NOT EXISTS gateway_estado (
+    nombre        TEXT PRIMARY KEY,
+    activa        INTEGER NOT NULL,
+    ultimo_cambio TEXT NOT NULL,
+    ultima_vista  TEXT NOT NULL,
+    estado        TEXT,
+    enviados      INTEGER,
+    fallidos      INTEGER,
+    recibidos     INTEGER
+);
+"""
+
+select_query = f"SELECT {', '.join(CAMPOS)} FROM gateway_estado WHERE nombre = ?;"
+
+upsert_query = """
+INSERT INTO gateway_estado (nombre, activa, ultimo_cambio, ultima_vista, estado, enviados, fallidos, recibidos)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(nombre) DO UPDATE SET
+    ultimo_cambio = CASE WHEN activa <> excluded.activa THEN excluded.ultimo_cambio ELSE ultimo_cambio END,
+    activa        = excluded.activa,
+    ultima_vista  = excluded.ultima_vista,
+    estado        = excluded.estado,
+    enviados      = excluded.enviados,
+    fallidos      = excluded.fallidos,
+    recibidos     = excluded.recibidos;
+"""
+
+
+def _ahora():
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _contador(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _registro(fila):
+    if fila is None:
+        return None
+    registro = dict(zip(CAMPOS, fila))
+    registro['activa'] = bool(registro['activa'])
+    return registro
+
+
+class EstadoGateways:
+    """
+    Estado por gateway sobre una base SQLite en modo WAL.
+    """
+
+    def __init__(self, db_path, timeout=BUSY_TIMEOUT):
+        self.db_path = db_path
+        # Autocommit: las transacciones se abren explícitamente con BEGIN IMMEDIATE
+        # planificador.py puede ejecutar el check de estado desde distintos hilos
+        # del pool (nunca dos a la vez), por eso la conexión no se ata a un hilo
+        self.conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute(schema)
+
+    def _upsert(self, nombre, activa, datos, momento):
+        previo = _registro(self.conn.execute(select_query, (nombre,)).fetchone())
+        self.conn.execute(upsert_query, (
+            nombre, 1 if activa else 0, momento, momento,
+            datos.get('Status'),
+            _contador(datos.get('SentMessages')),
+            _contador(datos.get('FailedMessages')),
+            _contador(datos.get('ReceivedMessages')),
+        ))
+        return previo
+
+    def registrar_varios(self, registros):
+        """
+        Registra [(nombre, activa, datos_xml), ...] en una sola transacción.
+        Devuelve {nombre: registro_previo} (None si la gateway es nueva).
+        """
+        momento = _ahora()
+        previos = {}
+        self.conn.execute("BEGIN IMMEDIATE;")
+        try:
+            for nombre, activa, datos in registros:
+                previos[nombre] = self._upsert(nombre, activa, datos, momento)
+            self.conn.execute("COMMIT;")
+        except BaseException:
+            self.conn.execute("ROLLBACK;")
+            raise
+        return previos
+
+    def registrar(self, nombre, activa, datos):
+        """
+        Registra el estado actual de una gateway y devuelve el registro previo
+        (dict con CAMPOS, o None si la gateway es nueva).
+        """
+        return self.registrar_varios([(nombre, activa, datos)])[nombre]
+
+    def revertir(self, nombre, activa, previo):
+        """
+        Deshace un cambio de estado que no se pudo notificar, para que el
+        siguiente check vuelva a detectarlo. Solo actúa si nadie registró
+        otro estado entre medio.
+        """
+        self.conn.execute("BEGIN IMMEDIATE;")
+        try:
+            if previo is None:
+                self.conn.execute("DELETE FROM gateway_estado WHERE nombre = ? AND activa = ?;",
+                                  (nombre, 1 if activa else 0))
+            else:
+                self.conn.execute("UPDATE gateway_estado SET activa = ?, ultimo_cambio = ? "
+                                  "WHERE nombre = ? AND activa = ?;",
+                                  (1 if previo['activa'] else 0, previo['ultimo_cambio'],
+                                   nombre, 1 if activa else 0))
+            self.conn.execute("COMMIT;")
+        except BaseException:
+            self.conn.execute("ROLLBACK;")
+            raise
+
+    def obtener(self, nombre):
+        return _registro(self.conn.execute(select_query, (nombre,)).fetchone())
+
+    def todas(self):
+        filas = self.conn.execute(f"SELECT {', '.join(CAMPOS)} FROM gateway_estado ORDER BY nombre;").fetchall()
+        return [_registro(fila) for fila in filas]
+
+    def importar_archivo(self, status_file_path):
+        """
+        Importa el formato anterior (`nombre=active|inactive` por línea) si la
+        tabla está vacía. Devuelve la cantidad de gateways importadas.
+        """
+        if not os.path.exists(status_file_path):
+            return 0
+        # Comprobación sin lock de escritura: en el caso normal la tabla ya tiene datos
+        if self.conn.execute("SELECT 1 FROM gateway_estado LIMIT 1;").fetchone() is not None:
+            return 0
+        momento = _ahora()
+        importadas = 0
+        self.conn.execute("BEGIN IMMEDIATE;")
+        try:
+            if self.conn.execute("SELECT 1 FROM gateway_estado LIMIT 1;").fetchone() is None:
+                with open(status_file_path, 'r') as f:
+                    for line in f:
+                        if '=' not in line:
+                            continue
+                        name, value = line.strip().rsplit('=', 1)
+                        self.conn.execute(
+                            "INSERT OR IGNORE INTO gateway_estado (nombre, activa, ultimo_cambio, ultima_vista) "
+                            "VALUES (?, ?, ?, ?);",
+                            (name, 1 if value == 'active' else 0, momento, momento))
+                        importadas += 1
+            self.conn.execute("COMMIT;")
+        except BaseException:
+            self.conn.execute("ROLLBACK;")
+            raise
+        return importadas
+
+    def cerrar(self):
+        self.conn.close()
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Script: index_advisor.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Verifica que las consultas que emiten los checks usen índices.
+    Ejecuta EXPLAIN QUERY PLAN (SQLite) sobre cada consulta registrada,
+    marca los recorridos completos de tabla (SCAN) y los GROUP BY con
+    B-tree temporal, y propone el índice que cubre la consulta.
+    Con --benchmark copia la base de datos a un archivo temporal, mide cada
+    consulta, crea los índices propuestos sobre la copia y vuelve a medir.
+    La base de datos original nunca se modifica.
+    Con --sqlserver obtiene además el plan estimado (SHOWPLAN_TEXT) de las
+    consultas de GW_TPS.py y tps_incremental.py.
+
+Uso:
+    python index_advisor.py --db <archivo.sqlite> [--benchmark] [--repeticiones N]
+    python index_advisor.py --sqlserver
+
+Ejemplo:
+    python index_advisor.py --db "C:\\ProgramData\\Diafaan\\Diafaan Message Server\\MessageLog.sqlite" --benchmark
+
+Salida:
+    0 → todas las consultas usan índices
+    1 → hay consultas con recorrido completo de tabla
+    3 → error al abrir la base de datos
+
+Dependencias:
+    - Python 3.x
+    - sqlite3 (incluido en la librería estándar)
+    - pyodbc (solo para --sqlserver)
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+import Q_completo
+import total_Priority
+import SMS_GW_Status
+import tps_incremental
+
+from sqlite_ro import conectar_ro
+from monitor_comun import STATE_OK, STATE_WARNING, STATE_UNKNOWN
+
+# Consultas SQLite emitidas por los checks:
+# (nombre, origen, sql, parámetros de ejemplo, tabla, columnas del índice sugerido)
+CONSULTAS_SQLITE = [
+    ("cola_por_gateway", "Q_completo.py", Q_completo.count_query, Q_completo.active_gateways,
+     "sendqueue", ("gatewayid",)),
+    ("cola_por_prioridad", "total_Priority.py", total_Priority.query, (1,),
+     "SendQueue", ("Priority",)),
+    ("histograma_prioridades", "total_Priority.py --todas", total_Priority.histogram_gateway_query, (),
+     "SendQueue", ("Priority", "gatewayid")),
+    ("errores_por_gateway", "SMS_GW_Status.py", SMS_GW_Status.query, (300, 2),
+     "MessageOut", ("StatusCode", "GatewayId")),
+    ("matriz_errores", "SMS_GW_Status.py --matriz --ventana", SMS_GW_Status.consulta_matriz(),
+     ("2026-01-01 00:00:00",), "MessageOut", ("SendTime", "StatusCode", "GatewayId")),
+    ("tps_incremental_sqlite", "tps_incremental.py", tps_incremental.FuenteSQLite.conteo_query, (0,),
+     "MessageOut", ("GatewayId",)),
+]
+
+# Índices sugeridos para SQL Server (dbo.messagelog)
+INDICES_SQLSERVER = [
+    "CREATE INDEX IX_messagelog_SendTime_Gateway ON dbo.messagelog (SendTime) INCLUDE (Gateway);",
+    "CREATE INDEX IX_messagelog_Gateway_SendTime ON dbo.messagelog (Gateway, SendTime);",
+]
+
+
+def nombre_indice(tabla, columnas):
+    return f"ix_monitor_{tabla.lower()}_{'_'.join(c.lower() for c in columnas)}"
+
+
+def ddl_indice(tabla, columnas):
+    return f"CREATE INDEX IF NOT EXISTS {nombre_indice(tabla, columnas)} ON {tabla} ({', '.join(columnas)});"
+
+
+def tablas_existentes(conn):
+    filas = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table';").fetchall()
+    return {nombre.lower() for (nombre,) in filas}
+
+
+def plan_consulta(conn, sql, params):
+    """
+    Devuelve las líneas de detalle de EXPLAIN QUERY PLAN.
+    """
+    filas = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [fila[-1] for fila in filas]
+
+
+def analizar_plan(detalles):
+    """
+    Devuelve (recorridos, temporales): líneas con SCAN completo de tabla y
+    líneas que usan un B-tree temporal (GROUP BY / ORDER BY sin índice).
+    """
+    recorridos = [d for d in detalles if d.startswith('SCAN') and 'INDEX' not in d]
+    temporales = [d for d in detalles if 'TEMP B-TREE' in d]
+    return recorridos, temporales
+
+
+def medir(conn, sql, params, repeticiones):
+    """
+    Ejecuta la consulta `repeticiones` veces y devuelve el mejor tiempo en ms.
+    """
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        duracion = (time.perf_counter() - inicio) * 1000
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return mejor
+
+
+def copiar_base(db_path):
+    """
+    Copia la base de datos a un archivo temporal con la API de backup de SQLite
+    (consistente aunque Diafaan esté escribiendo). Devuelve la ruta de la copia.
+    """
+    fd, copia = tempfile.mkstemp(suffix='.sqlite', prefix='index_advisor_')
+    os.close(fd)
+    origen = conectar_ro(db_path)
+    destino = sqlite3.connect(copia)
+    try:
+        origen.backup(destino)
+    finally:
+        origen.close()
+        destino.close()
+    return copia
+
+
+def revisar_sqlite(db_path, benchmark=False, repeticiones=5):
+    """
+    Revisa las consultas registradas sobre la base indicada. Devuelve el número
+    de consultas con recorrido completo de tabla.
+    """
+    conn = conectar_ro(db_path)
+    existentes = tablas_existentes(conn)
+    aplicables = [c for c in CONSULTAS_SQLITE if c[4].lower() in existentes]
+    if not aplicables:
+        print(f"Ninguna de las tablas consultadas por los checks existe en {db_path}")
+        conn.close()
+        return 0
+
+    con_recorrido = 0
+    propuestos = []
+    for nombre, origen, sql, params, tabla, columnas in aplicables:
+        detalles = plan_consulta(conn, sql, params)
+        recorridos, temporales = analizar_plan(detalles)
+        estado = "SCAN" if recorridos else "OK"
+        print(f"[{estado}] {nombre} ({origen})")
+        for detalle in detalles:
+            print(f"    {detalle}")
+        if temporales and not recorridos:
+            print("    aviso: GROUP BY/ORDER BY con B-tree temporal")
+        if recorridos:
+            con_recorrido += 1
+            ddl = ddl_indice(tabla, columnas)
+            print(f"    índice sugerido: {ddl}")
+            if (tabla, columnas) not in propuestos:
+                propuestos.append((tabla, columnas))
+    conn.close()
+
+    if benchmark:
+        benchmark_sqlite(db_path, aplicables, propuestos, repeticiones)
+    return con_recorrido
+
+
+def benchmark_sqlite(db_path, consultas, propuestos, repeticiones):
+    """
+    Mide las consultas sobre una copia de la base antes y después de crear
+    los índices propuestos.
+    """
+    copia = copiar_base(db_path)
+    try:
+        conn = sqlite3.connect(copia)
+        antes = {c[0]: medir(conn, c[2], c[3], repeticiones) for c in consultas}
+
+        for tabla, columnas in propuestos:
+            inicio = time.perf_counter()
+            conn.execute(ddl_indice(tabla, columnas))
+            print(f"Índice {nombre_indice(tabla, columnas)} creado en {(time.perf_counter() - inicio) * 1000:.1f} ms (copia)")
+        conn.execute("ANALYZE;")
+        conn.commit()
+
+        despues = {c[0]: medir(conn, c[2], c[3], repeticiones) for c in consultas}
+        conn.close()
+    finally:
+        os.remove(copia)
+
+    print(f"\n{'Consulta':<26}{'Antes (ms)':>12}{'Después (ms)':>14}{'Mejora':>9}")
+    for nombre, *_ in consultas:
+        mejora = antes[nombre] / despues[nombre] if despues[nombre] > 0 else float('inf')
+        print(f"{nombre:<26}{antes[nombre]:>12.2f}{despues[nombre]:>14.2f}{mejora:>8.1f}x")
+
+
+def revisar_sqlserver():
+    """
+    Muestra el plan estimado (SHOWPLAN_TEXT) de las consultas a SQL Server.
+    Devuelve el número de consultas con Table Scan / Clustered Index Scan.
+    """
+    import pyodbc
+    import GW_TPS
+    from monitor_comun import DB_CONFIG_PATH, leer_configuracion
+
+    conn_str = GW_TPS.cadena_conexion(leer_configuracion(DB_CONFIG_PATH))
+    if conn_str is None:
+        print("ERROR: No se encontró la sección 'sqlodbc' en el archivo de configuración.")
+        return 0
+
+    consultas = [
+        ("tps_gateway", "GW_TPS.py", GW_TPS.tps_query, ("SMPP_Gateway_1",)),
+        ("tps_incremental_sqlserver", "tps_incremental.py", tps_incremental.FuenteSQLServer.conteo_query, (0,)),
+    ]
+    con_recorrido = 0
+    conn = pyodbc.connect(conn_str)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET SHOWPLAN_TEXT ON;")
+        for nombre, origen, sql, params in consultas:
+            cursor.execute(sql, params)
+            lineas = []
+            while True:
+                lineas.extend(fila[0] for fila in cursor.fetchall())
+                if not cursor.nextset():
+                    break
+            recorridos = [l for l in lineas if 'Table Scan' in l or 'Clustered Index Scan' in l]
+            print(f"[{'SCAN' if recorridos else 'OK'}] {nombre} ({origen})")
+            for linea in lineas:
+                print(f"    {linea.strip()}")
+            if recorridos:
+                con_recorrido += 1
+        cursor.execute("SET SHOWPLAN_TEXT OFF;")
+    finally:
+        conn.close()
+
+    if con_recorrido:
+        print("Índices sugeridos para SQL Server:")
+        for ddl in INDICES_SQLSERVER:
+            print(f"    {ddl}")
+    return con_recorrido
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica el uso de índices en las consultas de los checks.")
+    parser.add_argument("--db", action='append', default=[], help="Base SQLite a revisar (repetible).")
+    parser.add_argument("--benchmark", action='store_true',
+                        help="Medir antes/después de crear los índices sugeridos sobre una copia.")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Ejecuciones por medición (default: 5).")
+    parser.add_argument("--sqlserver", action='store_true', help="Revisar también las consultas a SQL Server.")
+    args = parser.parse_args()
+
+    if not args.db and not args.sqlserver:
+        parser.error("indicar al menos --db o --sqlserver")
+
+    con_recorrido = 0
+    try:
+        for db_path in args.db:
+            print(f"== {db_path}")
+            con_recorrido += revisar_sqlite(db_path, args.benchmark, args.repeticiones)
+        if args.sqlserver:
+            print("== SQL Server")
+            con_recorrido += revisar_sqlserver()
+    except sqlite3.Error as e:
+        print(f"UNKNOWN: Error de base de datos: {e}")
+        sys.exit(STATE_UNKNOWN)
+
+    sys.exit(STATE_WARNING if con_recorrido else STATE_OK)
+
+
+if __name__ == "__main__":
+    main()
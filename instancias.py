@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: instancias.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Monitoreo de varias instancias de Diafaan desde un solo proceso. Cada
+    instancia tiene su propio Setting.ini (base SQLite, servidor ODBC, URL
+    del XML) y se declara en el Setting.ini principal con una sección
+    [instancia:<nombre>]. Las llamadas a cada instancia se ejecutan en un
+    pool de hilos común, a la vez, y cada una con su propio plazo: una
+    instancia lenta o caída queda con TimeoutError sin retrasar a las demás,
+    y mientras su llamada anterior siga colgada no se le envía otra (el pool
+    no se llena con llamadas a un nodo muerto).
+    Usado por nagios_pasivo.py (cada instancia es un host de Nagios) y por
+    prometheus_exporter.py (etiqueta diafaan_instance en cada métrica).
+
+Configuración (Setting.ini principal):
+    [instancias]                → opcional
+    timeout = 30                → plazo por defecto de cada instancia (segundos)
+    hilos = 0                   → tamaño del pool (0: automático)
+
+    [instancia:nodo01]
+    setting = D:\\Diafaan01\\Monitor\\Setting.ini
+    license = D:\\Diafaan01\\Monitor\\License.py   → opcional (default: License.py principal)
+    host = diafaan01            → opcional, host de Nagios (default: el nombre)
+    timeout = 10                → opcional
+    servicios = servicios_nodo01.txt   → opcional, solo nagios_pasivo.py
+
+Dependencias:
+    - Python 3.x
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoTimeout
+
+from monitor_comun import LICENSE_CONFIG_PATH, leer_configuracion
+
+PREFIJO = 'instancia:'
+TIMEOUT = 30.0
+
+
+class Instancia:
+    """
+    Una instancia de Diafaan y la ubicación de sus archivos de configuración.
+    """
+
+    def __init__(self, nombre, setting, license=LICENSE_CONFIG_PATH, host=None, timeout=TIMEOUT, servicios=None):
+        self.nombre = nombre
+        self.setting = setting
+        self.license = license
+        self.host = host or nombre
+        self.timeout = float(timeout)
+        self.servicios = servicios
+
+    def cargar_config(self, principal=None, heredadas=()):
+        """
+        Lee el Setting.ini de la instancia. Las secciones de `heredadas` que
+        no existen en él se copian del Setting.ini principal.
+        """
+        config = leer_configuracion(self.setting)
+        for seccion in heredadas:
+            if principal is not None and principal.has_section(seccion) and not config.has_section(seccion):
+                config.read_dict({seccion: dict(principal.items(seccion, raw=True))})
+        return config
+
+
+def instancias_desde_config(config):
+    """
+    Devuelve las instancias de las secciones [instancia:<nombre>], en el orden
+    del archivo ([] si no hay ninguna).
+    Lanza ValueError si una sección no indica su Setting.ini.
+    """
+    timeout = config.getfloat('instancias', 'timeout', fallback=TIMEOUT)
+    instancias = []
+    for seccion in config.sections():
+        if not seccion.startswith(PREFIJO):
+            continue
+        nombre = seccion[len(PREFIJO):].strip()
+        setting = config.get(seccion, 'setting', fallback=None)
+        if not nombre or not setting:
+            raise ValueError(f"la sección [{seccion}] debe tener nombre y setting")
+        instancias.append(Instancia(
+            nombre, setting,
+            license=config.get(seccion, 'license', fallback=LICENSE_CONFIG_PATH),
+            host=config.get(seccion, 'host', fallback=None),
+            timeout=config.getfloat(seccion, 'timeout', fallback=timeout),
+            servicios=config.get(seccion, 'servicios', fallback=None),
+        ))
+    return instancias
+
+
+class EjecutorInstancias:
+    """
+    Pool de hilos compartido por todas las instancias. Cada llamada se
+    identifica por (instancia, clave); una llamada que sigue en curso no se
+    vuelve a enviar hasta que termine.
+    """
+
+    def __init__(self, instancias, hilos=0):
+        self.instancias = instancias
+        self._pool = ThreadPoolExecutor(max_workers=hilos or max(4, 2 * len(instancias)),
+                                        thread_name_prefix='instancia')
+        self._lock = threading.Lock()
+        self._en_curso = {}
+
+    def enviar(self, instancia, clave, funcion, *args):
+        """
+        Envía funcion(*args) al pool y devuelve el futuro.
+        Lanza TimeoutError si la llamada anterior con la misma clave no terminó.
+        """
+        llave = (instancia.nombre, clave)
+        with self._lock:
+            if llave in self._en_curso:
+                raise TimeoutError(f"instancia {instancia.nombre}: la ejecución anterior de {clave} "
+                                   f"sigue sin responder")
+            futuro = self._pool.submit(funcion, *args)
+            self._en_curso[llave] = futuro
+        futuro.add_done_callback(lambda _: self._terminar(llave))
+        return futuro
+
+    def _terminar(self, llave):
+        with self._lock:
+            self._en_curso.pop(llave, None)
+
+    def llamar(self, instancia, clave, funcion, *args):
+        """
+        Ejecuta funcion(*args) con el plazo de la instancia y devuelve su resultado.
+        Lanza TimeoutError si no responde a tiempo.
+        """
+        futuro = self.enviar(instancia, clave, funcion, *args)
+        try:
+            return futuro.result(timeout=instancia.timeout)
+        except FuturoTimeout:
+            raise TimeoutError(f"instancia {instancia.nombre} sin respuesta en {instancia.timeout:g} s") from None
+
+    def ejecutar(self, clave, funcion):
+        """
+        Ejecuta funcion(instancia) en todas las instancias a la vez; cada una
+        tiene su plazo contado desde el inicio común.
+        Devuelve {nombre: (resultado, error)} en el orden de las instancias.
+        """
+        inicio = time.monotonic()
+        futuros = []
+        resultados = {}
+        for instancia in self.instancias:
+            try:
+                futuros.append((instancia, self.enviar(instancia, clave, funcion, instancia)))
+            except TimeoutError as e:
+                resultados[instancia.nombre] = (None, e)
+        for instancia, futuro in futuros:
+            restante = instancia.timeout - (time.monotonic() - inicio)
+            try:
+                resultados[instancia.nombre] = (futuro.result(timeout=max(0.0, restante)), None)
+            except FuturoTimeout:
+                resultados[instancia.nombre] = (None, TimeoutError(
+                    f"instancia {instancia.nombre} sin respuesta en {instancia.timeout:g} s"))
+            except Exception as e:
+                resultados[instancia.nombre] = (None, e)
+        return {i.nombre: resultados[i.nombre] for i in self.instancias}
+
+    def cerrar(self):
+        # Las llamadas colgadas no se esperan: sus hilos terminan por su cuenta
+        self._pool.shutdown(wait=False)
+
+
+def ejecutor_desde_config(config, instancias):
+    return EjecutorInstancias(instancias, hilos=config.getint('instancias', 'hilos', fallback=0))
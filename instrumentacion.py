@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: instrumentacion.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Tiempos por fase de los checks, medidos con time.perf_counter(). Las
+    capas compartidas registran sus fases al ejecutarse, de modo que todos
+    los checks quedan instrumentados sin cambios propios:
+        import      → carga del módulo del check (diafaan_check.py)
+        config      → lectura de Setting.ini (monitor_comun.py)
+        license     → ejecución de License.py (monitor_comun.py)
+        db_connect  → apertura de SQLite (sqlite_ro.py) o SQL Server (sqlserver_db.py)
+        lock_wait   → espera por "database is locked" (sqlite_ro.py)
+        pool_wait   → espera de una conexión del pool de SQL Server
+        query       → ejecución y lectura de las consultas
+        xml_lock    → espera del lock de la caché del XML (diafaan_xml.py)
+        http_fetch  → descarga del XML / API de Diafaan
+        xml_parse   → parseo del XML
+    Los acumuladores son por hilo, por lo que los checks que corren en
+    paralelo en el daemon o el exporter no mezclan sus tiempos.
+    ejecutar_instrumentado() corre un check capturando su salida para
+    agregar los tiempos como perfdata (t_<fase>=...s), escribirlos en un
+    archivo de traza (JSON lines) o perfilarlo con cProfile y mostrar las
+    funciones con más tiempo propio en stderr.
+    Usado por diafaan_check.py (--tiempos, --traza, --perfilar).
+
+Dependencias:
+    - Python 3.x
+"""
+
+import io
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager, redirect_stdout
+
+_local = threading.local()
+
+
+def _acumulado():
+    fases = getattr(_local, 'fases', None)
+    if fases is None:
+        fases = _local.fases = {}
+    return fases
+
+
+def registrar(nombre, segundos):
+    """
+    Suma `segundos` a la fase `nombre` del hilo actual.
+    """
+    fases = _acumulado()
+    if nombre in fases:
+        fases[nombre][0] += segundos
+        fases[nombre][1] += 1
+    else:
+        fases[nombre] = [segundos, 1]
+
+
+@contextmanager
+def fase(nombre):
+    """
+    Mide el bloque y lo suma a la fase `nombre` (también si lanza una excepción).
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(nombre, time.perf_counter() - inicio)
+
+
+def tiempos():
+    """
+    Fases del hilo actual en orden de aparición: {nombre: (segundos, veces)}.
+    """
+    return {nombre: tuple(valor) for nombre, valor in _acumulado().items()}
+
+
+def reiniciar():
+    _local.fases = {}
+
+
+def perfdata_fases(fases, total=None):
+    """
+    Perfdata de Nagios con los segundos de cada fase (t_<fase>=0.0012s).
+    """
+    partes = [f"t_{nombre}={segundos:.4f}s" for nombre, (segundos, _) in fases.items()]
+    if total is not None:
+        partes.append(f"t_total={total:.4f}s")
+    return " ".join(partes)
+
+
+def agregar_perfdata(salida, perfdata):
+    """
+    Agrega perfdata a la salida de un check: a continuación de la primera
+    línea que ya tiene perfdata ("|"), o con un "|" nuevo en la primera línea.
+    """
+    lineas = salida.split('\n')
+    indice = next((i for i, linea in enumerate(lineas) if '|' in linea), None)
+    if indice is None:
+        lineas[0] = f"{lineas[0].rstrip()} | {perfdata}"
+    else:
+        lineas[indice] = f"{lineas[indice].rstrip()} {perfdata}"
+    return '\n'.join(lineas)
+
+
+def escribir_traza(ruta, check, argv, estado, total, fases):
+    """
+    Agrega una línea JSON con los tiempos del check al archivo de traza.
+    """
+    registro = {
+        'ts': round(time.time(), 3),
+        'check': check,
+        'argv': argv,
+        'estado': estado,
+        'total': round(total, 6),
+        'fases': {nombre: {'s': round(segundos, 6), 'n': veces} for nombre, (segundos, veces) in fases.items()},
+    }
+    with open(ruta, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+def _codigo(salida_sistema):
+    codigo = salida_sistema.code
+    if codigo is None:
+        return 0
+    if isinstance(codigo, int):
+        return codigo
+    # sys.exit("mensaje") imprime el mensaje en stderr y termina con 1
+    print(codigo, file=sys.stderr)
+    return 1
+
+
+def ejecutar_instrumentado(funcion, check, argv=(), con_tiempos=False, traza=None, perfilar=0):
+    """
+    Ejecuta `funcion` (el main de un check) midiendo sus fases. Con
+    `con_tiempos` la perfdata de las fases se agrega a la salida; con
+    `traza` los tiempos se agregan a ese archivo; con `perfilar` > 0 el
+    check corre bajo cProfile y se muestran en stderr las `perfilar`
+    funciones con más tiempo propio. Termina con el código del check.
+    """
+    perfil = None
+    if perfilar:
+        # Solo al perfilar: el arranque de los checks no carga cProfile ni pstats
+        import cProfile
+        perfil = cProfile.Profile()
+    inicio = time.perf_counter()
+    buffer = io.StringIO()
+    codigo = 0
+    try:
+        with redirect_stdout(buffer):
+            if perfil is not None:
+                perfil.enable()
+            try:
+                funcion()
+            finally:
+                if perfil is not None:
+                    perfil.disable()
+    except SystemExit as e:
+        codigo = _codigo(e)
+    finally:
+        total = time.perf_counter() - inicio
+        fases = tiempos()
+        salida = buffer.getvalue()
+        if con_tiempos and salida.strip():
+            salida = agregar_perfdata(salida, perfdata_fases(fases, total))
+        sys.stdout.write(salida)
+        sys.stdout.flush()
+
+    if traza:
+        try:
+            escribir_traza(traza, check, list(argv), codigo, total, fases)
+        except OSError as e:
+            print(f"Aviso: no se pudo escribir la traza {traza}: {e}", file=sys.stderr)
+    if perfil is not None:
+        import pstats
+        estadisticas = pstats.Stats(perfil, stream=sys.stderr)
+        estadisticas.sort_stats('tottime').print_stats(perfilar)
+    sys.exit(codigo)
@@ -10,35 +10,52 @@ Descripción:
         0 = OK, 1 = WARNING, 2 = CRITICAL
     También exporta datos de rendimiento compatibles con PNP4Nagios.
 
+    Modo múltiple: con --objetivo o --archivo sondea una lista de destinos
+    en paralelo (asyncio), tomando N muestras por destino, y reporta
+    min/avg/p95/max y pérdida por destino. El tiempo total queda acotado
+    por el destino más lento, no por la suma de todos.
+
 Uso:
     python latencia_GW.py <IP> <Puerto>
+    python latencia_GW.py --objetivo IP:PUERTO [--objetivo IP:PUERTO ...] [--muestras N]
+    python latencia_GW.py --archivo destinos.txt [--muestras N] [--timeout S]
 
 Ejemplo:
     python latencia_GW.py 192.168.1.10 5060
+    python latencia_GW.py --archivo peers_smpp.txt --muestras 5 --warning 500
+
+Formato de destinos.txt:
+    Un destino por línea como IP:PUERTO o IP PUERTO (líneas con # se ignoran).
 
 Dependencias:
     - Python 3.x
-    (solo librerías estándar: socket, time, argparse, sys)
+    (solo librerías estándar: socket, time, asyncio, argparse, sys)
 """
 
 import socket
 import time
 import argparse
+import math
 import sys
 
+TIMEOUT = 5                # segundos máximos por intento de conexión
+WARNING_MS = 1000          # latencia promedio sobre la cual se reporta WARNING
+CONCURRENCIA = 200         # conexiones simultáneas máximas en modo múltiple
 
-def medir_latencia(ip, puerto):
+
+def medir_latencia(ip, puerto, timeout=TIMEOUT):
     """
-    Intenta establecer una conexión TCP a la IP y puerto especificados.
+    Intenta establecer una conexión TCP a la IP y puerto especificados,
+    esperando hasta `timeout` segundos.
     Devuelve la latencia en ms o un error si no se puede conectar.
     """
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(5)  # Tiempo máximo de espera = 5 segundos
+    sock.settimeout(timeout)
     
     try:
-        inicio = time.time()
+        inicio = time.perf_counter()
         sock.connect((ip, puerto))
-        fin = time.time()
+        fin = time.perf_counter()
 
         latencia = (fin - inicio) * 1000  # milisegundos
         sock.close()
@@ -50,23 +67,195 @@ def medir_latencia(ip, puerto):
         return None, f"Error de conexión: {e}"
 
 
-def main():
+async def _muestra(ip, puerto, timeout):
+    """
+    Una conexión TCP asíncrona; devuelve la latencia en ms o None si falla.
+    """
+    # asyncio se importa solo en modo múltiple: el modo simple arranca más rápido
+    import asyncio
+    inicio = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, puerto), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    latencia = (time.perf_counter() - inicio) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return latencia
+
+
+async def _sondear_objetivo(ip, puerto, muestras, timeout, intervalo, semaforo):
+    import asyncio
+    resultados = []
+    for i in range(muestras):
+        if i and intervalo:
+            await asyncio.sleep(intervalo)
+        async with semaforo:
+            resultados.append(await _muestra(ip, puerto, timeout))
+    return resultados
+
+
+async def sondear_objetivos(objetivos, muestras=5, timeout=TIMEOUT, intervalo=0.0, concurrencia=CONCURRENCIA):
+    """
+    Sondea todos los objetivos en paralelo. Devuelve {(ip, puerto): [ms | None, ...]}.
+    """
+    import asyncio
+    semaforo = asyncio.Semaphore(concurrencia)
+    tareas = [_sondear_objetivo(ip, puerto, muestras, timeout, intervalo, semaforo) for ip, puerto in objetivos]
+    resultados = await asyncio.gather(*tareas)
+    return dict(zip(objetivos, resultados))
+
+
+def percentil(valores, p):
+    """
+    Percentil por rango más cercano sobre una lista ordenada.
+    """
+    if not valores:
+        return None
+    rango = max(1, math.ceil(p / 100.0 * len(valores)))
+    return valores[rango - 1]
+
+
+def resumir(muestras):
+    """
+    Devuelve dict con min, avg, p95, max (ms) y loss (%) de las muestras.
+    """
+    exitosas = sorted(m for m in muestras if m is not None)
+    perdida = 100.0 * (len(muestras) - len(exitosas)) / len(muestras) if muestras else 100.0
+    if not exitosas:
+        return {'min': None, 'avg': None, 'p95': None, 'max': None, 'loss': perdida}
+    return {
+        'min': exitosas[0],
+        'avg': sum(exitosas) / len(exitosas),
+        'p95': percentil(exitosas, 95),
+        'max': exitosas[-1],
+        'loss': perdida,
+    }
+
+
+def parse_objetivo(texto):
+    """
+    Convierte "IP:PUERTO" o "IP PUERTO" en (ip, puerto).
+    """
+    texto = texto.strip()
+    if ' ' in texto:
+        ip, puerto = texto.split()
+    else:
+        ip, puerto = texto.rsplit(':', 1)
+    return ip, int(puerto)
+
+
+def leer_objetivos(ruta):
+    objetivos = []
+    with open(ruta, 'r') as f:
+        for linea in f:
+            linea = linea.strip()
+            if linea and not linea.startswith('#'):
+                objetivos.append(parse_objetivo(linea))
+    return objetivos
+
+
+def evaluar_multiple(resultados, warning_ms, critical_loss):
+    """
+    Evalúa los resúmenes por destino y devuelve (estado, salida) para Nagios.
+    CRITICAL si algún destino supera la pérdida crítica; WARNING si algún
+    destino tiene pérdida o latencia promedio sobre el umbral.
+    """
+    estado = 0
+    problemas = []
+    perfdata = []
+    for (ip, puerto), muestras in resultados.items():
+        r = resumir(muestras)
+        etiqueta = f"{ip}_{puerto}"
+        for clave in ('min', 'avg', 'p95', 'max'):
+            valor = f"{r[clave]:.2f}ms" if r[clave] is not None else "U"
+            umbral = f";{warning_ms:g}" if clave == 'avg' else ""
+            perfdata.append(f"'{etiqueta}_{clave}'={valor}{umbral}")
+        perfdata.append(f"'{etiqueta}_loss'={r['loss']:.0f}%;;{critical_loss:g};0;100")
+
+        if r['loss'] >= critical_loss:
+            estado = 2
+            problemas.append(f"{ip}:{puerto} pérdida {r['loss']:.0f}%")
+        elif r['loss'] > 0 or r['avg'] > warning_ms:
+            estado = max(estado, 1)
+            problemas.append(f"{ip}:{puerto} avg {r['avg']:.2f} ms pérdida {r['loss']:.0f}%")
+
+    performance_data = " ".join(perfdata)
+    total = len(resultados)
+    if estado == 2:
+        return 2, f"CRITICAL: {len(problemas)}/{total} destinos con problemas: {'; '.join(problemas)} | {performance_data}"
+    elif estado == 1:
+        return 1, f"WARNING: {len(problemas)}/{total} destinos con problemas: {'; '.join(problemas)} | {performance_data}"
+    return 0, f"OK: {total} destinos responden | {performance_data}"
+
+
+def evaluar_simple(ip, puerto, latencia, error, warning_ms=WARNING_MS):
+    """
+    Evalúa una medición del modo simple y devuelve (estado, salida) para Nagios.
+    """
+    if error:
+        return 2, f"CRITICAL: {error} | latencia=0ms"
+    elif latencia > warning_ms:
+        return 1, f"WARNING: Latencia hacia {ip}:{puerto} = {latencia:.2f} ms | latencia={latencia:.2f}ms"
+    return 0, f"OK: Latencia hacia {ip}:{puerto} = {latencia:.2f} ms | latencia={latencia:.2f}ms"
+
+
+def crear_parser():
     parser = argparse.ArgumentParser(description="Medir la latencia de una IP y puerto mediante TCP.")
-    parser.add_argument("ip", help="Dirección IP del servidor de destino")
-    parser.add_argument("puerto", type=int, help="Número de puerto del servidor de destino")
+    parser.add_argument("ip", nargs='?', help="Dirección IP del servidor de destino")
+    parser.add_argument("puerto", nargs='?', type=int, help="Número de puerto del servidor de destino")
+    parser.add_argument("--objetivo", action='append', default=[], metavar='IP:PUERTO',
+                        help="Destino a sondear en modo múltiple (repetible).")
+    parser.add_argument("--archivo", help="Archivo con un destino IP:PUERTO por línea.")
+    parser.add_argument("--muestras", type=int, default=5, help="Muestras por destino en modo múltiple (default: 5).")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help=f"Segundos por intento (default: {TIMEOUT}).")
+    parser.add_argument("--intervalo", type=float, default=0.0, help="Segundos entre muestras de un destino (default: 0).")
+    parser.add_argument("--warning", type=float, default=WARNING_MS,
+                        help=f"Latencia promedio en ms para WARNING (default: {WARNING_MS}).")
+    parser.add_argument("--critical-loss", type=float, default=100.0,
+                        help="Pérdida en %% a partir de la cual se reporta CRITICAL (default: 100).")
+    parser.add_argument("--concurrencia", type=int, default=CONCURRENCIA,
+                        help=f"Conexiones simultáneas máximas (default: {CONCURRENCIA}).")
+    return parser
+
+
+def main():
+    parser = crear_parser()
     args = parser.parse_args()
 
-    latencia, error = medir_latencia(args.ip, args.puerto)
-    
-    if error:
-        print(f"CRITICAL: {error} | latencia=0ms")
-        sys.exit(2)  # CRITICAL
-    elif latencia > 1000:
-        print(f"WARNING: Latencia hacia {args.ip}:{args.puerto} = {latencia:.2f} ms | latencia={latencia:.2f}ms")
-        sys.exit(1)  # WARNING
-    else:
-        print(f"OK: Latencia hacia {args.ip}:{args.puerto} = {latencia:.2f} ms | latencia={latencia:.2f}ms")
-        sys.exit(0)  # OK
+    if args.objetivo or args.archivo:
+        try:
+            objetivos = [parse_objetivo(o) for o in args.objetivo]
+            if args.archivo:
+                objetivos.extend(leer_objetivos(args.archivo))
+        except (OSError, ValueError) as e:
+            print(f"UNKNOWN: Lista de destinos inválida: {e}")
+            sys.exit(3)
+        if args.ip and args.puerto:
+            objetivos.insert(0, (args.ip, args.puerto))
+        # dict.fromkeys elimina duplicados conservando el orden
+        objetivos = list(dict.fromkeys(objetivos))
+        if not objetivos or args.muestras < 1:
+            print("UNKNOWN: No hay destinos para sondear.")
+            sys.exit(3)
+
+        import asyncio
+        resultados = asyncio.run(sondear_objetivos(objetivos, args.muestras, args.timeout,
+                                                   args.intervalo, args.concurrencia))
+        estado, salida = evaluar_multiple(resultados, args.warning, args.critical_loss)
+        print(salida)
+        sys.exit(estado)
+
+    if not args.ip or args.puerto is None:
+        parser.error("indicar <IP> <Puerto>, --objetivo o --archivo")
+
+    latencia, error = medir_latencia(args.ip, args.puerto, args.timeout)
+    estado, salida = evaluar_simple(args.ip, args.puerto, latencia, error, args.warning)
+    print(salida)
+    sys.exit(estado)
 
 
 if __name__ == "__main__":
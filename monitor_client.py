@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Script: monitor_client.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Cliente liviano para monitor_daemon.py. Envía el nombre del check y sus
+    argumentos al daemon local, imprime la salida y termina con el mismo
+    código Nagios que retornaría el script original.
+    Solo usa la librería estándar para minimizar el tiempo de arranque.
+
+Uso:
+    python monitor_client.py [--host H] [--port P] [--timeout S] <Check> [argumentos...]
+
+Ejemplo:
+    python monitor_client.py GW_TPS SMPP_Gateway_1
+    python monitor_client.py SMS_GW_Status 2 300 --error_threshold 5000
+
+Dependencias:
+    - Python 3.x
+    (solo librerías estándar: socket, json, sys)
+"""
+
+import sys
+import json
+import socket
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5999
+DEFAULT_TIMEOUT = 30
+STATE_UNKNOWN = 3
+
+USO = "Uso: python monitor_client.py [--host H] [--port P] [--timeout S] <Check> [argumentos...]"
+
+
+def parse_argv(argv):
+    """
+    Extrae las opciones del cliente que preceden al nombre del check.
+    El resto de argumentos se envían sin modificar al daemon.
+    """
+    host, port, timeout = DEFAULT_HOST, DEFAULT_PORT, DEFAULT_TIMEOUT
+    i = 0
+    while i < len(argv) and argv[i] in ('--host', '--port', '--timeout'):
+        if i + 1 >= len(argv):
+            return None
+        if argv[i] == '--host':
+            host = argv[i + 1]
+        elif argv[i] == '--port':
+            port = int(argv[i + 1])
+        else:
+            timeout = float(argv[i + 1])
+        i += 2
+    if i >= len(argv):
+        return None
+    return host, port, timeout, argv[i], argv[i + 1:]
+
+
+def consultar_daemon(host, port, timeout, check, args):
+    """
+    Envía la petición al daemon y devuelve (estado, salida).
+    """
+    peticion = json.dumps({'check': check, 'args': args}).encode('utf-8') + b'\n'
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(peticion)
+        with sock.makefile('rb') as f:
+            respuesta = json.loads(f.readline().decode('utf-8'))
+    return int(respuesta['estado']), respuesta['salida']
+
+
+def main():
+    try:
+        opciones = parse_argv(sys.argv[1:])
+    except ValueError:
+        opciones = None
+    if opciones is None:
+        print(USO)
+        sys.exit(STATE_UNKNOWN)
+
+    host, port, timeout, check, args = opciones
+    try:
+        estado, salida = consultar_daemon(host, port, timeout, check, args)
+    except socket.timeout:
+        estado, salida = STATE_UNKNOWN, f"UNKNOWN: Tiempo de espera agotado consultando monitor_daemon en {host}:{port}"
+    except (OSError, ValueError, KeyError) as e:
+        estado, salida = STATE_UNKNOWN, f"UNKNOWN: No se pudo consultar monitor_daemon en {host}:{port}: {e}"
+
+    print(salida)
+    sys.exit(estado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: monitor_comun.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Funciones compartidas por los checks de monitoreo de Diafaan:
+    estados Nagios, rutas por defecto, lectura de Setting.ini y
+    validación de la licencia definida en License.py.
+    Permite que los scripts se ejecuten de forma independiente (Nagios)
+    o sean importados por el daemon residente (monitor_daemon.py).
+
+    Setting.ini parseado y la fecha de License.py se guardan en una caché
+    entre ejecuciones (JSON, invalidada por fecha de modificación y tamaño),
+    para no volver a parsear ni ejecutar License.py en cada check. Al
+    escribirla se eliminan las entradas de archivos que ya no existen y,
+    sobre MAX_ENTRADAS por tipo, las menos recientes.
+    Ambas lecturas se miden como fases config y license (instrumentacion.py).
+
+Variables de entorno:
+    - DIAFAAN_SETTING → ruta alternativa de Setting.ini
+    - DIAFAAN_LICENSE → ruta alternativa de License.py
+    - DIAFAAN_CACHE   → ruta alternativa de la caché (`off` la desactiva;
+                        por defecto diafaan_cache.json en el directorio temporal)
+"""
+
+import os
+import sys
+import json
+import tempfile
+import configparser
+import importlib.util
+from datetime import datetime
+
+from instrumentacion import fase
+
+# Estados Nagios
+STATE_OK = 0
+STATE_WARNING = 1
+STATE_CRITICAL = 2
+STATE_UNKNOWN = 3
+
+# Archivos de configuración (ajustar según entorno)
+DB_CONFIG_PATH = os.environ.get('DIAFAAN_SETTING', r'C:\turuta\Monitor\OTP\Setting.ini')
+LICENSE_CONFIG_PATH = os.environ.get('DIAFAAN_LICENSE', r'C:\turuta\Monitor\OTP\License.py')
+CACHE_PATH = os.environ.get('DIAFAAN_CACHE') or os.path.join(tempfile.gettempdir(), 'diafaan_cache.json')
+
+# Entradas por tipo (config / licencia) que conserva la caché
+MAX_ENTRADAS = 32
+
+_cache = None
+
+
+def _firma(path):
+    """
+    Firma de un archivo para invalidar la caché: [mtime_ns, tamaño], o None si no existe.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _leer_cache():
+    global _cache
+    if _cache is None:
+        _cache = {}
+        if CACHE_PATH != 'off':
+            try:
+                with open(CACHE_PATH, encoding='utf-8') as f:
+                    _cache = json.load(f)
+            except (OSError, ValueError):
+                pass
+    return _cache
+
+
+def _desde_cache(tipo, path, firma):
+    if firma is None:
+        return None
+    entrada = _leer_cache().get(tipo, {}).get(os.path.abspath(path))
+    if entrada and entrada.get('firma') == firma:
+        return entrada['valor']
+    return None
+
+
+def _guardar_cache(tipo, path, firma, valor):
+    """
+    Actualiza la caché con escritura atómica; si no se puede escribir se ignora.
+    """
+    if CACHE_PATH == 'off' or firma is None:
+        return
+    cache = _leer_cache()
+    entradas = cache.setdefault(tipo, {})
+    clave = os.path.abspath(path)
+    # Reinsertada al final: el orden de las entradas es el de su última escritura
+    entradas.pop(clave, None)
+    entradas[clave] = {'firma': firma, 'valor': valor}
+    for ruta in [r for r in entradas if r != clave and _firma(r) is None]:
+        del entradas[ruta]
+    while len(entradas) > MAX_ENTRADAS:
+        del entradas[next(iter(entradas))]
+    temporal = f"{CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(temporal, CACHE_PATH)
+    except OSError:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+
+
+def leer_configuracion(config_path=DB_CONFIG_PATH):
+    """
+    Lee Setting.ini y devuelve el objeto ConfigParser (desde la caché si
+    el archivo no cambió).
+    """
+    with fase('config'):
+        config = configparser.ConfigParser()
+        firma = _firma(config_path)
+        secciones = _desde_cache('config', config_path, firma)
+        if secciones is not None:
+            config.read_dict(secciones)
+            return config
+
+        config.read(config_path)
+        # Valores sin interpolar: read_dict los vuelve a interpretar igual que el archivo
+        secciones = {s: dict(config.items(s, raw=True)) for s in config.sections()}
+        if config.defaults():
+            secciones['DEFAULT'] = dict(config.defaults())
+        _guardar_cache('config', config_path, firma, secciones)
+        return config
+
+
+def claves_originales(config_path, seccion):
+    """
+    Devuelve {clave_en_minúsculas: clave_original} de una sección de
+    Setting.ini. configparser normaliza las claves a minúsculas; esto
+    recupera los nombres tal como están escritos (p. ej. los gateways de
+    [tps_umbrales]) para mostrarlos en la salida.
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.optionxform = str
+    try:
+        parser.read(config_path)
+    except configparser.Error:
+        return {}
+    if not parser.has_section(seccion):
+        return {}
+    return {clave.lower(): clave for clave in parser[seccion]}
+
+
+def cargar_fecha_expiracion(license_path=LICENSE_CONFIG_PATH):
+    """
+    Ejecuta License.py y devuelve la fecha de expiración como date
+    (desde la caché si License.py no cambió).
+    Lanza AttributeError si License.py no define get_expiration_date().
+    """
+    with fase('license'):
+        firma = _firma(license_path)
+        expiration_date_str = _desde_cache('licencia', license_path, firma)
+        if expiration_date_str is None:
+            spec = importlib.util.spec_from_file_location("license_config", license_path)
+            license_config = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(license_config)
+
+            expiration_date_str = license_config.get_expiration_date()
+            _guardar_cache('licencia', license_path, firma, expiration_date_str)
+        return datetime.strptime(expiration_date_str, '%Y-%m-%d').date()
+
+
+def evaluar_licencia(expiration_date):
+    """
+    Devuelve (estado, mensaje) si la licencia ha caducado, o None si es válida.
+    """
+    if datetime.today().date() > expiration_date:
+        return STATE_CRITICAL, "CRITICAL: El script ha caducado."
+    return None
+
+
+def validar_licencia(license_path=LICENSE_CONFIG_PATH, error_state=STATE_WARNING):
+    """
+    Carga License.py y valida la fecha de expiración.
+    Devuelve (estado, mensaje) si la ejecución debe detenerse, o None si es válida.
+    """
+    try:
+        expiration_date = cargar_fecha_expiracion(license_path)
+    except AttributeError:
+        return error_state, "ERROR: No se encontró la fecha de expiración en License.py"
+    return evaluar_licencia(expiration_date)
+
+
+def salir(estado, salida):
+    """
+    Imprime la salida del check y termina con el código Nagios indicado.
+    """
+    print(salida)
+    sys.exit(estado)
+
+
+def verificar_licencia_o_salir(license_path=LICENSE_CONFIG_PATH, error_state=STATE_WARNING):
+    """
+    Valida la licencia y termina el script si ha caducado o no es válida.
+    """
+    resultado = validar_licencia(license_path, error_state)
+    if resultado is not None:
+        salir(*resultado)
@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+"""
+Script: monitor_daemon.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Daemon residente que mantiene en memoria la configuración de Setting.ini,
+    la fecha de expiración de License.py y las conexiones abiertas a SQLite,
+    SQL Server (ODBC) y la API XML de Diafaan.
+    Atiende peticiones de monitor_client.py por un socket TCP local, de modo
+    que cada check de Nagios se reduce a un round-trip local en lugar de
+    arrancar un intérprete, leer la configuración y abrir una conexión nueva.
+
+    Protocolo: una línea JSON por petición y una por respuesta.
+        → {"check": "GW_TPS", "args": ["SMPP_Gateway_1"]}
+        ← {"estado": 0, "salida": "OK: 5.20 TPS en gateway ... | tps=5.20;4;1;0;"}
+
+Uso:
+    python monitor_daemon.py [--host 127.0.0.1] [--port 5999]
+
+Checks disponibles:
+    GW_TPS, Q_completo, total_Priority, SMS_GW_Status, SendQueue
+    (mismos argumentos que el script original)
+    TPS_incremental <Gateway> [--ventana 1|10|60|300] → TPS desde el buffer
+    en memoria de tps_incremental.py (requiere la sección [tps_incremental])
+    SMPP_enquire_link [SMSC ...] [--ventana 300] → percentiles y pérdida de
+    enquire_link sobre las sesiones SMPP persistentes de sonda_smpp.py
+    (requiere secciones [smpp:<nombre>])
+
+Dependencias:
+    - Python 3.x
+    - pyodbc (solo para GW_TPS)
+    - requests (solo para SendQueue)
+
+Archivos requeridos:
+    - Setting.ini   → secciones [sqlodbc], [BDSQLite], [URL] y opcionales [daemon] (host, port)
+                      y [cache] (xml_ttl, xml_dir), [tps_incremental], [smpp], [smpp:<nombre>]
+    - License.py    → contiene función get_expiration_date()
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import importlib
+import threading
+import socketserver
+
+from sqlite_ro import conectar_ro
+from monitor_comun import (
+    DB_CONFIG_PATH, LICENSE_CONFIG_PATH, STATE_UNKNOWN, STATE_WARNING,
+    leer_configuracion, cargar_fecha_expiracion, evaluar_licencia,
+)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5999
+
+# Longitud máxima de una petición (bytes)
+MAX_REQUEST = 64 * 1024
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class MonitorState:
+    """
+    Estado compartido del daemon: configuración, licencia y conexiones abiertas.
+    Cada recurso tiene su propio lock, de modo que checks de distinto tipo
+    se atienden en paralelo y los del mismo tipo se serializan sobre la conexión.
+    """
+
+    def __init__(self, config_path=DB_CONFIG_PATH, license_path=LICENSE_CONFIG_PATH):
+        self.config_path = config_path
+        self.license_path = license_path
+        self._config_lock = threading.Lock()
+        self._config_mtime = None
+        self._license_mtime = None
+        self.config = None
+        self.expiration_date = None
+        self.license_error = None
+
+        self._sqlite_lock = threading.Lock()
+        self._sqlite_conns = {}
+        self._odbc_lock = threading.Lock()
+        self._odbc_db = None
+        self._http_lock = threading.Lock()
+        self._http_session = None
+        self._xml_cache = None
+        self._motor_lock = threading.Lock()
+        self._motor_tps = None
+        self._sonda_lock = threading.Lock()
+        self._sonda_smpp = None
+
+        self.recargar()
+
+    # -- Configuración y licencia --------------------------------------------
+
+    def recargar(self):
+        """
+        Relee Setting.ini y License.py solo si han cambiado en disco.
+        Al cambiar la configuración se cierran las conexiones abiertas.
+        """
+        with self._config_lock:
+            config_mtime = _mtime(self.config_path)
+            if self.config is None or config_mtime != self._config_mtime:
+                self.config = leer_configuracion(self.config_path)
+                self._config_mtime = config_mtime
+                self.cerrar_conexiones()
+
+            license_mtime = _mtime(self.license_path)
+            if license_mtime != self._license_mtime or (self.expiration_date is None and self.license_error is None):
+                self._license_mtime = license_mtime
+                try:
+                    self.expiration_date = cargar_fecha_expiracion(self.license_path)
+                    self.license_error = None
+                except AttributeError:
+                    self.expiration_date = None
+                    self.license_error = (STATE_WARNING, "ERROR: No se encontró la fecha de expiración en License.py")
+                except (OSError, ValueError) as e:
+                    self.expiration_date = None
+                    self.license_error = (STATE_UNKNOWN, f"UNKNOWN: No se pudo cargar License.py: {e}")
+
+    def validar_licencia(self):
+        """
+        Devuelve (estado, mensaje) si la licencia no es válida, o None.
+        La fecha se evalúa en cada petición para detectar la caducidad sin reiniciar.
+        """
+        if self.license_error is not None:
+            return self.license_error
+        return evaluar_licencia(self.expiration_date)
+
+    # -- Conexiones persistentes ---------------------------------------------
+
+    def sqlite_lock(self):
+        """
+        Lock de las conexiones SQLite. Las consultas sobre las conexiones de
+        sqlite_conn() se ejecutan dentro de `with state.sqlite_lock():`.
+        """
+        return self._sqlite_lock
+
+    def http_lock(self):
+        """
+        Lock de la sesión HTTP y de la caché del XML. xml_cache() y
+        http_session() se usan dentro de `with state.http_lock():`.
+        """
+        return self._http_lock
+
+    def sqlite_conn(self, db_path):
+        """
+        Conexión SQLite de solo lectura (sqlite_ro.py), una por archivo.
+        """
+        conn = self._sqlite_conns.get(db_path)
+        if conn is None:
+            conn = conectar_ro(db_path, check_same_thread=False)
+            self._sqlite_conns[db_path] = conn
+        return conn
+
+    def odbc_db(self, conn_str):
+        """
+        Pool de SQL Server compartido (sqlserver_db.py). Es seguro entre hilos,
+        por lo que varios checks de TPS pueden ejecutarse en paralelo.
+        """
+        with self._odbc_lock:
+            if self._odbc_db is None:
+                from sqlserver_db import db_desde_config
+                self._odbc_db = db_desde_config(self.config, conn_str)
+            return self._odbc_db
+
+    def descartar_odbc(self):
+        with self._odbc_lock:
+            if self._odbc_db is not None:
+                self._odbc_db.cerrar()
+                self._odbc_db = None
+
+    def http_session(self):
+        if self._http_session is None:
+            import requests
+            self._http_session = requests.Session()
+        return self._http_session
+
+    def xml_cache(self):
+        if self._xml_cache is None:
+            from diafaan_xml import cache_desde_config
+            self._xml_cache = cache_desde_config(self.config, session=self.http_session())
+        return self._xml_cache
+
+    def motor_tps(self):
+        """
+        Motor de TPS incremental; se inicia una sola vez y sondea en segundo plano.
+        """
+        with self._motor_lock:
+            if self._motor_tps is None and 'tps_incremental' in self.config:
+                from tps_incremental import motor_desde_config
+                self._motor_tps = motor_desde_config(self.config)
+                if self._motor_tps is not None:
+                    self._motor_tps.iniciar()
+            return self._motor_tps
+
+    def sonda_smpp(self):
+        """
+        Sonda SMPP con una sesión enlazada por SMSC; se inicia una sola vez
+        y envía enquire_link en segundo plano.
+        """
+        with self._sonda_lock:
+            if self._sonda_smpp is None:
+                from sonda_smpp import sonda_desde_config
+                self._sonda_smpp = sonda_desde_config(self.config)
+                if self._sonda_smpp is not None:
+                    self._sonda_smpp.iniciar()
+            return self._sonda_smpp
+
+    def cerrar_conexiones(self):
+        with self._sqlite_lock:
+            for conn in self._sqlite_conns.values():
+                conn.close()
+            self._sqlite_conns.clear()
+        self.descartar_odbc()
+        with self._http_lock:
+            if self._http_session is not None:
+                self._http_session.close()
+                self._http_session = None
+            self._xml_cache = None
+        with self._motor_lock:
+            if self._motor_tps is not None:
+                self._motor_tps.detener()
+                self._motor_tps = None
+        with self._sonda_lock:
+            if self._sonda_smpp is not None:
+                self._sonda_smpp.detener()
+                self._sonda_smpp = None
+
+
+# -- Checks servidos por el daemon -------------------------------------------
+
+def parsear_args(modulo, args):
+    """
+    Reutiliza el parser argparse del script original.
+    Devuelve (namespace, None) o (None, (estado, salida)) si los argumentos no son válidos.
+    """
+    try:
+        return modulo.crear_parser().parse_args(args), None
+    except SystemExit:
+        return None, (STATE_UNKNOWN, f"UNKNOWN: Argumentos inválidos para {modulo.__name__}: {' '.join(args)}")
+
+
+def check_gw_tps(state, args):
+    modulo = importlib.import_module('GW_TPS')
+    parsed, error = parsear_args(modulo, args)
+    if error:
+        return error
+    mensaje = modulo.validar_args(parsed)
+    if mensaje:
+        return STATE_UNKNOWN, mensaje
+
+    conn_str = modulo.cadena_conexion(state.config)
+    if conn_str is None:
+        return 1, "ERROR: No se encontró la sección 'sqlodbc' en el archivo de configuración."
+
+    # El pool descarta las conexiones con error y verifica las inactivas
+    return modulo.ejecutar_check(state.odbc_db(conn_str), parsed, state.config, state.config_path)
+
+
+def _sqlite_bdsqlite(state):
+    q_completo = importlib.import_module('Q_completo')
+    db_path = q_completo.obtener_db_path(state.config)
+    if db_path is None:
+        return None
+    return state.sqlite_conn(db_path)
+
+
+def check_q_completo(state, args):
+    modulo = importlib.import_module('Q_completo')
+    with state.sqlite_lock():
+        conn = _sqlite_bdsqlite(state)
+        if conn is None:
+            return 1, "Error: No se encontró la sección [BDSQLite] o la clave db_path en Setting.ini"
+        return modulo.ejecutar_check(conn)
+
+
+def check_total_priority(state, args):
+    modulo = importlib.import_module('total_Priority')
+    parsed, error = parsear_args(modulo, args)
+    if error:
+        return error
+    mensaje = modulo.validar_args(parsed)
+    if mensaje:
+        return 1, mensaje
+    with state.sqlite_lock():
+        conn = _sqlite_bdsqlite(state)
+        if conn is None:
+            return 1, "Error: La sección o clave de ruta de la base de datos no se encontró en Setting.ini"
+        return modulo.ejecutar_check(conn, parsed, state.config)
+
+
+def check_sms_gw_status(state, args):
+    modulo = importlib.import_module('SMS_GW_Status')
+    parsed, error = parsear_args(modulo, args)
+    if error:
+        return error
+    mensaje = modulo.validar_args(parsed)
+    if mensaje:
+        return STATE_UNKNOWN, mensaje
+    db_path = modulo.obtener_db_path(state.config)
+    with state.sqlite_lock():
+        try:
+            conn = state.sqlite_conn(db_path)
+        except sqlite3.Error as e:
+            return STATE_UNKNOWN, f"UNKNOWN: Error de base de datos: {e}"
+        return modulo.ejecutar_check(conn, parsed, state.config, db_path)
+
+
+def check_send_queue(state, args):
+    modulo = importlib.import_module('SendQueue')
+    url = modulo.obtener_url(state.config)
+    if url is None:
+        return 1, "Error: La sección [URL] o la clave api_url no se encontró en Setting.ini"
+    with state.http_lock():
+        return modulo.ejecutar_check(url, state.xml_cache())
+
+
+def check_tps_incremental(state, args):
+    modulo = importlib.import_module('tps_incremental')
+    parsed, error = parsear_args(modulo, args)
+    if error:
+        return error
+    motor = state.motor_tps()
+    if motor is None:
+        return STATE_UNKNOWN, "UNKNOWN: La sección [tps_incremental] no está configurada en Setting.ini"
+    return modulo.ejecutar_check(motor, parsed)
+
+
+def check_smpp_enquire_link(state, args):
+    modulo = importlib.import_module('sonda_smpp')
+    parsed, error = parsear_args(modulo, args)
+    if error:
+        return error
+    try:
+        sonda = state.sonda_smpp()
+    except ValueError as e:
+        return STATE_UNKNOWN, f"UNKNOWN: Configuración SMPP inválida: {e}"
+    if sonda is None:
+        return STATE_UNKNOWN, "UNKNOWN: No hay secciones [smpp:<nombre>] configuradas en Setting.ini"
+    return modulo.ejecutar_check(sonda, parsed)
+
+
+CHECKS = {
+    'GW_TPS': check_gw_tps,
+    'Q_completo': check_q_completo,
+    'total_Priority': check_total_priority,
+    'SMS_GW_Status': check_sms_gw_status,
+    'SendQueue': check_send_queue,
+    'TPS_incremental': check_tps_incremental,
+    'SMPP_enquire_link': check_smpp_enquire_link,
+}
+
+
+def atender_peticion(state, peticion):
+    """
+    Ejecuta el check solicitado y devuelve (estado, salida).
+    """
+    nombre = peticion.get('check')
+    args = [str(a) for a in peticion.get('args', [])]
+    funcion = CHECKS.get(nombre)
+    if funcion is None:
+        return STATE_UNKNOWN, f"UNKNOWN: Check desconocido '{nombre}'. Disponibles: {', '.join(sorted(CHECKS))}"
+
+    state.recargar()
+    licencia = state.validar_licencia()
+    if licencia is not None:
+        return licencia
+
+    try:
+        return funcion(state, args)
+    except Exception as e:
+        return STATE_UNKNOWN, f"UNKNOWN: Error interno del daemon en {nombre}: {e}"
+
+
+class MonitorRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        linea = self.rfile.readline(MAX_REQUEST)
+        try:
+            peticion = json.loads(linea.decode('utf-8'))
+            estado, salida = atender_peticion(self.server.state, peticion)
+        except (ValueError, AttributeError) as e:
+            estado, salida = STATE_UNKNOWN, f"UNKNOWN: Petición inválida: {e}"
+        respuesta = json.dumps({'estado': estado, 'salida': salida}, ensure_ascii=False)
+        self.wfile.write(respuesta.encode('utf-8') + b'\n')
+
+
+class MonitorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, state):
+        self.state = state
+        super().__init__(address, MonitorRequestHandler)
+
+
+def direccion_configurada(config):
+    """
+    Devuelve (host, port) desde la sección opcional [daemon] de Setting.ini.
+    """
+    host = config.get('daemon', 'host', fallback=DEFAULT_HOST)
+    port = config.getint('daemon', 'port', fallback=DEFAULT_PORT)
+    return host, port
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daemon residente para los checks de monitoreo de Diafaan.")
+    parser.add_argument("--host", help="Dirección de escucha (default: [daemon] host o 127.0.0.1).")
+    parser.add_argument("--port", type=int, help="Puerto de escucha (default: [daemon] port o 5999).")
+    args = parser.parse_args()
+
+    state = MonitorState()
+    host, port = direccion_configurada(state.config)
+    host = args.host or host
+    port = args.port or port
+
+    # El motor incremental necesita historial: se inicia junto con el daemon
+    state.motor_tps()
+    # Las sesiones SMPP se enlazan una vez y acumulan muestras desde el arranque
+    try:
+        state.sonda_smpp()
+    except ValueError as e:
+        print(f"Aviso: configuración SMPP inválida: {e}", file=sys.stderr)
+
+    with MonitorServer((host, port), state) as server:
+        print(f"monitor_daemon escuchando en {host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            state.cerrar_conexiones()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,758 @@
+# -*- coding: utf-8 -*-
+"""
+Script: nagios_pasivo.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Ejecutor por lotes de checks pasivos para Nagios. En lugar de un check
+    activo (un proceso) por gateway × métrica, evalúa en un solo proceso por
+    ciclo todos los servicios configurados y escribe los resultados como
+    checks pasivos, ya sea en el command file de Nagios
+    (PROCESS_SERVICE_CHECK_RESULT) o como archivos en el directorio
+    checkresults (spool).
+    Los servicios se agrupan por tipo y comparten consultas y descargas:
+        tps        → una consulta agrupada por Gateway para todos los gateways
+        tps-xml    → una descarga del XML y una instantánea de contadores
+        queue      → una consulta de SendQueue por gatewayid
+        priority   → un histograma de prioridades para todas las prioridades
+        errors     → una consulta agrupada por GatewayId y StatusCode
+        sendqueue  → una descarga del XML (caché de diafaan_xml.py)
+        status     → una descarga del XML para todas las gateways
+        latency    → un sondeo asíncrono paralelo de todos los destinos
+        smpp       → las sesiones SMPP persistentes de sonda_smpp.py (las
+                     muestras se acumulan entre ciclos en modo --bucle)
+    La carga total crece con las consultas distintas, no con los servicios.
+    La configuración, la licencia y las conexiones se mantienen en un
+    MonitorState (monitor_daemon.py), que en modo --bucle se reutiliza
+    entre ciclos.
+    Con secciones [instancia:<nombre>] en Setting.ini (ver instancias.py)
+    el mismo archivo de servicios se evalúa en todas las instancias de
+    Diafaan a la vez, cada una con su Setting.ini, sus conexiones y su plazo;
+    el host por defecto de cada servicio es el de la instancia y los de una
+    instancia que no responde a tiempo se entregan como UNKNOWN. El check
+    errors lee el MessageLog.sqlite de [BDSQLite] messagelog_path de cada
+    instancia y guarda las marcas de --incremental por base. El check
+    status (GW_status_email.py, con su almacén de estado y sus alertas) solo
+    se evalúa en la instancia cuyo setting es el Setting.ini principal.
+    Con --adaptativo cada tipo de check se ejecuta como una tarea de
+    planificador.py: con su propio intervalo ([planificador] intervalo_<check>),
+    desfase aleatorio, un límite de consultas simultáneas a base de datos e
+    intervalo más corto mientras alguno de sus servicios está en WARNING o
+    CRITICAL.
+
+Uso:
+    python nagios_pasivo.py [--servicios servicios_pasivos.txt] [--host NOMBRE]
+                            [--command-file nagios.cmd | --spool-dir checkresults]
+                            [--bucle] [--intervalo 60] [--adaptativo]
+
+    Sin --command-file ni --spool-dir (ni [pasivo] en Setting.ini) las
+    líneas de comando se escriben en la salida estándar.
+
+Formato de servicios_pasivos.txt (una línea por servicio, # comenta):
+    [host;]descripción del servicio;check argumentos
+    Los argumentos son los del script original del check, p. ej.:
+        TPS SMPP_Gateway_1;tps SMPP_Gateway_1
+        TPS XML;tps-xml --todas
+        Cola;queue
+        Cola gateway 2;queue 2
+        Prioridad 1;priority 1
+        Prioridades;priority --todas --por-gateway
+        Errores GW 2 código 300;errors 2 300 --error_threshold 5000
+        SendQueue;sendqueue
+        Estado SMPP_Gateway_1;status SMPP_Gateway_1
+        smsc01;Latencia SMPP;latency 10.0.0.5 2775
+        smsc01;enquire_link SMPP;smpp smsc01 --ventana 300
+
+Dependencias:
+    - Python 3.x
+    - pyodbc (tps), requests (tps-xml, sendqueue, status)
+
+Archivos requeridos:
+    - Setting.ini   → secciones de los checks usados y opcional [pasivo]
+                      (host, servicios, command_file, spool_dir, intervalo),
+                      [instancias] e [instancia:<nombre>]
+    - License.py    → contiene función get_expiration_date()
+"""
+
+import os
+import sys
+import time
+import shlex
+import asyncio
+import sqlite3
+import random
+import string
+import argparse
+import importlib
+import threading
+
+from monitor_daemon import MonitorState, parsear_args
+from monitor_comun import DB_CONFIG_PATH, STATE_OK, STATE_UNKNOWN
+from instancias import instancias_desde_config, ejecutor_desde_config
+
+# Checks que consultan SQLite o SQL Server (comparten el límite de max_db)
+CHECKS_DB = ('tps', 'queue', 'priority', 'errors')
+
+DEFAULT_HOST = 'diafaan'
+DEFAULT_INTERVALO = 60
+SERVICIOS_FILE = 'servicios_pasivos.txt'
+
+
+class Servicio:
+    """
+    Un servicio pasivo: host, descripción, check y argumentos del script.
+    """
+
+    def __init__(self, host, descripcion, check, args):
+        self.host = host
+        self.descripcion = descripcion
+        self.check = check
+        self.args = args
+        self.estado = STATE_UNKNOWN
+        self.salida = "UNKNOWN: Servicio no evaluado"
+
+    def resultado(self, estado, salida):
+        self.estado, self.salida = estado, salida
+
+
+def leer_servicios(ruta, host_default):
+    """
+    Lee el archivo de servicios. Devuelve una lista de Servicio.
+    Lanza ValueError si una línea no tiene el formato esperado.
+    """
+    servicios = []
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for numero, linea in enumerate(f, 1):
+            linea = linea.strip()
+            if not linea or linea.startswith('#'):
+                continue
+            partes = [p.strip() for p in linea.split(';')]
+            if len(partes) == 2:
+                partes.insert(0, host_default)
+            if len(partes) != 3 or not all(partes):
+                raise ValueError(f"línea {numero}: se esperaba [host;]servicio;check argumentos")
+            host, descripcion, comando = partes
+            check, *args = shlex.split(comando)
+            servicios.append(Servicio(host, descripcion, check, args))
+    return servicios
+
+
+class Ciclo:
+    """
+    Recursos compartidos durante un ciclo: las consultas SQLite se memorizan
+    por (base, sql, parámetros), de modo que servicios distintos que necesitan
+    los mismos datos los obtienen de una sola ejecución.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.consultas = 0
+        self._memo = {}
+
+    def contar(self):
+        self.consultas += 1
+
+    def sqlite(self, db_path, sql, params=()):
+        """
+        Devuelve (filas, lock_wait) desde la conexión de solo lectura del daemon.
+        """
+        from sqlite_ro import consultar
+        clave = (db_path, sql, tuple(params))
+        if clave not in self._memo:
+            with self.state.sqlite_lock():
+                conn = self.state.sqlite_conn(db_path)
+                self._memo[clave] = consultar(conn, sql, params)
+            self.contar()
+        return self._memo[clave]
+
+
+# -- Evaluación por tipo de check ----------------------------------------------
+
+def _args_validos(modulo, servicios):
+    """
+    Parsea los argumentos de cada servicio con el parser del script original.
+    Los inválidos quedan con su resultado UNKNOWN; devuelve [(servicio, args)].
+    """
+    validos = []
+    for servicio in servicios:
+        parsed, error = parsear_args(modulo, servicio.args)
+        if error:
+            servicio.resultado(*error)
+        else:
+            validos.append((servicio, parsed))
+    return validos
+
+
+def lote_tps(ciclo, servicios):
+    modulo = importlib.import_module('GW_TPS')
+    config = ciclo.state.config
+    conn_str = modulo.cadena_conexion(config)
+    if conn_str is None:
+        for servicio in servicios:
+            servicio.resultado(1, "ERROR: No se encontró la sección 'sqlodbc' en el archivo de configuración.")
+        return
+    db = ciclo.state.odbc_db(conn_str)
+
+    simples = []
+    for servicio, args in _args_validos(modulo, servicios):
+        mensaje = modulo.validar_args(args)
+        if mensaje:
+            servicio.resultado(STATE_UNKNOWN, mensaje)
+        elif args.gateway_name and not args.tiempos:
+            try:
+                umbral = modulo.umbral_gateway(args.gateway_name, modulo.cargar_umbrales(config, args), args)
+            except ValueError as e:
+                servicio.resultado(STATE_UNKNOWN, f"UNKNOWN: Umbral de TPS inválido: {e}")
+                continue
+            simples.append((servicio, args.gateway_name, umbral))
+        else:
+            # --todas / --gateways ya son una sola consulta agrupada por servicio
+            servicio.resultado(*modulo.ejecutar_check(db, args, config, ciclo.state.config_path))
+            ciclo.contar()
+
+    if not simples:
+        return
+    # Un gateway sin filas en el minuto equivale al COUNT(*) = 0 de la consulta simple
+    try:
+        tps_por_gateway, _ = modulo.consultar_tps_agrupado(db, sorted({g for _, g, _ in simples}))
+    except modulo.pyodbc.Error as e:
+        for servicio, _, _ in simples:
+            servicio.resultado(STATE_UNKNOWN, f"UNKNOWN: Error al conectarse a la base de datos o ejecutar la consulta: {e}")
+        return
+    finally:
+        ciclo.contar()
+    # La consulta simple (Gateway = ?) no distingue mayúsculas: la búsqueda tampoco
+    tps_por_gateway = {g.lower(): tps for g, tps in tps_por_gateway.items()}
+    for servicio, gateway, (warning, critical) in simples:
+        tps = tps_por_gateway.get(gateway.lower(), 0)
+        servicio.resultado(*modulo.evaluar_tps(gateway, (tps,), warning, critical))
+
+
+def lote_queue(ciclo, servicios):
+    modulo = importlib.import_module('Q_completo')
+    from sqlite_ro import perfdata_lock_wait
+    db_path = modulo.obtener_db_path(ciclo.state.config)
+    if db_path is None:
+        for servicio in servicios:
+            servicio.resultado(1, "Error: No se encontró la sección [BDSQLite] o la clave db_path en Setting.ini")
+        return
+    try:
+        filas, lock_wait = ciclo.sqlite(db_path, modulo.count_query, modulo.active_gateways)
+    except sqlite3.Error as e:
+        for servicio in servicios:
+            servicio.resultado(1, f"Error: {e}")
+        return
+
+    counts = {int(gatewayid): count for gatewayid, count in filas}
+    for servicio in servicios:
+        if not servicio.args:
+            servicio.resultado(STATE_OK, modulo.formatear_resultados(filas, lock_wait))
+            continue
+        try:
+            gatewayid = int(servicio.args[0])
+        except ValueError:
+            servicio.resultado(STATE_UNKNOWN, f"UNKNOWN: gatewayid inválido '{servicio.args[0]}'")
+            continue
+        if gatewayid not in modulo.active_gateways:
+            servicio.resultado(STATE_UNKNOWN, f"UNKNOWN: gatewayid {gatewayid} no está en active_gateways de Q_completo.py")
+            continue
+        total = counts.get(gatewayid, 0)
+        servicio.resultado(STATE_OK, f"OK: {total} mensajes en cola para gatewayid {gatewayid} "
+                                     f"| 'queue_{gatewayid}'={total};;;0; {perfdata_lock_wait(lock_wait)}")
+
+
+def lote_priority(ciclo, servicios):
+    modulo = importlib.import_module('total_Priority')
+    db_path = importlib.import_module('Q_completo').obtener_db_path(ciclo.state.config)
+    if db_path is None:
+        for servicio in servicios:
+            servicio.resultado(1, "Error: La sección o clave de ruta de la base de datos no se encontró en Setting.ini")
+        return
+
+    def consulta(sql, params):
+        # Las prioridades individuales se leen del histograma compartido
+        if sql == modulo.query:
+            filas, lock_wait = ciclo.sqlite(db_path, modulo.histogram_query)
+            return [f for f in filas if str(f[0]) == str(params[0])], lock_wait
+        return ciclo.sqlite(db_path, sql, params)
+
+    for servicio, args in _args_validos(modulo, servicios):
+        mensaje = modulo.validar_args(args)
+        if mensaje:
+            servicio.resultado(1, mensaje)
+        else:
+            servicio.resultado(*modulo.ejecutar_con_consulta(consulta, args, ciclo.state.config))
+
+
+def lote_errors(ciclo, servicios):
+    modulo = importlib.import_module('SMS_GW_Status')
+    # Cada instancia lee su propio MessageLog.sqlite
+    db_path = modulo.obtener_db_path(ciclo.state.config)
+    validos = []
+    for servicio, args in _args_validos(modulo, servicios):
+        mensaje = modulo.validar_args(args)
+        if mensaje:
+            servicio.resultado(STATE_UNKNOWN, mensaje)
+        elif args.matriz:
+            # La matriz ya es una sola consulta agrupada por servicio
+            servicio.resultado(*modulo.ejecutar_matriz(
+                lambda sql, params: ciclo.sqlite(db_path, sql, params), args, ciclo.state.config, db_path))
+        else:
+            validos.append((servicio, args))
+    if not validos:
+        return
+    codigos = sorted({args.error_code for _, args in validos})
+    query = f"""
+    SELECT GatewayId, StatusCode, COUNT(*)
+    FROM MessageOut
+    WHERE StatusCode IN ({','.join('?' for _ in codigos)})
+    GROUP BY GatewayId, StatusCode;
+    """
+    try:
+        filas, lock_wait = ciclo.sqlite(db_path, query, codigos)
+    except sqlite3.Error as e:
+        for servicio, _ in validos:
+            servicio.resultado(STATE_UNKNOWN, f"UNKNOWN: Error de base de datos: {e}")
+        return
+
+    totales = {(str(gw), str(code)): total for gw, code, total in filas}
+    for servicio, args in validos:
+        total = totales.get((args.gateway_id, args.error_code), 0)
+        servicio.resultado(*modulo.evaluar_errores(args, [(total,)], lock_wait))
+
+
+def lote_tps_xml(ciclo, servicios):
+    modulo = importlib.import_module('tasas_xml')
+    url = ciclo.state.config.get('URL', 'url', fallback=None)
+    validos = []
+    for servicio, args in _args_validos(modulo, servicios):
+        mensaje = modulo.validar_args(args)
+        if mensaje:
+            servicio.resultado(STATE_UNKNOWN, mensaje)
+        elif url is None:
+            servicio.resultado(1, "ERROR: No se encontró la sección [URL] o la clave url en Setting.ini")
+        else:
+            validos.append((servicio, args))
+
+    # Una muestra por archivo de estado: todos los servicios comparten la descarga
+    por_estado = {}
+    for servicio, args in validos:
+        por_estado.setdefault(args.estado, []).append((servicio, args))
+    for ruta, grupo in por_estado.items():
+        with ciclo.state.http_lock():
+            tasas, error = modulo.tomar_muestra(ciclo.state.xml_cache(), url, ruta)
+        ciclo.contar()
+        for servicio, args in grupo:
+            servicio.resultado(*(error or modulo.evaluar_check(tasas, args, ciclo.state.config)))
+
+
+def lote_sendqueue(ciclo, servicios):
+    modulo = importlib.import_module('SendQueue')
+    url = modulo.obtener_url(ciclo.state.config)
+    if url is None:
+        resultado = (1, "Error: La sección [URL] o la clave api_url no se encontró en Setting.ini")
+    else:
+        with ciclo.state.http_lock():
+            resultado = modulo.ejecutar_check(url, ciclo.state.xml_cache())
+        ciclo.contar()
+    for servicio in servicios:
+        servicio.resultado(*resultado)
+
+
+def lote_status(ciclo, servicios):
+    # GW_status_email mantiene su propia caché XML, el almacén de estado y el
+    # spool de alertas: todas las gateways comparten una descarga por ciclo
+    if os.path.abspath(ciclo.state.config_path) != os.path.abspath(DB_CONFIG_PATH):
+        # El almacén de estado y las alertas del módulo son los del Setting.ini principal
+        for servicio in servicios:
+            servicio.resultado(STATE_UNKNOWN, "UNKNOWN: El check 'status' solo evalúa la instancia del "
+                                              "Setting.ini principal; usar tps-xml o sendqueue")
+        return
+    modulo = importlib.import_module('GW_status_email')
+    ciclo.contar()
+    for servicio in servicios:
+        if len(servicio.args) != 1:
+            servicio.resultado(STATE_UNKNOWN, "UNKNOWN: Uso: status <GatewayName> | --todas")
+            continue
+        try:
+            if servicio.args[0] == '--todas':
+                servicio.resultado(*modulo.evaluar_todas(modulo.url))
+            else:
+                servicio.resultado(*modulo.evaluar_gateway(modulo.url, servicio.args[0]))
+        except SystemExit:
+            servicio.resultado(STATE_UNKNOWN, "UNKNOWN: No se pudo encolar la alerta de cambio de estado")
+
+
+def lote_latency(ciclo, servicios):
+    modulo = importlib.import_module('latencia_GW')
+    simples = []
+    for servicio, args in _args_validos(modulo, servicios):
+        if args.objetivo or args.archivo:
+            try:
+                objetivos = [modulo.parse_objetivo(o) for o in args.objetivo]
+                if args.archivo:
+                    objetivos.extend(modulo.leer_objetivos(args.archivo))
+            except (OSError, ValueError) as e:
+                servicio.resultado(STATE_UNKNOWN, f"UNKNOWN: Lista de destinos inválida: {e}")
+                continue
+            resultados = asyncio.run(modulo.sondear_objetivos(list(dict.fromkeys(objetivos)), args.muestras,
+                                                              args.timeout, args.intervalo, args.concurrencia))
+            servicio.resultado(*modulo.evaluar_multiple(resultados, args.warning, args.critical_loss))
+            ciclo.contar()
+        elif args.ip and args.puerto is not None:
+            simples.append((servicio, args))
+        else:
+            servicio.resultado(STATE_UNKNOWN, "UNKNOWN: indicar <IP> <Puerto>, --objetivo o --archivo")
+
+    if not simples:
+        return
+    # Una sola medición por destino, todas en paralelo con el mayor --timeout;
+    # cada servicio descarta luego las conexiones que superan el suyo
+    objetivos = list(dict.fromkeys((args.ip, args.puerto) for _, args in simples))
+    timeout = max(args.timeout for _, args in simples)
+    resultados = asyncio.run(modulo.sondear_objetivos(objetivos, 1, timeout))
+    ciclo.contar()
+    for servicio, args in simples:
+        latencia = resultados[(args.ip, args.puerto)][0]
+        if latencia is not None and latencia > args.timeout * 1000:
+            latencia, error = None, "Tiempo de espera agotado. No se pudo conectar."
+        else:
+            error = None if latencia is not None else "No se pudo conectar."
+        servicio.resultado(*modulo.evaluar_simple(args.ip, args.puerto, latencia, error, args.warning))
+
+
+def lote_smpp(ciclo, servicios):
+    modulo = importlib.import_module('sonda_smpp')
+    try:
+        sonda = ciclo.state.sonda_smpp()
+    except ValueError as e:
+        sonda, error = None, (STATE_UNKNOWN, f"UNKNOWN: Configuración SMPP inválida: {e}")
+    else:
+        error = (STATE_UNKNOWN, "UNKNOWN: No hay secciones [smpp:<nombre>] configuradas en Setting.ini")
+    for servicio, args in _args_validos(modulo, servicios):
+        servicio.resultado(*(modulo.ejecutar_check(sonda, args) if sonda is not None else error))
+
+
+LOTES = {
+    'tps': lote_tps,
+    'tps-xml': lote_tps_xml,
+    'queue': lote_queue,
+    'priority': lote_priority,
+    'errors': lote_errors,
+    'sendqueue': lote_sendqueue,
+    'status': lote_status,
+    'latency': lote_latency,
+    'smpp': lote_smpp,
+}
+
+
+def ejecutar_ciclo(state, servicios):
+    """
+    Evalúa todos los servicios agrupados por tipo de check.
+    Devuelve la cantidad de consultas/descargas realizadas.
+    """
+    for servicio in servicios:
+        servicio.resultado(STATE_UNKNOWN, "UNKNOWN: Servicio no evaluado")
+
+    state.recargar()
+    licencia = state.validar_licencia()
+    if licencia is not None:
+        for servicio in servicios:
+            servicio.resultado(*licencia)
+        return 0
+
+    ciclo = Ciclo(state)
+    grupos = {}
+    for servicio in servicios:
+        grupos.setdefault(servicio.check, []).append(servicio)
+
+    for check, grupo in grupos.items():
+        lote = LOTES.get(check)
+        if lote is None:
+            for servicio in grupo:
+                servicio.resultado(STATE_UNKNOWN, f"UNKNOWN: Check desconocido '{check}'. "
+                                                  f"Disponibles: {', '.join(sorted(LOTES))}")
+            continue
+        try:
+            lote(ciclo, grupo)
+        except ImportError as e:
+            for servicio in grupo:
+                servicio.resultado(STATE_UNKNOWN, f"UNKNOWN: Falta una dependencia para '{check}': {e}")
+        except SystemExit:
+            # Un script que termina al importarse (p. ej. sin la sección [URL])
+            for servicio in grupo:
+                servicio.resultado(STATE_UNKNOWN, f"UNKNOWN: El check '{check}' terminó al cargarse; revisar Setting.ini")
+        except Exception as e:
+            for servicio in grupo:
+                servicio.resultado(STATE_UNKNOWN, f"UNKNOWN: Error interno en el lote {check}: {e}")
+    return ciclo.consultas
+
+
+# -- Formatos de salida ----------------------------------------------------------
+
+def _una_linea(salida):
+    # Nagios interpreta "\n" literal como salto de línea en los resultados pasivos
+    return salida.strip().replace('\r', '').replace('\n', '\\n')
+
+
+def linea_comando(servicio, timestamp):
+    """
+    Línea PROCESS_SERVICE_CHECK_RESULT para el command file de Nagios.
+    """
+    return (f"[{int(timestamp)}] PROCESS_SERVICE_CHECK_RESULT;{servicio.host};"
+            f"{servicio.descripcion};{servicio.estado};{_una_linea(servicio.salida)}\n")
+
+
+def escribir_command_file(ruta, servicios, timestamp):
+    """
+    Escribe una línea por servicio con un write() independiente en modo
+    append, de modo que cada línea llega entera aunque el command file sea
+    un FIFO compartido con otros procesos.
+    """
+    fd = os.open(ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o660)
+    try:
+        for servicio in servicios:
+            os.write(fd, linea_comando(servicio, timestamp).encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
+def resultado_spool(servicio, inicio, fin):
+    """
+    Bloque de un resultado en el formato de archivos checkresults de Nagios.
+    """
+    return (
+        f"host_name={servicio.host}\n"
+        f"service_description={servicio.descripcion}\n"
+        f"check_type=1\n"
+        f"check_options=0\n"
+        f"scheduled_check=0\n"
+        f"reschedule_check=0\n"
+        f"latency=0.0\n"
+        f"start_time={inicio:.6f}\n"
+        f"finish_time={fin:.6f}\n"
+        f"early_timeout=0\n"
+        f"exited_ok=1\n"
+        f"return_code={servicio.estado}\n"
+        f"output={_una_linea(servicio.salida)}\n"
+        f"\n"
+    )
+
+
+def escribir_spool(directorio, servicios, inicio, fin):
+    """
+    Escribe un archivo checkresults con todos los resultados del ciclo y lo
+    publica creando el archivo .ok, que es lo que Nagios espera para leerlo.
+    Nagios solo procesa nombres de 7 caracteres que empiezan con "c"
+    (la plantilla cXXXXXX que usa él mismo).
+    """
+    caracteres = string.ascii_letters + string.digits
+    while True:
+        ruta = os.path.join(directorio, 'c' + ''.join(random.choices(caracteres, k=6)))
+        try:
+            fd = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o660)
+            break
+        except FileExistsError:
+            continue
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write("### Passive Check Result File ###\n")
+        f.write(f"file_time={int(fin)}\n\n")
+        for servicio in servicios:
+            f.write(resultado_spool(servicio, inicio, fin))
+    open(ruta + '.ok', 'w').close()
+    return ruta
+
+
+def peor_estado(servicios):
+    """
+    Estado más grave de un grupo para el planificador; UNKNOWN solo si
+    ningún servicio tiene un resultado válido.
+    """
+    return max((s.estado for s in servicios if s.estado != STATE_UNKNOWN), default=STATE_UNKNOWN)
+
+
+def tareas_adaptativas(state, servicios, entregar, intervalo, instancia=None, ejecutor=None):
+    """
+    Crea una tarea de planificador.py por tipo de check. Cada ejecución
+    evalúa el grupo, entrega sus resultados y devuelve el peor estado.
+    Con `instancia` la evaluación corre en el pool de instancias.py con el
+    plazo de la instancia.
+    """
+    from planificador import Tarea
+    grupos = {}
+    for servicio in servicios:
+        grupos.setdefault(servicio.check, []).append(servicio)
+    prefijo = f"{instancia.nombre}:" if instancia is not None else ""
+
+    def tarea(check, grupo):
+        def evaluar():
+            inicio = time.time()
+            consultas = ejecutar_ciclo(state, grupo)
+            fin = time.time()
+            entregar(grupo, inicio, fin)
+            print(f"{prefijo}{check}: {len(grupo)} servicios, {consultas} consultas en {fin - inicio:.2f} s",
+                  file=sys.stderr)
+            return peor_estado(grupo)
+
+        def ejecutar():
+            if instancia is None:
+                return evaluar()
+            return ejecutor.llamar(instancia, check, evaluar)
+        base = state.config.getfloat('planificador', f'intervalo_{check}', fallback=intervalo)
+        return Tarea(prefijo + check, ejecutar, base, usa_db=check in CHECKS_DB)
+
+    return [tarea(check, grupo) for check, grupo in grupos.items()]
+
+
+def preparar_instancias(instancias, ruta_servicios):
+    """
+    Un MonitorState y una lista de servicios por instancia; el host por
+    defecto de los servicios es el de la instancia.
+    Devuelve [(instancia, state, servicios)].
+    """
+    preparadas = []
+    for instancia in instancias:
+        servicios = leer_servicios(instancia.servicios or ruta_servicios, instancia.host)
+        preparadas.append((instancia, MonitorState(instancia.setting, instancia.license), servicios))
+    return preparadas
+
+
+def ciclo_instancias(ejecutor, preparadas):
+    """
+    Ejecuta un ciclo en todas las instancias a la vez. Los servicios de una
+    instancia que no respondió a tiempo se entregan como UNKNOWN (copias:
+    los originales siguen en uso por el hilo colgado).
+    Devuelve (servicios a entregar, consultas).
+    """
+    por_nombre = {instancia.nombre: (state, servicios) for instancia, state, servicios in preparadas}
+    resultados = ejecutor.ejecutar('ciclo', lambda instancia: ejecutar_ciclo(*por_nombre[instancia.nombre]))
+    entregar, consultas = [], 0
+    for nombre, (resultado, error) in resultados.items():
+        servicios = por_nombre[nombre][1]
+        if error is None:
+            entregar.extend(servicios)
+            consultas += resultado
+            continue
+        for servicio in servicios:
+            copia = Servicio(servicio.host, servicio.descripcion, servicio.check, servicio.args)
+            copia.resultado(STATE_UNKNOWN, f"UNKNOWN: {error}")
+            entregar.append(copia)
+    return entregar, consultas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ejecuta todos los checks de Diafaan en un proceso y los "
+                                                 "entrega a Nagios como checks pasivos.")
+    parser.add_argument("--servicios", help=f"Archivo de servicios (default: [pasivo] servicios o {SERVICIOS_FILE} "
+                                            "junto a Setting.ini).")
+    parser.add_argument("--host", help=f"Host de Nagios por defecto (default: [pasivo] host o {DEFAULT_HOST}).")
+    destino = parser.add_mutually_exclusive_group()
+    destino.add_argument("--command-file", help="Command file de Nagios (nagios.cmd) o archivo local de prueba.")
+    destino.add_argument("--spool-dir", help="Directorio checkresults de Nagios.")
+    parser.add_argument("--bucle", action='store_true', help="Repetir el ciclo cada --intervalo segundos.")
+    parser.add_argument("--intervalo", type=float,
+                        help=f"Segundos entre ciclos con --bucle (default: [pasivo] intervalo o {DEFAULT_INTERVALO}).")
+    parser.add_argument("--adaptativo", action='store_true',
+                        help="Ejecutar cada tipo de check con planificador.py (jitter, límite de consultas "
+                             "e intervalo adaptativo); implica --bucle.")
+    args = parser.parse_args()
+
+    state = MonitorState()
+    config = state.config
+    host = args.host or config.get('pasivo', 'host', fallback=DEFAULT_HOST)
+    ruta_servicios = args.servicios or config.get(
+        'pasivo', 'servicios', fallback=os.path.join(os.path.dirname(DB_CONFIG_PATH), SERVICIOS_FILE))
+    command_file = args.command_file
+    spool_dir = args.spool_dir
+    if not command_file and not spool_dir:
+        command_file = config.get('pasivo', 'command_file', fallback=None)
+        spool_dir = config.get('pasivo', 'spool_dir', fallback=None)
+    intervalo = args.intervalo or config.getfloat('pasivo', 'intervalo', fallback=DEFAULT_INTERVALO)
+
+    try:
+        instancias = instancias_desde_config(config)
+    except ValueError as e:
+        print(f"ERROR: Configuración de instancias inválida: {e}", file=sys.stderr)
+        sys.exit(STATE_UNKNOWN)
+    try:
+        if instancias:
+            preparadas = preparar_instancias(instancias, ruta_servicios)
+            servicios = [s for _, _, grupo in preparadas for s in grupo]
+        else:
+            servicios = leer_servicios(ruta_servicios, host)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: No se pudo leer {ruta_servicios}: {e}", file=sys.stderr)
+        sys.exit(STATE_UNKNOWN)
+    if not servicios:
+        print(f"ERROR: No hay servicios en {ruta_servicios}", file=sys.stderr)
+        sys.exit(STATE_UNKNOWN)
+
+    salida_lock = threading.Lock()
+
+    def entregar(grupo, inicio, fin):
+        if spool_dir:
+            escribir_spool(spool_dir, grupo, inicio, fin)
+        elif command_file:
+            escribir_command_file(command_file, grupo, fin)
+        else:
+            with salida_lock:
+                sys.stdout.write("".join(linea_comando(s, fin) for s in grupo))
+                sys.stdout.flush()
+
+    estados = [state]
+    ejecutor = None
+    if instancias:
+        estados.extend(estado for _, estado, _ in preparadas)
+        ejecutor = ejecutor_desde_config(config, instancias)
+
+    if args.adaptativo:
+        from planificador import planificador_desde_config
+        planificador = planificador_desde_config(config)
+        if instancias:
+            tareas = [tarea for instancia, estado, grupo in preparadas
+                      for tarea in tareas_adaptativas(estado, grupo, entregar, intervalo, instancia, ejecutor)]
+        else:
+            tareas = tareas_adaptativas(state, servicios, entregar, intervalo)
+        for tarea in tareas:
+            planificador.agregar(tarea)
+        planificador.iniciar()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            planificador.detener(espera=False)
+            cerrar(estados, ejecutor)
+        return
+
+    try:
+        while True:
+            inicio = time.time()
+            if instancias:
+                resultados, consultas = ciclo_instancias(ejecutor, preparadas)
+            else:
+                resultados, consultas = servicios, ejecutar_ciclo(state, servicios)
+            fin = time.time()
+            entregar(resultados, inicio, fin)
+            print(f"{len(servicios)} servicios, {consultas} consultas en {fin - inicio:.2f} s",
+                  file=sys.stderr)
+            if not args.bucle:
+                break
+            time.sleep(max(0.0, intervalo - (time.time() - inicio)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cerrar(estados, ejecutor)
+
+
+def cerrar(estados, ejecutor):
+    if ejecutor is not None:
+        ejecutor.cerrar()
+    for estado in estados:
+        estado.cerrar_conexiones()
+
+
+if __name__ == "__main__":
+    main()
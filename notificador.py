@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+Script: notificador.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Despachador asíncrono de alertas por correo para GW_status_email.py.
+    - Los checks solo encolan la alerta en un spool SQLite local (modo WAL),
+      sin abrir conexiones SMTP: el camino de Nagios nunca espera un handshake
+      TLS ni termina en UNKNOWN porque el servidor de correo no responde.
+    - Este proceso drena el spool reutilizando una sola conexión SMTP
+      (se reconecta si el servidor la cerró y la suelta tras `keepalive` s).
+    - Las alertas que llegan dentro de la misma ventana se agrupan en un
+      correo resumen (útil cuando decenas de gateways cambian a la vez).
+    - Límite de correos por hora (token bucket): si se alcanza, las alertas
+      siguen acumulándose y salen en el próximo resumen.
+    - Si el envío falla las alertas quedan pendientes y se reintentan.
+    - --servidor-prueba levanta un SMTP local mínimo que imprime los correos,
+      para probar el flujo completo sin servidor real (ssl = no en [smtp]).
+
+Uso:
+    python notificador.py                 → despachador continuo (servicio)
+    python notificador.py --una-vez       → envía lo pendiente y termina
+    python notificador.py --servidor-prueba 1025
+
+Dependencias:
+    - Python 3.x
+    - smtplib, sqlite3 (incluidos en la librería estándar)
+
+Archivos requeridos:
+    - Setting.ini   → sección opcional [smtp]:
+                      host, port, ssl (yes/no), starttls (yes/no), usuario, password,
+                      remitente, destinatarios (separados por coma),
+                      spool (default: notificaciones.sqlite junto a Setting.ini),
+                      ventana (s, default 30), max_lote (default 50),
+                      max_por_hora (default 20), keepalive (s, default 300)
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import smtplib
+import argparse
+import datetime
+import socketserver
+from email.mime.text import MIMEText
+
+from monitor_comun import DB_CONFIG_PATH, leer_configuracion
+
+DEFAULT_HOST = 't-voip.com'
+DEFAULT_PORT = 465
+DEFAULT_REMITENTE = 'T-Voip Alerta <alerta@t-voip.com>'
+DEFAULT_DESTINATARIOS = 'soporte@t-voip.com'
+DEFAULT_VENTANA = 30        # segundos que se esperan alertas para agruparlas
+DEFAULT_MAX_LOTE = 50       # alertas máximas por correo resumen
+DEFAULT_MAX_POR_HORA = 20   # correos máximos por hora
+DEFAULT_KEEPALIVE = 300     # segundos de inactividad antes de cerrar la conexión SMTP
+SMTP_TIMEOUT = 15
+ESPERA_REINTENTO = 30       # segundos entre reintentos tras un error SMTP
+RETENCION_DIAS = 7          # días que se conservan las alertas ya enviadas
+
+schema = """
+CREATE TABLE IF NOT EXISTS alertas (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    creada     REAL NOT NULL,
+    asunto     TEXT NOT NULL,
+    cuerpo     TEXT NOT NULL,
+    enviada_en REAL
+);
+CREATE INDEX IF NOT EXISTS ix_alertas_pendientes ON alertas (enviada_en, id);
+"""
+
+
+def _log(mensaje):
+    print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {mensaje}", flush=True)
+
+
+def ruta_spool(config, config_path=DB_CONFIG_PATH):
+    """
+    Ruta del spool: [smtp] spool o notificaciones.sqlite junto a Setting.ini.
+    """
+    return config.get('smtp', 'spool',
+                      fallback=os.path.join(os.path.dirname(config_path), 'notificaciones.sqlite'))
+
+
+class Spool:
+    """
+    Cola persistente de alertas compartida entre los checks y el despachador.
+    """
+
+    def __init__(self, db_path, timeout=30):
+        # GW_status_email.py puede encolar desde distintos hilos del pool de
+        # planificador.py (nunca dos a la vez), por eso la conexión no se ata a un hilo
+        self.conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.executescript(schema)
+
+    def encolar(self, asunto, cuerpo):
+        self.conn.execute("INSERT INTO alertas (creada, asunto, cuerpo) VALUES (?, ?, ?);",
+                          (time.time(), asunto, cuerpo))
+
+    def pendientes(self, limite):
+        """
+        Devuelve [(id, creada, asunto, cuerpo), ...] en orden de llegada.
+        """
+        return self.conn.execute(
+            "SELECT id, creada, asunto, cuerpo FROM alertas WHERE enviada_en IS NULL ORDER BY id LIMIT ?;",
+            (limite,)).fetchall()
+
+    def marcar_enviadas(self, ids):
+        self.conn.executemany("UPDATE alertas SET enviada_en = ? WHERE id = ?;",
+                              [(time.time(), i) for i in ids])
+
+    def purgar(self, dias=RETENCION_DIAS):
+        self.conn.execute("DELETE FROM alertas WHERE enviada_en IS NOT NULL AND enviada_en < ?;",
+                          (time.time() - dias * 86400,))
+
+    def cerrar(self):
+        self.conn.close()
+
+
+class ConexionSMTP:
+    """
+    Conexión SMTP reutilizable entre envíos.
+    """
+
+    def __init__(self, host, port, ssl=True, starttls=False, usuario=None, password=None,
+                 keepalive=DEFAULT_KEEPALIVE, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.starttls = starttls
+        self.usuario = usuario
+        self.password = password
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.server = None
+        self.ultimo_uso = 0.0
+
+    def _conectar(self):
+        if self.ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls()
+        if self.usuario and self.password:
+            server.login(self.usuario, self.password)
+        return server
+
+    def enviar(self, remitente, destinatarios, mensaje):
+        """
+        Envía por la conexión abierta; si el servidor la cerró, reconecta una vez.
+        """
+        for intento in range(2):
+            if self.server is None:
+                self.server = self._conectar()
+            try:
+                self.server.sendmail(remitente, destinatarios, mensaje)
+                self.ultimo_uso = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                self.server = None
+                if intento:
+                    raise
+
+    def liberar_si_inactiva(self):
+        if self.server is not None and time.monotonic() - self.ultimo_uso > self.keepalive:
+            self.cerrar()
+
+    def cerrar(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+
+class LimiteEnvios:
+    """
+    Token bucket: como máximo `max_por_hora` correos por hora, con ráfagas
+    de hasta `max_por_hora`.
+    """
+
+    def __init__(self, max_por_hora):
+        self.capacidad = float(max_por_hora)
+        self.tokens = float(max_por_hora)
+        self.tasa = max_por_hora / 3600.0
+        self.ultimo = time.monotonic()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+        self.ultimo = ahora
+
+    def disponible(self):
+        self._recargar()
+        return self.tokens >= 1
+
+    def consumir(self):
+        self._recargar()
+        self.tokens -= 1
+
+    def espera(self):
+        self._recargar()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.tasa
+
+
+def componer(alertas):
+    """
+    Devuelve (asunto, cuerpo): la alerta tal cual si es una sola, o un resumen.
+    """
+    if len(alertas) == 1:
+        return alertas[0][2], alertas[0][3]
+    asunto = f"RESUMEN: {len(alertas)} alertas de gateways"
+    indice = "\n".join(f"- {datetime.datetime.fromtimestamp(creada).strftime('%H:%M:%S')} {a}"
+                       for _, creada, a, _ in alertas)
+    detalle = "\n\n".join(f"== {a}\n{c}" for _, _, a, c in alertas)
+    return asunto, f"{indice}\n\n{detalle}"
+
+
+class Despachador:
+    """
+    Drena el spool agrupando alertas por ventana y respetando el límite de envíos.
+    """
+
+    def __init__(self, spool, conexion, remitente, destinatarios, ventana=DEFAULT_VENTANA,
+                 max_lote=DEFAULT_MAX_LOTE, max_por_hora=DEFAULT_MAX_POR_HORA):
+        self.spool = spool
+        self.conexion = conexion
+        self.remitente = remitente
+        self.destinatarios = destinatarios
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self.limite = LimiteEnvios(max_por_hora)
+
+    def procesar(self, forzar=False):
+        """
+        Envía un correo si hay alertas listas. Devuelve los segundos a esperar
+        antes de la siguiente llamada.
+        """
+        alertas = self.spool.pendientes(self.max_lote)
+        if not alertas:
+            self.conexion.liberar_si_inactiva()
+            return self.ventana
+
+        # Se espera a que la alerta más antigua cumpla la ventana (o a llenar un lote)
+        edad = time.time() - alertas[0][1]
+        if not forzar and edad < self.ventana and len(alertas) < self.max_lote:
+            return self.ventana - edad
+        if not self.limite.disponible():
+            return self.limite.espera()
+
+        asunto, cuerpo = componer(alertas)
+        msg = MIMEText(cuerpo)
+        msg['Subject'] = asunto
+        msg['From'] = self.remitente
+        msg['To'] = ", ".join(self.destinatarios)
+        try:
+            self.conexion.enviar(self.remitente, self.destinatarios, msg.as_string())
+        except (smtplib.SMTPException, OSError) as e:
+            self.conexion.cerrar()
+            _log(f"ERROR al enviar correo ({len(alertas)} alertas pendientes): {e}")
+            return ESPERA_REINTENTO
+        self.limite.consumir()
+        self.spool.marcar_enviadas([a[0] for a in alertas])
+        _log(f"Enviado: {asunto}")
+        return 0.0
+
+    def ejecutar(self):
+        self.spool.purgar()
+        while True:
+            time.sleep(self.procesar())
+
+    def vaciar(self):
+        """
+        Envía todo lo pendiente sin esperar la ventana (modo --una-vez).
+        """
+        try:
+            while self.spool.pendientes(1):
+                if not self.limite.disponible() or self.procesar(forzar=True) == ESPERA_REINTENTO:
+                    return False
+            return True
+        finally:
+            self.conexion.cerrar()
+
+
+def despachador_desde_config(config, config_path=DB_CONFIG_PATH):
+    conexion = ConexionSMTP(
+        config.get('smtp', 'host', fallback=DEFAULT_HOST),
+        config.getint('smtp', 'port', fallback=DEFAULT_PORT),
+        ssl=config.getboolean('smtp', 'ssl', fallback=True),
+        starttls=config.getboolean('smtp', 'starttls', fallback=False),
+        usuario=config.get('smtp', 'usuario', fallback=None),
+        password=config.get('smtp', 'password', fallback=None),
+        keepalive=config.getfloat('smtp', 'keepalive', fallback=DEFAULT_KEEPALIVE),
+    )
+    destinatarios = [d.strip() for d in config.get('smtp', 'destinatarios', fallback=DEFAULT_DESTINATARIOS).split(',')
+                     if d.strip()]
+    return Despachador(
+        Spool(ruta_spool(config, config_path)), conexion,
+        config.get('smtp', 'remitente', fallback=DEFAULT_REMITENTE), destinatarios,
+        ventana=config.getfloat('smtp', 'ventana', fallback=DEFAULT_VENTANA),
+        max_lote=config.getint('smtp', 'max_lote', fallback=DEFAULT_MAX_LOTE),
+        max_por_hora=config.getint('smtp', 'max_por_hora', fallback=DEFAULT_MAX_POR_HORA),
+    )
+
+
+# -- SMTP local de prueba --------------------------------------------------------
+
+class _SMTPPruebaHandler(socketserver.StreamRequestHandler):
+    """
+    Servidor SMTP mínimo: acepta cualquier remitente y destinatario e imprime
+    cada mensaje recibido. Solo para pruebas locales.
+    """
+
+    def _responder(self, linea):
+        self.wfile.write(linea.encode('ascii') + b"\r\n")
+
+    def handle(self):
+        self._responder("220 localhost notificador prueba")
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            comando = linea.decode('utf-8', 'replace').strip().upper()
+            if comando.startswith(('HELO', 'EHLO')):
+                self._responder("250 localhost")
+            elif comando == 'DATA':
+                self._responder("354 fin con <CRLF>.<CRLF>")
+                lineas = []
+                while True:
+                    dato = self.rfile.readline()
+                    if not dato or dato in (b".\r\n", b".\n"):
+                        break
+                    lineas.append(dato.decode('utf-8', 'replace').rstrip('\r\n'))
+                _log("Correo recibido:\n" + "\n".join(lineas))
+                self._responder("250 OK")
+            elif comando == 'QUIT':
+                self._responder("221 Bye")
+                return
+            else:
+                # MAIL FROM, RCPT TO, NOOP, RSET
+                self._responder("250 OK")
+
+
+def crear_servidor_prueba(port=0):
+    """
+    Crea (sin iniciarlo) el SMTP local de prueba; con port=0 el sistema asigna
+    el puerto (server.server_address[1]).
+    """
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', port), _SMTPPruebaHandler)
+    server.daemon_threads = True
+    return server
+
+
+def servidor_prueba(port):
+    with crear_servidor_prueba(port) as server:
+        _log(f"SMTP de prueba escuchando en 127.0.0.1:{port}")
+        server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Despachador de alertas por correo (spool + resumen).")
+    parser.add_argument("--una-vez", action='store_true', help="Enviar lo pendiente y terminar.")
+    parser.add_argument("--servidor-prueba", type=int, metavar='PUERTO',
+                        help="Levantar un SMTP local de prueba que imprime los correos.")
+    args = parser.parse_args()
+
+    if args.servidor_prueba:
+        try:
+            servidor_prueba(args.servidor_prueba)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    despachador = despachador_desde_config(leer_configuracion(DB_CONFIG_PATH))
+    if args.una_vez:
+        sys.exit(0 if despachador.vaciar() else 1)
+    try:
+        despachador.ejecutar()
+    except KeyboardInterrupt:
+        despachador.conexion.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: planificador.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Planificador de checks con jitter, intervalo adaptativo y límite de
+    consultas simultáneas a base de datos. Con intervalos fijos los checks
+    de Q_completo.py, total_Priority.py, SMS_GW_Status.py y GW_TPS.py
+    terminan alineados y golpean SQLite y SQL Server en el mismo segundo
+    (los reintentos por "database is locked"). Aquí cada tarea:
+    - arranca con un desfase aleatorio y cada ejecución se corre ±jitter,
+      por lo que las tareas no vuelven a alinearse;
+    - si usa base de datos, espera un cupo del semáforo (max_db) antes de
+      ejecutarse;
+    - con WARNING acorta su intervalo a la mitad y con CRITICAL lo lleva al
+      mínimo (base × factor_min); tras `estables` resultados OK seguidos lo
+      duplica hasta volver a la base; con UNKNOWN vuelve a la base (no se
+      insiste sobre una fuente caída);
+    - las tareas de base de datos comparten un presupuesto de carga igual a
+      la suma de 1/intervalo base: si las que están en alerta lo superan,
+      las que están OK se espacian (hasta base × factor_max), de modo que la
+      carga promedio sobre la base se mantiene plana.
+    Usado por nagios_pasivo.py --adaptativo y por prometheus_exporter.py
+    (si existe la sección [planificador]).
+
+Configuración (Setting.ini, sección opcional [planificador]):
+    jitter = 0.2          → fracción del intervalo para el desfase aleatorio
+    max_db = 2            → tareas de base de datos simultáneas
+    hilos = 4             → tareas simultáneas en total
+    factor_min = 0.25     → intervalo mínimo en alerta (× base)
+    factor_max = 4        → intervalo máximo al ceder carga (× base)
+    estables = 3          → resultados OK seguidos antes de relajar el intervalo
+    intervalo_<check>     → intervalo base de un check en nagios_pasivo.py
+
+Dependencias:
+    - Python 3.x
+"""
+
+import sys
+import time
+import heapq
+import random
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from monitor_comun import STATE_OK, STATE_WARNING, STATE_CRITICAL, STATE_UNKNOWN
+
+JITTER = 0.2
+MAX_DB = 2
+HILOS = 4
+FACTOR_MIN = 0.25
+FACTOR_MAX = 4.0
+ESTABLES = 3
+
+
+class Tarea:
+    """
+    Una función periódica. `funcion()` devuelve el estado Nagios del
+    resultado (para adaptar el intervalo) o None si no aplica.
+    """
+
+    def __init__(self, nombre, funcion, intervalo, usa_db=False):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.base = float(intervalo)
+        self.intervalo = float(intervalo)
+        self.usa_db = usa_db
+        self.estado = None
+        self.estables = 0
+        self.ejecuciones = 0
+        self.espera_db = 0.0
+        self.duracion = 0.0
+        self.error = None
+        self.proxima = None
+
+
+class Planificador:
+    """
+    Ejecuta las tareas en un pool de hilos según su próxima hora (heap),
+    sin que una misma tarea se superponga consigo misma.
+    """
+
+    def __init__(self, jitter=JITTER, max_db=MAX_DB, hilos=HILOS, factor_min=FACTOR_MIN,
+                 factor_max=FACTOR_MAX, estables=ESTABLES, semilla=None):
+        self.jitter = jitter
+        self.factor_min = factor_min
+        self.factor_max = factor_max
+        self.estables = estables
+        self.hilos = hilos
+        self.tareas = []
+        self._rnd = random.Random(semilla)
+        self._semaforo_db = threading.BoundedSemaphore(max_db)
+        self._lock = threading.Lock()
+        self._cola = []
+        self._espera_db = deque()
+        self._orden = itertools.count()
+        self._cond = threading.Condition()
+        self._detener = threading.Event()
+        self._pool = None
+        self._hilo = None
+
+    def agregar(self, tarea):
+        self.tareas.append(tarea)
+        return tarea
+
+    # -- Adaptación del intervalo ----------------------------------------------
+
+    def presupuesto_db(self):
+        """
+        Consultas por segundo a base de datos con todos los intervalos en su base.
+        """
+        return sum(1.0 / t.base for t in self.tareas if t.usa_db)
+
+    def carga_db(self):
+        return sum(1.0 / t.intervalo for t in self.tareas if t.usa_db)
+
+    def ajustar(self, tarea, estado):
+        """
+        Actualiza el intervalo de la tarea según el estado de su última ejecución.
+        """
+        with self._lock:
+            self._ajustar(tarea, estado)
+
+    def _ajustar(self, tarea, estado):
+        tarea.estado = estado
+        minimo = tarea.base * self.factor_min
+        if estado is None:
+            return
+        if estado == STATE_CRITICAL:
+            tarea.estables = 0
+            tarea.intervalo = minimo
+        elif estado == STATE_WARNING:
+            tarea.estables = 0
+            tarea.intervalo = max(minimo, min(tarea.intervalo, tarea.base) / 2)
+        elif estado == STATE_OK:
+            tarea.estables += 1
+            if tarea.intervalo > tarea.base:
+                tarea.intervalo = tarea.base
+            elif tarea.intervalo < tarea.base and tarea.estables >= self.estables:
+                tarea.intervalo = min(tarea.base, tarea.intervalo * 2)
+        else:
+            tarea.estables = 0
+            tarea.intervalo = tarea.base
+        if tarea.usa_db:
+            self._rebalancear()
+
+    def _rebalancear(self):
+        """
+        Espacia las tareas de base de datos en OK para compensar las que
+        están en alerta y mantener la carga dentro del presupuesto.
+        """
+        en_alerta = [t for t in self.tareas if t.usa_db and t.estado in (STATE_WARNING, STATE_CRITICAL)]
+        if not en_alerta:
+            return
+        estables = [t for t in self.tareas if t.usa_db and t not in en_alerta]
+        carga_estables = sum(1.0 / t.base for t in estables)
+        disponible = self.presupuesto_db() - sum(1.0 / t.intervalo for t in en_alerta)
+        if not estables or carga_estables <= disponible:
+            return
+        factor = carga_estables / disponible if disponible > 0 else self.factor_max
+        for t in estables:
+            t.intervalo = min(t.base * self.factor_max, t.base * factor)
+
+    def _proxima(self, tarea, ahora):
+        return ahora + tarea.intervalo * (1 + self._rnd.uniform(-self.jitter, self.jitter))
+
+    # -- Ejecución ---------------------------------------------------------------
+
+    def _programar(self, tarea, cuando):
+        tarea.proxima = cuando
+        with self._cond:
+            heapq.heappush(self._cola, (cuando, next(self._orden), tarea))
+            self._cond.notify()
+
+    def _despachar(self, tarea):
+        """
+        Envía la tarea al pool. Una tarea de base de datos sin cupo queda en
+        espera fuera del pool, para no ocupar un hilo que necesitan las demás.
+        """
+        if tarea.usa_db:
+            if not self._semaforo_db.acquire(blocking=False):
+                with self._cond:
+                    self._espera_db.append((time.monotonic(), tarea))
+                return
+            tarea.espera_db = 0.0
+        self._pool.submit(self._ejecutar, tarea)
+
+    def _liberar_db(self):
+        with self._cond:
+            siguiente = self._espera_db.popleft() if self._espera_db else None
+        if siguiente is None or self._detener.is_set():
+            self._semaforo_db.release()
+            return
+        # El cupo pasa directamente a la siguiente tarea en espera.
+        desde, tarea = siguiente
+        tarea.espera_db = time.monotonic() - desde
+        self._pool.submit(self._ejecutar, tarea)
+
+    def _ejecutar(self, tarea):
+        inicio = time.monotonic()
+        estado = None
+        try:
+            estado = tarea.funcion()
+            tarea.error = None
+        except Exception as e:
+            tarea.error = e
+            estado = STATE_UNKNOWN
+            print(f"Aviso: la tarea '{tarea.nombre}' falló: {e}", file=sys.stderr)
+        finally:
+            if tarea.usa_db:
+                self._liberar_db()
+        tarea.ejecuciones += 1
+        tarea.duracion = time.monotonic() - inicio
+        self.ajustar(tarea, estado)
+        if not self._detener.is_set():
+            self._programar(tarea, self._proxima(tarea, time.monotonic()))
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while not self._detener.is_set():
+                    espera = self._cola[0][0] - time.monotonic() if self._cola else None
+                    if espera is not None and espera <= 0:
+                        break
+                    self._cond.wait(espera)
+                if self._detener.is_set():
+                    return
+                _, _, tarea = heapq.heappop(self._cola)
+            try:
+                self._despachar(tarea)
+            except RuntimeError:
+                # El pool ya fue cerrado por detener().
+                return
+
+    def iniciar(self):
+        """
+        Programa cada tarea con un desfase aleatorio dentro de su primer
+        intervalo × jitter y arranca el hilo despachador.
+        """
+        self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='planificador')
+        ahora = time.monotonic()
+        for tarea in self.tareas:
+            self._programar(tarea, ahora + self._rnd.uniform(0, tarea.base * self.jitter))
+        self._hilo = threading.Thread(target=self._bucle, name='planificador', daemon=True)
+        self._hilo.start()
+
+    def detener(self, espera=True):
+        self._detener.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._pool is not None:
+            self._pool.shutdown(wait=espera)
+
+    def resumen(self):
+        """
+        Estado de cada tarea: [(nombre, base, intervalo, estado, ejecuciones)].
+        """
+        return [(t.nombre, t.base, t.intervalo, t.estado, t.ejecuciones) for t in self.tareas]
+
+
+def planificador_desde_config(config):
+    """
+    Crea el planificador a partir de la sección opcional [planificador] de Setting.ini.
+    """
+    return Planificador(
+        jitter=config.getfloat('planificador', 'jitter', fallback=JITTER),
+        max_db=config.getint('planificador', 'max_db', fallback=MAX_DB),
+        hilos=config.getint('planificador', 'hilos', fallback=HILOS),
+        factor_min=config.getfloat('planificador', 'factor_min', fallback=FACTOR_MIN),
+        factor_max=config.getfloat('planificador', 'factor_max', fallback=FACTOR_MAX),
+        estables=config.getint('planificador', 'estables', fallback=ESTABLES),
+    )
@@ -0,0 +1,549 @@
+# -*- coding: utf-8 -*-
+"""
+Script: prometheus_exporter.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Exporter de Prometheus para Diafaan. La lógica existente de TPS
+    (GW_TPS.py), colas (Q_completo.py), prioridades (total_Priority.py),
+    errores (SMS_GW_Status.py), estado XML (diafaan_xml.py) y tasas desde
+    los contadores del XML (tasas_xml.py) se ejecuta en
+    colectores de fondo, cada uno con su propio intervalo. El endpoint
+    /metrics solo sirve la última instantánea en memoria, por lo que la
+    frecuencia de scrape o la cantidad de dashboards de Grafana no
+    multiplican la carga sobre SQL Server, SQLite ni la API de Diafaan.
+    Usa solo la librería estándar (formato de texto de Prometheus).
+
+Uso:
+    python prometheus_exporter.py [--host 0.0.0.0] [--port 9464]
+
+Métricas:
+    tps_gateway{gateway}                 → TPS del último minuto (SQL Server; 0 para las gateways ya vistas sin tráfico)
+    messages_in_queue{gatewayid}         → mensajes en SendQueue por gateway (todas; 0 para las activas y ya vistas)
+    messages_by_priority{priority}       → mensajes en SendQueue por prioridad (0 para 0-9 y las ya vistas)
+    errors_per_gateway{gatewayid,code}   → mensajes con StatusCode de error por gateway (0 para los pares ya vistos)
+    gateway_status{gateway}              → 1 activa / 0 inactiva (XML)
+    gateway_sent_messages{gateway}       → contador SentMessages del XML
+    gateway_failed_messages{gateway}     → contador FailedMessages del XML
+    messages_in_send_queue               → MessagesInSendQueue global del XML
+    gateway_send_rate{gateway}           → mensajes enviados/s (Δ SentMessages del XML)
+    gateway_fail_rate{gateway}           → mensajes fallidos/s (Δ FailedMessages del XML)
+    gateway_error_ratio{gateway}         → fracción de fallos en el último intervalo
+    diafaan_collector_up{collector}      → 1 si la última ejecución fue exitosa
+    diafaan_collector_duration_seconds{collector}
+    diafaan_collector_last_success_timestamp_seconds{collector}
+    diafaan_series_discarded_samples_total → muestras que no cupieron en el almacén de series
+
+    Con secciones [instancia:<nombre>] en Setting.ini (ver instancias.py) se
+    crean los colectores de cada instancia de Diafaan con su propio
+    Setting.ini; se ejecutan a la vez, cada uno con el plazo de su instancia
+    (una instancia lenta o caída no retrasa a las demás), y todas las
+    métricas, incluidas las diafaan_collector_*, llevan la etiqueta
+    diafaan_instance. El colector errors usa el messagelog_path de la
+    sección [exporter] o, si no está, el de [BDSQLite] de cada instancia.
+
+    Las muestras de los colectores tps, queue, priority y errors se guardan
+    además en el almacén de series de serie_temporal.py (memoria acotada,
+    opcionalmente en un archivo mmap). /series?metrica=X&ventana=S[&etiqueta=valor]
+    devuelve en JSON min, max, media, último valor y tasa de cambio por serie.
+
+Dependencias:
+    - Python 3.x
+    - pyodbc (colector tps), requests (colector status)
+
+Archivos requeridos:
+    - Setting.ini   → secciones [sqlodbc], [BDSQLite], [URL] y opcional [exporter]:
+                      host, port, colectores (tps,queue,priority,errors,status,tps_xml),
+                      intervalo_<colector> (segundos), error_codes (p. ej. 300,500),
+                      messagelog_path (default: el de SMS_GW_Status.obtener_db_path)
+                      y opcional [series] (ruta, capacidad, max_series, colectores)
+                      y opcional [instancias] / [instancia:<nombre>] (ver instancias.py)
+                      y opcional [planificador] (ver planificador.py): los colectores
+                      se ejecutan con jitter y con a lo sumo max_db de tps, queue,
+                      priority y errors consultando la base a la vez
+    - License.py    → contiene función get_expiration_date()
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlite_ro import conectar_ro, consultar
+from serie_temporal import almacen_desde_config, colectores_con_series
+from instancias import instancias_desde_config, ejecutor_desde_config
+from monitor_comun import (
+    DB_CONFIG_PATH, LICENSE_CONFIG_PATH, leer_configuracion, verificar_licencia_o_salir,
+)
+
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 9464
+
+# Intervalos por defecto (segundos) de cada colector
+INTERVALOS = {
+    'tps': 60,
+    'queue': 30,
+    'priority': 30,
+    'errors': 300,
+    'status': 30,
+    'tps_xml': 30,
+}
+
+# Colectores que consultan SQL Server o SQLite (cupo max_db de [planificador])
+COLECTORES_DB = ('tps', 'queue', 'priority', 'errors')
+
+# Etiqueta de la instancia de Diafaan ("instance" la asigna Prometheus a cada target)
+ETIQUETA_INSTANCIA = 'diafaan_instance'
+
+# Tipo y descripción de cada métrica exportada
+METRICAS = {
+    'tps_gateway': ('gauge', 'TPS por gateway en el último minuto.'),
+    'messages_in_queue': ('gauge', 'Mensajes en SendQueue por gateway.'),
+    'messages_by_priority': ('gauge', 'Mensajes en SendQueue por prioridad.'),
+    'errors_per_gateway': ('gauge', 'Mensajes en MessageOut con StatusCode de error por gateway.'),
+    'gateway_status': ('gauge', 'Estado de la gateway en el XML (1 activa, 0 inactiva).'),
+    'gateway_sent_messages': ('gauge', 'Contador SentMessages de la gateway en el XML.'),
+    'gateway_failed_messages': ('gauge', 'Contador FailedMessages de la gateway en el XML.'),
+    'messages_in_send_queue': ('gauge', 'MessagesInSendQueue global del XML.'),
+    'gateway_send_rate': ('gauge', 'Mensajes enviados por segundo según los contadores del XML.'),
+    'gateway_fail_rate': ('gauge', 'Mensajes fallidos por segundo según los contadores del XML.'),
+    'gateway_error_ratio': ('gauge', 'Fracción de mensajes fallidos en el último intervalo del XML.'),
+    'diafaan_series_discarded_samples_total': ('counter', 'Muestras que no se guardaron en el almacén de series '
+                                                          '(max_series alcanzado o nombre de serie demasiado largo).'),
+}
+
+class Colector:
+    """
+    Ejecuta `funcion` cada `intervalo` segundos en un hilo propio.
+    `funcion()` devuelve una lista de muestras (métrica, {etiqueta: valor}, número).
+    Si se entrega `almacen` (serie_temporal.py) cada ejecución exitosa se agrega a él.
+    `etiquetas` se agregan a las métricas diafaan_collector_* (p. ej. la instancia).
+    """
+
+    def __init__(self, nombre, intervalo, funcion, almacen=None, etiquetas=None):
+        self.nombre = nombre
+        self.etiquetas = etiquetas or {}
+        self.intervalo = intervalo
+        self.funcion = funcion
+        self.almacen = almacen
+        self.muestras = []
+        self.ok = False
+        self.duracion = 0.0
+        self.ultimo_exito = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+
+    def ejecutar(self):
+        inicio = time.perf_counter()
+        try:
+            muestras = self.funcion()
+            error = None
+        except Exception as e:
+            muestras, error = None, e
+        duracion = time.perf_counter() - inicio
+        with self._lock:
+            self.duracion = duracion
+            self.error = error
+            self.ok = error is None
+            if error is None:
+                # Ante un error se conservan las últimas muestras válidas
+                self.muestras = muestras
+                self.ultimo_exito = time.time()
+        if error is None and self.almacen is not None:
+            self.almacen.agregar_muestras(muestras, self.ultimo_exito)
+
+    def instantanea(self):
+        with self._lock:
+            return list(self.muestras), self.ok, self.duracion, self.ultimo_exito
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            inicio = time.monotonic()
+            self.ejecutar()
+            self._detener.wait(max(0.0, self.intervalo - (time.monotonic() - inicio)))
+
+    def iniciar(self):
+        sufijo = ''.join(f'_{v}' for v in self.etiquetas.values())
+        threading.Thread(target=self._bucle, name=f'colector_{self.nombre}{sufijo}', daemon=True).start()
+
+    def detener(self):
+        self._detener.set()
+
+
+# -- Formato de texto de Prometheus -------------------------------------------
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _numero(valor):
+    valor = float(valor)
+    return str(int(valor)) if valor.is_integer() else repr(valor)
+
+
+def _linea(metrica, etiquetas, valor):
+    if etiquetas:
+        texto = ",".join(f'{k}="{_escapar(v)}"' for k, v in etiquetas.items())
+        return f"{metrica}{{{texto}}} {_numero(valor)}"
+    return f"{metrica} {_numero(valor)}"
+
+
+def render(colectores, almacen=None):
+    """
+    Genera el texto de /metrics a partir de las instantáneas de los colectores
+    y, con `almacen`, el total de muestras descartadas por serie_temporal.py.
+    """
+    por_metrica = {}
+    estado = []
+    for colector in colectores:
+        muestras, ok, duracion, ultimo_exito = colector.instantanea()
+        for metrica, etiquetas, valor in muestras:
+            por_metrica.setdefault(metrica, []).append(_linea(metrica, etiquetas, valor))
+        etiqueta = dict(colector.etiquetas, collector=colector.nombre)
+        estado.append(('diafaan_collector_up', etiqueta, 1 if ok else 0))
+        estado.append(('diafaan_collector_duration_seconds', etiqueta, duracion))
+        if ultimo_exito is not None:
+            estado.append(('diafaan_collector_last_success_timestamp_seconds', etiqueta, ultimo_exito))
+    if almacen is not None:
+        metrica = 'diafaan_series_discarded_samples_total'
+        por_metrica[metrica] = [_linea(metrica, {}, almacen.descartadas)]
+
+    lineas = []
+    for metrica, valores in por_metrica.items():
+        tipo, ayuda = METRICAS.get(metrica, ('gauge', metrica))
+        lineas.append(f"# HELP {metrica} {ayuda}")
+        lineas.append(f"# TYPE {metrica} {tipo}")
+        lineas.extend(valores)
+    for metrica, etiquetas, valor in estado:
+        lineas.append(_linea(metrica, etiquetas, valor))
+    return "\n".join(lineas) + "\n"
+
+
+# -- Colectores ----------------------------------------------------------------
+
+def colector_tps(config):
+    if not config.has_section('sqlodbc'):
+        return None
+    import GW_TPS
+    from sqlserver_db import db_desde_config
+    conn_str = GW_TPS.cadena_conexion(config)
+    if conn_str is None:
+        return None
+    db = db_desde_config(config, conn_str)
+    # La consulta agrupada solo devuelve gateways con tráfico en el minuto: las
+    # ya vistas se siguen reportando con 0 para que su serie no desaparezca
+    conocidas = set()
+
+    def recolectar():
+        tps_por_gateway, _ = GW_TPS.consultar_tps_agrupado(db)
+        conocidas.update(tps_por_gateway)
+        return [('tps_gateway', {'gateway': gw}, tps_por_gateway.get(gw, 0.0)) for gw in sorted(conocidas)]
+    return recolectar
+
+
+def _consultor(db_path):
+    """
+    Devuelve una función consulta(sql, params) -> filas sobre una conexión de
+    solo lectura que se abre en la primera ejecución y se reutiliza después;
+    si la base no está disponible el colector queda en error sin detener el exporter.
+    """
+    estado = {'conn': None}
+
+    def consulta(sql, params=()):
+        if estado['conn'] is None:
+            estado['conn'] = conectar_ro(db_path, check_same_thread=False)
+        filas, _ = consultar(estado['conn'], sql, params)
+        return filas
+    return consulta
+
+
+def colector_queue(config):
+    import Q_completo
+    db_path = Q_completo.obtener_db_path(config)
+    if db_path is None:
+        return None
+    consulta = _consultor(db_path)
+    # Todas las gateways con cola, no solo active_gateways (las mismas que el historial
+    # de pronostico_cola.py); las activas y las ya vistas se reportan con 0 si no tienen mensajes
+    conocidas = set(Q_completo.active_gateways)
+
+    def recolectar():
+        counts = {int(gatewayid): count for gatewayid, count in consulta(Q_completo.profundidad_query)}
+        conocidas.update(counts)
+        return [('messages_in_queue', {'gatewayid': gw}, counts.get(gw, 0)) for gw in sorted(conocidas)]
+    return recolectar
+
+
+def colector_priority(config):
+    import Q_completo
+    import total_Priority
+    db_path = Q_completo.obtener_db_path(config)
+    if db_path is None:
+        return None
+    consulta = _consultor(db_path)
+    # El histograma solo trae las prioridades con mensajes: las esperadas (0-9)
+    # y las ya vistas se reportan con 0 para que la serie baje a 0 al vaciarse
+    conocidas = set(total_Priority.prioridades_esperadas)
+
+    def recolectar():
+        totales = {int(prioridad): total for prioridad, total in consulta(total_Priority.histogram_query)}
+        conocidas.update(totales)
+        return [('messages_by_priority', {'priority': prioridad}, totales.get(prioridad, 0))
+                for prioridad in sorted(conocidas)]
+    return recolectar
+
+
+def colector_errors(config):
+    import SMS_GW_Status
+    codigos = [int(c) for c in config.get('exporter', 'error_codes', fallback='').split(',') if c.strip()]
+    if not codigos:
+        return None
+    consulta = _consultor(config.get('exporter', 'messagelog_path', fallback=SMS_GW_Status.obtener_db_path(config)))
+    query = f"""
+    SELECT GatewayId, StatusCode, COUNT(*)
+    FROM MessageOut
+    WHERE StatusCode IN ({','.join('?' for _ in codigos)})
+      AND GatewayId IS NOT NULL
+    GROUP BY GatewayId, StatusCode;
+    """
+    # Los pares gateway/código ya vistos se siguen reportando con 0 sin errores
+    conocidas = set()
+
+    def recolectar():
+        totales = {(int(gw), int(code)): total for gw, code, total in consulta(query, codigos)}
+        conocidas.update(totales)
+        return [('errors_per_gateway', {'gatewayid': gw, 'code': code}, totales.get((gw, code), 0))
+                for gw, code in sorted(conocidas)]
+    return recolectar
+
+
+def colector_status(config):
+    from diafaan_xml import cache_desde_config
+    # Misma URL del XML de estado que usa GW_status_email.py
+    url = config.get('URL', 'url', fallback=None)
+    if url is None:
+        return None
+    cache = cache_desde_config(config)
+
+    def recolectar():
+        gateways, servidor = cache.obtener_gateways(url)
+        muestras = []
+        for gw in gateways:
+            etiqueta = {'gateway': gw['Name']}
+            muestras.append(('gateway_status', etiqueta, 1 if gw['Active'] else 0))
+            for campo, metrica in (('SentMessages', 'gateway_sent_messages'),
+                                   ('FailedMessages', 'gateway_failed_messages')):
+                if gw.get(campo) not in (None, ''):
+                    muestras.append((metrica, etiqueta, float(gw[campo])))
+        if servidor.get('MessagesInSendQueue') not in (None, ''):
+            muestras.append(('messages_in_send_queue', {}, float(servidor['MessagesInSendQueue'])))
+        return muestras
+    return recolectar
+
+
+def colector_tps_xml(config):
+    import tasas_xml
+    from diafaan_xml import cache_desde_config
+    url = config.get('URL', 'url', fallback=None)
+    if url is None:
+        return None
+    cache = cache_desde_config(config)
+    # La instantánea anterior queda en memoria: el primer ciclo no produce tasas
+    contadores = tasas_xml.ContadoresXML()
+
+    def recolectar():
+        muestras = []
+        for nombre, tasa in tasas_xml.muestrear(cache, url, contadores).items():
+            if tasa is None:
+                continue
+            etiqueta = {'gateway': nombre}
+            muestras.append(('gateway_send_rate', etiqueta, tasa['envio']))
+            muestras.append(('gateway_fail_rate', etiqueta, tasa['fallo']))
+            muestras.append(('gateway_error_ratio', etiqueta, tasa['error'] / 100.0))
+        return muestras
+    return recolectar
+
+
+FABRICAS = {
+    'tps': colector_tps,
+    'queue': colector_queue,
+    'priority': colector_priority,
+    'errors': colector_errors,
+    'status': colector_status,
+    'tps_xml': colector_tps_xml,
+}
+
+
+def crear_colectores(config, almacen=None, instancia=None, ejecutor=None):
+    """
+    Crea los colectores habilitados en [exporter] colectores.
+    Los que no tienen configuración suficiente se omiten con un aviso.
+    Los indicados en [series] colectores guardan sus muestras en `almacen`.
+    Con `instancia` (instancias.py) cada ejecución corre en el pool de
+    `ejecutor` con el plazo de la instancia y sus muestras llevan la etiqueta
+    diafaan_instance.
+    """
+    con_series = colectores_con_series(config)
+    nombres = config.get('exporter', 'colectores', fallback=','.join(FABRICAS))
+    colectores = []
+    for nombre in (n.strip() for n in nombres.split(',') if n.strip()):
+        fabrica = FABRICAS.get(nombre)
+        if fabrica is None:
+            print(f"Aviso: colector desconocido '{nombre}'", file=sys.stderr)
+            continue
+        funcion = fabrica(config)
+        if funcion is None:
+            origen = f"el Setting.ini de la instancia {instancia.nombre}" if instancia else "Setting.ini"
+            print(f"Aviso: colector '{nombre}' sin configuración suficiente en {origen}; se omite", file=sys.stderr)
+            continue
+        etiquetas = None
+        if instancia is not None:
+            funcion = _en_instancia(funcion, nombre, instancia, ejecutor)
+            etiquetas = {ETIQUETA_INSTANCIA: instancia.nombre}
+        intervalo = config.getfloat('exporter', f'intervalo_{nombre}', fallback=INTERVALOS[nombre])
+        colectores.append(Colector(nombre, intervalo, funcion, almacen if nombre in con_series else None, etiquetas))
+    return colectores
+
+
+def _en_instancia(funcion, nombre, instancia, ejecutor):
+    def recolectar():
+        muestras = ejecutor.llamar(instancia, nombre, funcion)
+        return [(metrica, dict(etiquetas, **{ETIQUETA_INSTANCIA: instancia.nombre}), valor)
+                for metrica, etiquetas, valor in muestras]
+    return recolectar
+
+
+def crear_colectores_instancias(config, instancias, ejecutor, almacen=None):
+    """
+    Colectores de todas las instancias. Cada una usa su propio Setting.ini;
+    si no tiene sección [exporter] se toma la del Setting.ini principal.
+    """
+    colectores = []
+    for instancia in instancias:
+        config_instancia = instancia.cargar_config(config, heredadas=('exporter',))
+        colectores.extend(crear_colectores(config_instancia, almacen, instancia, ejecutor))
+    return colectores
+
+
+def resumen_series(almacen, metrica, etiquetas, ventana):
+    """
+    Resumen por ventana de todas las series de `metrica` que coinciden con `etiquetas`.
+    """
+    ahora = time.time()
+    resultados = []
+    for etiquetas_serie, _ in almacen.buscar(metrica, etiquetas):
+        resumen = almacen.resumen(metrica, etiquetas_serie, ventana, ahora)
+        if resumen is not None:
+            resultados.append(dict(resumen, etiquetas=etiquetas_serie))
+    return resultados
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        if partes.path == '/metrics':
+            cuerpo = render(self.server.colectores, self.server.almacen).encode('utf-8')
+            tipo = 'text/plain; version=0.0.4; charset=utf-8'
+        elif partes.path == '/series':
+            parametros = dict(parse_qsl(partes.query))
+            metrica = parametros.pop('metrica', None)
+            if not metrica:
+                self.send_error(400, "falta el parámetro metrica")
+                return
+            try:
+                ventana = float(parametros.pop('ventana', 600))
+            except ValueError:
+                self.send_error(400, "ventana inválida")
+                return
+            cuerpo = json.dumps(resumen_series(self.server.almacen, metrica, parametros, ventana),
+                                ensure_ascii=False).encode('utf-8')
+            tipo = 'application/json; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporter de Prometheus para Diafaan con colectores de fondo.")
+    parser.add_argument("--host", help="Dirección de escucha (default: [exporter] host o 0.0.0.0).")
+    parser.add_argument("--port", type=int, help="Puerto de escucha (default: [exporter] port o 9464).")
+    args = parser.parse_args()
+
+    config = leer_configuracion(DB_CONFIG_PATH)
+    verificar_licencia_o_salir(LICENSE_CONFIG_PATH)
+
+    try:
+        almacen = almacen_desde_config(config)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: No se pudo abrir el almacén de series: {e}")
+        sys.exit(1)
+    try:
+        instancias = instancias_desde_config(config)
+    except ValueError as e:
+        print(f"ERROR: Configuración de instancias inválida: {e}")
+        sys.exit(1)
+    ejecutor = None
+    if instancias:
+        ejecutor = ejecutor_desde_config(config, instancias)
+        colectores = crear_colectores_instancias(config, instancias, ejecutor, almacen)
+    else:
+        colectores = crear_colectores(config, almacen)
+    if not colectores:
+        print("ERROR: No hay colectores configurados.")
+        sys.exit(1)
+    planificador = None
+    if config.has_section('planificador'):
+        # Jitter y límite de consultas simultáneas; el intervalo de cada
+        # colector no se adapta (no hay estado Nagios que lo guíe).
+        from planificador import Tarea, planificador_desde_config
+        planificador = planificador_desde_config(config)
+        for colector in colectores:
+            nombre = ':'.join(list(colector.etiquetas.values()) + [colector.nombre])
+            planificador.agregar(Tarea(nombre, colector.ejecutar, colector.intervalo,
+                                       usa_db=colector.nombre in COLECTORES_DB))
+        planificador.iniciar()
+    else:
+        for colector in colectores:
+            colector.iniciar()
+
+    host = args.host or config.get('exporter', 'host', fallback=DEFAULT_HOST)
+    port = args.port or config.getint('exporter', 'port', fallback=DEFAULT_PORT)
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.colectores = colectores
+    server.almacen = almacen
+    nombres = ', '.join(dict.fromkeys(c.nombre for c in colectores))
+    if instancias:
+        nombres += f"; instancias: {', '.join(i.nombre for i in instancias)}"
+    print(f"prometheus_exporter escuchando en {host}:{port} ({nombres})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if planificador is not None:
+            planificador.detener(espera=False)
+        for colector in colectores:
+            colector.detener()
+        if ejecutor is not None:
+            ejecutor.cerrar()
+        server.server_close()
+        almacen.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Script: pronostico_cola.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Pronóstico de la cola SendQueue por gateway, para alertar antes de que
+    una cola se vuelva irrecuperable y no cuando Q_completo.py ya muestra
+    un número grande.
+    Con las muestras de profundidad por gatewayid de la ventana reciente
+    ajusta, para todas las gateways a la vez, una recta por mínimos
+    cuadrados (profundidad actual y tasa neta de crecimiento), y con una sola
+    consulta agrupada sobre MessageOut obtiene la tasa de envío (drenaje) de
+    cada gateway. Con eso estima:
+        ttd → segundos hasta vaciar la cola: con la tasa neta si es negativa;
+              si la profundidad está estable (tasa neta casi nula), con la
+              tasa de drenaje (profundidad / drenaje: lo que tarda la gateway
+              en enviar lo acumulado)
+        ttt → segundos hasta alcanzar el umbral de cola (si la tasa neta es positiva)
+    El ajuste se hace en un solo paso matricial con NumPy (gateways ×
+    muestras), por lo que sigue siendo barato con cientos de gateways; sin
+    NumPy se usa el mismo cálculo gateway por gateway en Python.
+
+    Origen de las muestras de profundidad:
+        - el almacén de series del exporter (serie_temporal.py, métrica
+          messages_in_queue) si existe [series] ruta o se indica --series;
+        - si no, un historial propio acotado a la ventana (--historial), al
+          que cada ejecución agrega una muestra con una consulta agrupada
+          sobre SendQueue.
+    Ambos cubren las mismas gateways: todas las que tienen mensajes en cola
+    (Q_completo.profundidad_query), no solo active_gateways, y las ya vistas
+    se siguen registrando con 0 cuando su cola se vacía.
+
+Uso:
+    python pronostico_cola.py [--ventana 900] [--umbral-cola 10000]
+                              [--warning 1800] [--critical 600] [--min-muestras 3]
+                              [--series series.dat | --historial historial.json]
+
+Ejemplo:
+    # WARNING si alguna cola llega a 20000 mensajes en menos de 30 minutos
+    python pronostico_cola.py --umbral-cola 20000 --warning 1800 --critical 600
+
+Dependencias:
+    - Python 3.x
+    - numpy (opcional, cálculo vectorizado)
+
+Archivos requeridos:
+    - Setting.ini   → sección [BDSQLite] (db_path de SendQueue) y opcional [series] ruta
+    - License.py    → contiene función get_expiration_date()
+    - MessageLog.sqlite (ruta de SMS_GW_Status.py o DIAFAAN_MESSAGELOG)
+"""
+
+import os
+import json
+import math
+import time
+import sqlite3
+import datetime
+import argparse
+
+try:
+    import numpy as np
+except ImportError:  # sin NumPy se ajusta gateway por gateway
+    np = None
+
+from sqlite_ro import ejecutar_consulta, perfdata_lock_wait
+# Profundidad de todas las gateways (no solo active_gateways), igual que el colector queue del exporter
+from Q_completo import profundidad_query
+from monitor_comun import (
+    DB_CONFIG_PATH, LICENSE_CONFIG_PATH, STATE_OK, STATE_WARNING, STATE_CRITICAL,
+    STATE_UNKNOWN, leer_configuracion, salir, verificar_licencia_o_salir,
+)
+
+VENTANA = 900               # segundos de muestras usadas en el ajuste
+UMBRAL_COLA = 10000         # profundidad considerada irrecuperable
+WARNING_S = 1800            # ttt bajo el cual se reporta WARNING
+CRITICAL_S = 600            # ttt bajo el cual se reporta CRITICAL
+MIN_MUESTRAS = 3            # muestras mínimas por gateway para ajustar
+PENDIENTE_PLANA = 0.01      # tasa neta (mensajes/s) bajo la cual la profundidad se considera estable
+
+historial_path = os.path.join(os.path.dirname(DB_CONFIG_PATH), 'pronostico_cola.json')
+
+# Mensajes enviados por gateway desde un SendTime (tasa de drenaje)
+drenaje_query = """
+SELECT GatewayId, COUNT(*)
+FROM MessageOut
+WHERE SendTime >= ?
+  AND GatewayId IS NOT NULL
+GROUP BY GatewayId;
+"""
+
+
+# -- Ajuste ------------------------------------------------------------------------
+
+def _ajustar_numpy(tiempos, matriz):
+    """
+    Mínimos cuadrados por fila sobre la matriz gateways × muestras (NaN = sin muestra).
+    Devuelve (pendiente, actual, n) como arrays.
+    """
+    t = np.asarray(tiempos, dtype=float)
+    d = np.asarray(matriz, dtype=float)
+    w = (~np.isnan(d)).astype(float)
+    d = np.where(w > 0, d, 0.0)
+    n = w.sum(axis=1)
+    divisor = np.where(n > 0, n, 1.0)
+    t_media = (w * t).sum(axis=1) / divisor
+    d_media = (w * d).sum(axis=1) / divisor
+    dt = (t - t_media[:, None]) * w
+    varianza = (dt * dt).sum(axis=1)
+    covarianza = (dt * (d - d_media[:, None])).sum(axis=1)
+    pendiente = np.where(varianza > 0, covarianza / np.where(varianza > 0, varianza, 1.0), 0.0)
+    # Profundidad estimada en el instante de la última muestra
+    actual = np.maximum(d_media + pendiente * (t[-1] - t_media), 0.0)
+    return pendiente, actual, n
+
+
+def _ajustar_python(tiempos, matriz):
+    """
+    Mismo ajuste que _ajustar_numpy, gateway por gateway (None = sin muestra).
+    """
+    pendientes, actuales, ns = [], [], []
+    for fila in matriz:
+        puntos = [(t, d) for t, d in zip(tiempos, fila) if d is not None and not math.isnan(d)]
+        n = len(puntos)
+        if not n:
+            pendientes.append(0.0)
+            actuales.append(0.0)
+            ns.append(0)
+            continue
+        t_media = sum(t for t, _ in puntos) / n
+        d_media = sum(d for _, d in puntos) / n
+        varianza = sum((t - t_media) ** 2 for t, _ in puntos)
+        covarianza = sum((t - t_media) * (d - d_media) for t, d in puntos)
+        pendiente = covarianza / varianza if varianza > 0 else 0.0
+        pendientes.append(pendiente)
+        actuales.append(max(d_media + pendiente * (tiempos[-1] - t_media), 0.0))
+        ns.append(n)
+    return pendientes, actuales, ns
+
+
+def _tiempos_numpy(pendiente, actual, drenaje, umbral):
+    divisor = np.where(pendiente != 0, np.abs(pendiente), 1.0)
+    ttd_drenaje = np.where(drenaje > 0, actual / np.where(drenaje > 0, drenaje, 1.0), np.inf)
+    ttd = np.where(actual <= 0, 0.0,
+                   np.where(np.abs(pendiente) < PENDIENTE_PLANA, ttd_drenaje,
+                            np.where(pendiente < 0, actual / divisor, np.inf)))
+    ttt = np.where(actual >= umbral, 0.0, np.where(pendiente > 0, (umbral - actual) / divisor, np.inf))
+    return ttd, ttt
+
+
+def _tiempos_python(pendiente, actual, drenaje, umbral):
+    if actual <= 0:
+        ttd = 0.0
+    elif abs(pendiente) < PENDIENTE_PLANA:
+        ttd = actual / drenaje if drenaje > 0 else math.inf
+    elif pendiente < 0:
+        ttd = actual / -pendiente
+    else:
+        ttd = math.inf
+    if actual >= umbral:
+        ttt = 0.0
+    elif pendiente > 0:
+        ttt = (umbral - actual) / pendiente
+    else:
+        ttt = math.inf
+    return ttd, ttt
+
+
+def pronosticar(gateways, tiempos, matriz, drenaje, umbral, min_muestras=MIN_MUESTRAS):
+    """
+    Ajusta todas las gateways en un solo paso y devuelve una lista de dicts
+    {gateway, muestras, profundidad, pendiente, drenaje, ttd, ttt} (tiempos en segundos,
+    math.inf si no se alcanza). `matriz` tiene una fila por gateway y una
+    columna por instante de `tiempos` (NaN o None si falta la muestra);
+    `drenaje` es {gateway: mensajes enviados/s} (consultar_drenaje).
+    """
+    if not gateways or not tiempos:
+        return []
+    tasas = [drenaje.get(gateway, 0.0) for gateway in gateways]
+    if np is not None:
+        matriz = [[math.nan if d is None else d for d in fila] for fila in matriz]
+        pendiente, actual, n = _ajustar_numpy(tiempos, matriz)
+        ttd, ttt = _tiempos_numpy(pendiente, actual, np.asarray(tasas, dtype=float), umbral)
+        filas = zip(pendiente.tolist(), actual.tolist(), n.tolist(), ttd.tolist(), ttt.tolist())
+    else:
+        pendiente, actual, n = _ajustar_python(tiempos, matriz)
+        tiempos_gw = [_tiempos_python(p, a, r, umbral) for p, a, r in zip(pendiente, actual, tasas)]
+        filas = ((p, a, k, d, t) for (p, a, k), (d, t) in zip(zip(pendiente, actual, n), tiempos_gw))
+
+    resultados = []
+    for gateway, tasa, (p, a, k, d, t) in zip(gateways, tasas, filas):
+        if k < min_muestras:
+            continue
+        resultados.append({
+            'gateway': gateway,
+            'muestras': int(k),
+            'profundidad': a,
+            'pendiente': p,
+            'drenaje': tasa,
+            'ttd': d,
+            'ttt': t,
+        })
+    return resultados
+
+
+# -- Muestras ----------------------------------------------------------------------
+
+def muestras_desde_series(almacen, ventana, ahora=None):
+    """
+    Devuelve (gateways, tiempos, matriz) desde la métrica messages_in_queue
+    del almacén de series. El exporter guarda todas las gateways de una
+    ejecución con el mismo timestamp, por lo que las columnas quedan alineadas.
+    Como en Historial, las gateways sin mensajes en toda la ventana se omiten.
+    """
+    ahora = time.time() if ahora is None else ahora
+    por_gateway = {}
+    for etiquetas, _ in almacen.buscar('messages_in_queue'):
+        puntos = almacen.puntos('messages_in_queue', etiquetas, ventana, ahora)
+        if any(d for _, d in puntos):
+            por_gateway[int(etiquetas['gatewayid'])] = dict(puntos)
+    return _alinear(por_gateway)
+
+
+def _alinear(por_gateway):
+    tiempos = sorted({t for puntos in por_gateway.values() for t in puntos})
+    gateways = sorted(por_gateway)
+    matriz = [[por_gateway[g].get(t) for t in tiempos] for g in gateways]
+    return gateways, tiempos, matriz
+
+
+class Historial:
+    """
+    Historial propio de profundidades ({gatewayid: {ts: profundidad}}) en un
+    archivo JSON, acotado a la ventana para que no crezca con el tiempo.
+    """
+
+    def __init__(self, ruta, ventana):
+        self.ruta = ruta
+        self.ventana = ventana
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                datos = json.load(f)
+            self.por_gateway = {int(g): {float(t): d for t, d in puntos.items()} for g, puntos in datos.items()}
+        except (OSError, ValueError, AttributeError):
+            self.por_gateway = {}
+
+    def agregar(self, filas, ts):
+        vistos = set()
+        for gatewayid, total in filas:
+            self.por_gateway.setdefault(int(gatewayid), {})[ts] = total
+            vistos.add(int(gatewayid))
+        # Una gateway ya registrada que no aparece tiene la cola vacía
+        for gatewayid in self.por_gateway:
+            if gatewayid not in vistos:
+                self.por_gateway[gatewayid][ts] = 0
+        limite = ts - self.ventana
+        for gatewayid in list(self.por_gateway):
+            puntos = {t: d for t, d in self.por_gateway[gatewayid].items() if t >= limite}
+            if any(puntos.values()):
+                self.por_gateway[gatewayid] = puntos
+            else:
+                # Sin mensajes en toda la ventana: se deja de seguir
+                del self.por_gateway[gatewayid]
+
+    def guardar(self):
+        temporal = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({str(g): {repr(t): d for t, d in puntos.items()} for g, puntos in self.por_gateway.items()}, f)
+        os.replace(temporal, self.ruta)
+
+    def muestras(self):
+        return _alinear(self.por_gateway)
+
+
+def consultar_drenaje(messagelog_path, ventana):
+    """
+    Tasa de envío (mensajes/s) por GatewayId en la ventana. Devuelve ({gatewayid: tasa}, lock_wait).
+    """
+    desde = (datetime.datetime.now() - datetime.timedelta(seconds=ventana)).strftime('%Y-%m-%d %H:%M:%S')
+    filas, lock_wait = ejecutar_consulta(messagelog_path, drenaje_query, (desde,))
+    return {int(gw): total / float(ventana) for gw, total in filas}, lock_wait
+
+
+# -- Evaluación --------------------------------------------------------------------
+
+def _segundos(valor):
+    return "U" if math.isinf(valor) else f"{valor:.0f}s"
+
+
+def evaluar_pronostico(resultados, umbral, warning_s, critical_s, lock_wait=0.0):
+    """
+    Evalúa el tiempo hasta el umbral de cada gateway y devuelve (estado, salida).
+    """
+    if not resultados:
+        return STATE_UNKNOWN, f"UNKNOWN: No hay gateways con muestras suficientes para el pronóstico | {perfdata_lock_wait(lock_wait)}"
+
+    estado = STATE_OK
+    criticos, advertencias, perfdata = [], [], []
+    for r in resultados:
+        gw = r['gateway']
+        perfdata.append(f"'depth_{gw}'={r['profundidad']:.0f};;{umbral};0;")
+        perfdata.append(f"'rate_{gw}'={r['pendiente']:.3f}")
+        perfdata.append(f"'drain_{gw}'={r['drenaje']:.3f}")
+        perfdata.append(f"'ttd_{gw}'={_segundos(r['ttd'])}")
+        perfdata.append(f"'ttt_{gw}'={_segundos(r['ttt'])};{warning_s};{critical_s};0;")
+        if r['ttt'] < critical_s:
+            criticos.append(f"gw {gw} en {r['ttt']:.0f} s")
+            estado = STATE_CRITICAL
+        elif r['ttt'] < warning_s:
+            advertencias.append(f"gw {gw} en {r['ttt']:.0f} s")
+            estado = max(estado, STATE_WARNING)
+    perfdata.append(perfdata_lock_wait(lock_wait))
+
+    total = len(resultados)
+    performance_data = " ".join(perfdata)
+    motor = "numpy" if np is not None else "python"
+    if estado == STATE_CRITICAL:
+        detalle = ", ".join(criticos + advertencias)
+        return estado, (f"CRITICAL: {len(criticos)}/{total} gateways alcanzan {umbral} mensajes en cola "
+                        f"en menos de {critical_s} s ({detalle}) | {performance_data}")
+    elif estado == STATE_WARNING:
+        return estado, (f"WARNING: {len(advertencias)}/{total} gateways alcanzan {umbral} mensajes en cola "
+                        f"en menos de {warning_s} s ({', '.join(advertencias)}) | {performance_data}")
+    return estado, f"OK: Ninguna de {total} gateways alcanza {umbral} mensajes en cola en {warning_s} s ({motor}) | {performance_data}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pronóstico del tiempo hasta vaciar o saturar la cola por gateway.")
+    parser.add_argument("--ventana", type=int, default=VENTANA, help=f"Segundos de muestras (default: {VENTANA}).")
+    parser.add_argument("--umbral-cola", type=int, default=UMBRAL_COLA,
+                        help=f"Profundidad de cola considerada irrecuperable (default: {UMBRAL_COLA}).")
+    parser.add_argument("--warning", type=int, default=WARNING_S,
+                        help=f"Segundos hasta el umbral para WARNING (default: {WARNING_S}).")
+    parser.add_argument("--critical", type=int, default=CRITICAL_S,
+                        help=f"Segundos hasta el umbral para CRITICAL (default: {CRITICAL_S}).")
+    parser.add_argument("--min-muestras", type=int, default=MIN_MUESTRAS,
+                        help=f"Muestras mínimas por gateway (default: {MIN_MUESTRAS}).")
+    origen = parser.add_mutually_exclusive_group()
+    origen.add_argument("--series", help="Archivo de series del exporter (default: [series] ruta).")
+    origen.add_argument("--historial", help=f"Historial propio de profundidades (default: {historial_path}).")
+    args = parser.parse_args()
+
+    db_config = leer_configuracion(DB_CONFIG_PATH)
+    verificar_licencia_o_salir(LICENSE_CONFIG_PATH)
+
+    import SMS_GW_Status
+    try:
+        drenaje, lock_wait = consultar_drenaje(SMS_GW_Status.db_path, args.ventana)
+    except sqlite3.Error as e:
+        salir(STATE_UNKNOWN, f"UNKNOWN: Error al consultar MessageOut: {e}")
+
+    ruta_series = args.series or (None if args.historial else db_config.get('series', 'ruta', fallback=None))
+    if ruta_series:
+        from serie_temporal import AlmacenSeries
+        try:
+            almacen = AlmacenSeries(ruta=ruta_series, solo_lectura=True)
+        except (OSError, ValueError) as e:
+            salir(STATE_UNKNOWN, f"UNKNOWN: No se pudo abrir el archivo de series: {e}")
+        gateways, tiempos, matriz = muestras_desde_series(almacen, args.ventana)
+        almacen.cerrar()
+    else:
+        if 'BDSQLite' not in db_config or 'db_path' not in db_config['BDSQLite']:
+            salir(1, "Error: No se encontró la sección [BDSQLite] o la clave db_path en Setting.ini")
+        historial = Historial(args.historial or historial_path, args.ventana)
+        try:
+            filas, espera = ejecutar_consulta(db_config.get('BDSQLite', 'db_path'), profundidad_query)
+        except sqlite3.Error as e:
+            salir(STATE_UNKNOWN, f"UNKNOWN: Error al consultar SendQueue: {e}")
+        lock_wait += espera
+        historial.agregar(filas, time.time())
+        try:
+            historial.guardar()
+        except OSError as e:
+            salir(STATE_UNKNOWN, f"UNKNOWN: No se pudo guardar el historial: {e}")
+        gateways, tiempos, matriz = historial.muestras()
+
+    resultados = pronosticar(gateways, tiempos, matriz, drenaje, args.umbral_cola, args.min_muestras)
+    salir(*evaluar_pronostico(resultados, args.umbral_cola, args.warning, args.critical, lock_wait))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: registro_eventos.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Escritura del log de eventos de gateways (gateway_events.log) con buffer,
+    lock entre procesos y rotación.
+    - Los eventos se acumulan en memoria y se escriben en una sola llamada
+      (al llenarse el buffer, al superar `intervalo` segundos o al salir del
+      proceso), en lugar de abrir y cerrar el archivo por cada línea. Un
+      temporizador escribe el buffer al vencer `intervalo` aunque no lleguen
+      más eventos (procesos residentes como nagios_pasivo.py --bucle).
+    - Cada escritura se hace bajo un archivo de lock (mismo esquema que
+      diafaan_xml.py), seguro con muchos checks concurrentes.
+    - Rotación por tamaño (max_bytes) o antigüedad (max_dias) del archivo;
+      el archivo rotado se comprime con gzip y se conservan `backups` copias.
+    - Formato texto (`[fecha] mensaje`, compatible con el log actual) o
+      JSON lines (`{"ts": ..., "mensaje": ..., ...campos}`).
+
+Configuración (Setting.ini, sección opcional [eventos]):
+    formato = texto | json
+    max_bytes = 10485760
+    max_dias = 7
+    backups = 10
+    buffer = 100          → eventos acumulados antes de escribir
+    intervalo = 5         → segundos máximos que un evento espera en el buffer
+
+Dependencias:
+    - Python 3.x
+"""
+
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import atexit
+import shutil
+import datetime
+import threading
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_DIAS = 7
+DEFAULT_BACKUPS = 10
+DEFAULT_BUFFER = 100
+DEFAULT_INTERVALO = 5
+LOCK_WAIT = 10          # segundos máximos esperando el lock
+LOCK_STALE = 30         # segundos tras los cuales un lock se considera abandonado
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+
+class RegistroEventos:
+    """
+    Log de eventos con buffer, lock entre procesos y rotación comprimida.
+    """
+
+    def __init__(self, path, formato='texto', max_bytes=DEFAULT_MAX_BYTES, max_dias=DEFAULT_MAX_DIAS,
+                 backups=DEFAULT_BACKUPS, buffer=DEFAULT_BUFFER, intervalo=DEFAULT_INTERVALO):
+        if formato not in ('texto', 'json'):
+            raise ValueError(f"Formato de eventos desconocido: {formato}")
+        self.path = path
+        self.formato = formato
+        self.max_bytes = max_bytes
+        self.max_dias = max_dias
+        self.backups = backups
+        self.buffer = buffer
+        self.intervalo = intervalo
+        self._pendientes = []
+        self._primero = None
+        self._temporizador = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    # -- Formato ---------------------------------------------------------------
+
+    def _linea(self, momento, mensaje, campos):
+        fecha = momento.strftime(FORMATO_FECHA)
+        if self.formato == 'json':
+            return json.dumps({'ts': fecha, 'mensaje': mensaje, **campos}, ensure_ascii=False) + "\n"
+        return f"[{fecha}] {mensaje}\n"
+
+    @staticmethod
+    def _fecha_linea(linea):
+        """
+        Fecha de una línea en cualquiera de los dos formatos, o None.
+        """
+        try:
+            if linea.startswith('{'):
+                return datetime.datetime.strptime(json.loads(linea)['ts'], FORMATO_FECHA)
+            if linea.startswith('['):
+                return datetime.datetime.strptime(linea[1:20], FORMATO_FECHA)
+        except (ValueError, KeyError):
+            pass
+        return None
+
+    # -- API pública -----------------------------------------------------------
+
+    def evento(self, mensaje, **campos):
+        """
+        Agrega un evento al buffer; los campos extra solo se escriben en formato json.
+        """
+        with self._lock:
+            self._pendientes.append(self._linea(datetime.datetime.now(), mensaje, campos))
+            if self._primero is None:
+                self._primero = time.monotonic()
+                self._programar()
+            lleno = len(self._pendientes) >= self.buffer
+            vencido = time.monotonic() - self._primero >= self.intervalo
+        if lleno or vencido:
+            self.flush()
+
+    def flush(self):
+        """
+        Escribe los eventos acumulados en una sola operación bajo el lock.
+        """
+        with self._lock:
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+            if not self._pendientes:
+                return
+            datos = "".join(self._pendientes).encode('utf-8')
+            self._pendientes = []
+            self._primero = None
+
+            rotado = None
+            con_lock = self._adquirir_lock()
+            try:
+                if con_lock:
+                    rotado = self._rotar_si_corresponde(len(datos))
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, datos)
+                finally:
+                    os.close(fd)
+            finally:
+                if con_lock:
+                    self._liberar_lock()
+        # La compresión se hace fuera del lock: el archivo rotado ya es solo de este proceso
+        if rotado:
+            self._comprimir(rotado)
+
+    def cerrar(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+    # -- Escritura por tiempo ------------------------------------------------------
+
+    def _programar(self):
+        """
+        Programa la escritura del buffer en `intervalo` segundos. Debe
+        llamarse con el lock tomado, al entrar el primer evento del buffer.
+        """
+        if self.intervalo > 0 and self._temporizador is None:
+            self._temporizador = threading.Timer(self.intervalo, self._vencer)
+            self._temporizador.daemon = True
+            self._temporizador.start()
+
+    def _vencer(self):
+        with self._lock:
+            self._temporizador = None
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"Aviso: no se pudo escribir el log de eventos {self.path}: {e}", file=sys.stderr)
+
+    # -- Lock entre procesos -----------------------------------------------------
+
+    def _adquirir_lock(self):
+        """
+        Crea el archivo de lock. Devuelve False si se agotó la espera (se
+        escribe igual: O_APPEND mantiene las líneas enteras en el caso normal).
+        """
+        lock_path = self.path + '.lock'
+        limite = time.monotonic() + LOCK_WAIT
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > LOCK_STALE:
+                        os.remove(lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() >= limite:
+                    return False
+                time.sleep(0.01)
+
+    def _liberar_lock(self):
+        try:
+            os.remove(self.path + '.lock')
+        except OSError:
+            pass
+
+    # -- Rotación --------------------------------------------------------------
+
+    def _rotar_si_corresponde(self, nuevos_bytes):
+        """
+        Renombra el log actual si supera el tamaño o la antigüedad máximos.
+        Debe llamarse con el lock tomado. Devuelve la ruta rotada o None.
+        """
+        try:
+            tamaño = os.path.getsize(self.path)
+        except OSError:
+            return None
+        if tamaño == 0:
+            return None
+
+        rotar = self.max_bytes and tamaño + nuevos_bytes > self.max_bytes
+        if not rotar and self.max_dias:
+            with open(self.path, 'r', encoding='utf-8', errors='replace') as f:
+                inicio = self._fecha_linea(f.readline())
+            rotar = inicio is not None and datetime.datetime.now() - inicio > datetime.timedelta(days=self.max_dias)
+        if not rotar:
+            return None
+
+        rotado = f"{self.path}.{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        os.replace(self.path, rotado)
+        return rotado
+
+    def _comprimir(self, rotado):
+        with open(rotado, 'rb') as origen, gzip.open(rotado + '.gz', 'wb') as destino:
+            shutil.copyfileobj(origen, destino)
+        os.remove(rotado)
+        if self.backups:
+            for viejo in sorted(glob.glob(glob.escape(self.path) + '.*.gz'))[:-self.backups]:
+                try:
+                    os.remove(viejo)
+                except OSError:
+                    pass
+
+
+def registro_desde_config(config, path):
+    """
+    Crea el registro con los parámetros opcionales de la sección [eventos].
+    """
+    return RegistroEventos(
+        path,
+        formato=config.get('eventos', 'formato', fallback='texto'),
+        max_bytes=config.getint('eventos', 'max_bytes', fallback=DEFAULT_MAX_BYTES),
+        max_dias=config.getfloat('eventos', 'max_dias', fallback=DEFAULT_MAX_DIAS),
+        backups=config.getint('eventos', 'backups', fallback=DEFAULT_BACKUPS),
+        buffer=config.getint('eventos', 'buffer', fallback=DEFAULT_BUFFER),
+        intervalo=config.getfloat('eventos', 'intervalo', fallback=DEFAULT_INTERVALO),
+    )
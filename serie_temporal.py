@@ -0,0 +1,496 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: serie_temporal.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Almacén compacto de series temporales para las métricas que recolecta
+    prometheus_exporter.py (TPS, colas, prioridades y errores).
+    Cada serie (métrica + etiquetas) es un anillo de capacidad fija con dos
+    columnas de ancho fijo (timestamp y valor, float64) dentro de un único
+    buffer: un bytearray en memoria o, si se indica un archivo, un mmap que
+    persiste entre reinicios y que otros procesos pueden abrir en solo lectura.
+    La memoria queda acotada por capacidad × max_series, sin importar el
+    tiempo que lleve corriendo el proceso.
+    Las consultas por ventana (min, max, media, último valor y tasa de
+    cambio por segundo) ubican el inicio de la ventana con búsqueda binaria
+    sobre el anillo y recorren solo las muestras de la ventana (a lo sumo
+    `capacidad`), sin tocar las bases de Diafaan.
+
+    Formato del archivo:
+        cabecera (64 bytes)  → magic, capacidad, max_series, largo de nombre y,
+                                en el byte 24, la secuencia de escritura (int64)
+        directorio           → por serie: nombre (120 bytes) + head + count (int64)
+        datos                → por serie: capacidad timestamps + capacidad valores (float64)
+
+    Un solo proceso escribe (el exporter). La secuencia de escritura es
+    impar mientras se escribe una muestra; los lectores de otros procesos
+    (solo_lectura) repiten la lectura si la secuencia era impar o cambió
+    entre medio, porque con el anillo lleno la muestra más antigua se
+    sobrescribe en su lugar y la búsqueda binaria vería timestamps
+    desordenados.
+
+Uso (check de tendencia para Nagios, lee el archivo sin tocar las bases):
+    python serie_temporal.py --listar [--archivo series.dat]
+    python serie_temporal.py --metrica messages_in_queue --etiqueta gatewayid=2
+                             [--ventana 600] [--warning-tasa 1] [--critical-tasa 5]
+
+Ejemplo:
+    # ¿La cola del gateway 2 lleva 10 minutos creciendo más de 1 mensaje/s?
+    python serie_temporal.py --metrica messages_in_queue --etiqueta gatewayid=2 --ventana 600 --warning-tasa 1
+
+Dependencias:
+    - Python 3.x
+
+Archivos requeridos:
+    - Setting.ini   → sección opcional [series] (ruta, capacidad, max_series, colectores)
+"""
+
+import os
+import sys
+import mmap
+import time
+import struct
+import argparse
+import threading
+
+MAGIC = b'DIAFTS01'
+CABECERA = struct.Struct('<8sIII')
+TAM_CABECERA = 64
+SECUENCIA = 24              # offset de la secuencia de escritura dentro de la cabecera
+REINTENTOS_LECTURA = 1000   # lecturas que un lector repite mientras el escritor escribe
+LARGO_NOMBRE = 120
+# Entrada del directorio: nombre + head + count, en unidades de int64
+ENTRADA_Q = (LARGO_NOMBRE + 16) // 8
+TAM_ENTRADA = ENTRADA_Q * 8
+
+# 24 h de historia con un colector cada 30 s
+DEFAULT_CAPACIDAD = 2880
+DEFAULT_MAX_SERIES = 256
+DEFAULT_VENTANA = 600
+
+# Colectores del exporter que alimentan el almacén por defecto
+COLECTORES_SERIES = ('tps', 'queue', 'priority', 'errors')
+
+
+def _escapar(texto):
+    return str(texto).replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace('}', '\\}')
+
+
+def clave(metrica, etiquetas=None):
+    """
+    Nombre de la serie: metrica{k=v,...} con las etiquetas ordenadas.
+    En nombres y valores de etiqueta, "\\", ",", "=" y "}" se escapan con "\\".
+    """
+    if not etiquetas:
+        return metrica
+    texto = ",".join(f"{_escapar(k)}={_escapar(v)}" for k, v in sorted(etiquetas.items()))
+    return f"{metrica}{{{texto}}}"
+
+
+def separar_clave(nombre):
+    """
+    Inversa de clave(): devuelve (metrica, {etiqueta: valor}).
+    """
+    if '{' not in nombre:
+        return nombre, {}
+    metrica, resto = nombre.split('{', 1)
+    if resto.endswith('}'):
+        resto = resto[:-1]
+    etiquetas = {}
+    etiqueta, actual, escapado = None, [], False
+    for c in resto:
+        if escapado:
+            actual.append(c)
+            escapado = False
+        elif c == '\\':
+            escapado = True
+        elif c == '=' and etiqueta is None:
+            etiqueta, actual = ''.join(actual), []
+        elif c == ',':
+            etiquetas[etiqueta] = ''.join(actual)
+            etiqueta, actual = None, []
+        else:
+            actual.append(c)
+    if etiqueta is not None:
+        etiquetas[etiqueta] = ''.join(actual)
+    return metrica, etiquetas
+
+
+class AlmacenSeries:
+    """
+    Series en anillo de capacidad fija sobre un buffer único (bytearray o mmap).
+    Si `ruta` existe se abre con la capacidad y el número de series con que
+    fue creado; si no, se crea con `capacidad` y `max_series`.
+    """
+
+    def __init__(self, capacidad=DEFAULT_CAPACIDAD, max_series=DEFAULT_MAX_SERIES, ruta=None, solo_lectura=False):
+        self.ruta = ruta
+        self.solo_lectura = solo_lectura
+        self.descartadas = 0
+        self._lock = threading.Lock()
+        self._archivo = None
+        self._mmap = None
+
+        if ruta and os.path.exists(ruta):
+            self._archivo = open(ruta, 'rb' if solo_lectura else 'r+b')
+            acceso = mmap.ACCESS_READ if solo_lectura else mmap.ACCESS_WRITE
+            self._mmap = mmap.mmap(self._archivo.fileno(), 0, access=acceso)
+            magic, capacidad, max_series, largo = CABECERA.unpack_from(self._mmap, 0)
+            if magic != MAGIC or largo != LARGO_NOMBRE:
+                self.cerrar()
+                raise ValueError(f"{ruta} no es un archivo de series válido")
+            buffer = self._mmap
+        else:
+            if solo_lectura:
+                raise FileNotFoundError(ruta)
+            tamano = TAM_CABECERA + max_series * (TAM_ENTRADA + capacidad * 16)
+            if ruta:
+                self._archivo = open(ruta, 'w+b')
+                self._archivo.truncate(tamano)
+                self._mmap = mmap.mmap(self._archivo.fileno(), 0)
+                buffer = self._mmap
+            else:
+                buffer = bytearray(tamano)
+            CABECERA.pack_into(buffer, 0, MAGIC, capacidad, max_series, LARGO_NOMBRE)
+
+        self.capacidad = capacidad
+        self.max_series = max_series
+        inicio_datos = TAM_CABECERA + max_series * TAM_ENTRADA
+        self._vista = memoryview(buffer)
+        self._secuencia = self._vista[SECUENCIA:SECUENCIA + 8].cast('q')
+        self._directorio = self._vista[TAM_CABECERA:inicio_datos].cast('q')
+        self._datos = self._vista[inicio_datos:].cast('d')
+        self._indice = {}
+        self._leer_indice()
+
+    # -- Directorio de series ----------------------------------------------------
+
+    def _nombre(self, i):
+        inicio = TAM_CABECERA + i * TAM_ENTRADA
+        return bytes(self._vista[inicio:inicio + LARGO_NOMBRE]).rstrip(b'\0').decode('utf-8')
+
+    def _leer_indice(self):
+        self._indice = {}
+        for i in range(self.max_series):
+            nombre = self._nombre(i)
+            if not nombre:
+                break
+            self._indice[nombre] = i
+
+    def _slot(self, nombre, crear):
+        i = self._indice.get(nombre)
+        if i is not None or not crear:
+            return i
+        if len(self._indice) >= self.max_series:
+            return None
+        codificado = nombre.encode('utf-8')
+        if len(codificado) > LARGO_NOMBRE:
+            raise ValueError(f"nombre de serie demasiado largo ({len(codificado)} > {LARGO_NOMBRE} bytes): {nombre}")
+        i = len(self._indice)
+        inicio = TAM_CABECERA + i * TAM_ENTRADA
+        self._secuencia[0] += 1
+        self._vista[inicio:inicio + len(codificado)] = codificado
+        self._secuencia[0] += 1
+        self._indice[nombre] = i
+        return i
+
+    def series(self):
+        """
+        Devuelve los nombres de las series almacenadas.
+        """
+        with self._lock:
+            if self.solo_lectura:
+                self._leer(self._leer_indice)
+            return list(self._indice)
+
+    # -- Escritura -----------------------------------------------------------------
+
+    def agregar(self, metrica, etiquetas, valor, ts=None):
+        """
+        Agrega una muestra. Devuelve False si ya no caben más series.
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            nombre = clave(metrica, etiquetas)
+            i = self._slot(nombre, crear=True)
+            if i is None:
+                self._descartar(nombre, f"se alcanzó max_series={self.max_series}")
+                return False
+            self._escribir(i, ts, float(valor))
+            return True
+
+    def agregar_muestras(self, muestras, ts=None):
+        """
+        Agrega las muestras (métrica, etiquetas, valor) de un colector con un
+        mismo timestamp. Las que no caben (sin series libres o nombre
+        demasiado largo) se cuentan en `descartadas`.
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            for metrica, etiquetas, valor in muestras:
+                nombre = clave(metrica, etiquetas)
+                try:
+                    i = self._slot(nombre, crear=True)
+                    motivo = f"se alcanzó max_series={self.max_series}"
+                except ValueError as e:
+                    i, motivo = None, str(e)
+                if i is None:
+                    self._descartar(nombre, motivo)
+                    continue
+                self._escribir(i, ts, float(valor))
+
+    def _descartar(self, nombre, motivo):
+        """
+        Cuenta una muestra descartada; la primera se avisa en stderr (las
+        siguientes solo se cuentan, el exporter publica el total).
+        Debe llamarse con el lock tomado.
+        """
+        self.descartadas += 1
+        if self.descartadas == 1:
+            print(f"Aviso: almacén de series: se descarta la serie {nombre} ({motivo}); "
+                  f"las muestras descartadas se cuentan en diafaan_series_discarded_samples_total",
+                  file=sys.stderr)
+
+    def _escribir(self, i, ts, valor):
+        base = i * 2 * self.capacidad
+        meta = i * ENTRADA_Q + LARGO_NOMBRE // 8
+        head = self._directorio[meta]
+        # Secuencia impar durante la escritura: con el anillo lleno se sobrescribe
+        # la muestra más antigua y un lector de otro proceso debe reintentar
+        self._secuencia[0] += 1
+        self._datos[base + head] = ts
+        self._datos[base + self.capacidad + head] = valor
+        self._directorio[meta] = (head + 1) % self.capacidad
+        self._directorio[meta + 1] = min(self._directorio[meta + 1] + 1, self.capacidad)
+        self._secuencia[0] += 1
+
+    def _leer(self, lectura):
+        """
+        Ejecuta lectura() con el lock tomado. En solo_lectura (el escritor es
+        otro proceso) la repite mientras la secuencia sea impar o cambie
+        durante la lectura; tras REINTENTOS_LECTURA devuelve la última.
+        """
+        if not self.solo_lectura:
+            return lectura()
+        for _ in range(REINTENTOS_LECTURA):
+            antes = self._secuencia[0]
+            if antes % 2 == 0:
+                resultado = lectura()
+                if self._secuencia[0] == antes:
+                    return resultado
+            time.sleep(0)
+        return lectura()
+
+    # -- Consultas -----------------------------------------------------------------
+
+    def _rango(self, nombre, ventana, ahora):
+        """
+        Devuelve (base, inicio_anillo, desde, count) de las muestras dentro de
+        la ventana, o None si la serie no existe.
+        """
+        i = self._indice.get(nombre)
+        if i is None and self.solo_lectura:
+            self._leer_indice()
+            i = self._indice.get(nombre)
+        if i is None:
+            return None
+        cap = self.capacidad
+        base = i * 2 * cap
+        meta = i * ENTRADA_Q + LARGO_NOMBRE // 8
+        head, count = self._directorio[meta], self._directorio[meta + 1]
+        inicio = (head - count) % cap
+        limite = ahora - ventana
+        datos = self._datos
+        # Búsqueda binaria de la primera muestra dentro de la ventana (timestamps crecientes)
+        bajo, alto = 0, count
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if datos[base + (inicio + medio) % cap] < limite:
+                bajo = medio + 1
+            else:
+                alto = medio
+        return base, inicio, bajo, count
+
+    def puntos(self, metrica, etiquetas=None, ventana=DEFAULT_VENTANA, ahora=None):
+        """
+        Devuelve la lista [(ts, valor), ...] de la ventana, en orden cronológico.
+        """
+        ahora = time.time() if ahora is None else ahora
+        nombre = clave(metrica, etiquetas)
+
+        def lectura():
+            rango = self._rango(nombre, ventana, ahora)
+            if rango is None:
+                return []
+            base, inicio, desde, count = rango
+            cap, datos = self.capacidad, self._datos
+            return [(datos[base + (inicio + k) % cap], datos[base + cap + (inicio + k) % cap])
+                    for k in range(desde, count)]
+
+        with self._lock:
+            return self._leer(lectura)
+
+    def resumen(self, metrica, etiquetas=None, ventana=DEFAULT_VENTANA, ahora=None):
+        """
+        Devuelve {n, min, max, media, ultimo, tasa, desde, hasta} de la ventana,
+        o None si no hay muestras. `tasa` es el cambio por segundo entre la
+        primera y la última muestra de la ventana. El costo es lineal en las
+        muestras de la ventana (min, max y media las recorren todas).
+        """
+        ahora = time.time() if ahora is None else ahora
+        nombre = clave(metrica, etiquetas)
+        with self._lock:
+            return self._leer(lambda: self._resumen(nombre, ventana, ahora))
+
+    def _resumen(self, nombre, ventana, ahora):
+        rango = self._rango(nombre, ventana, ahora)
+        if rango is None or rango[2] >= rango[3]:
+            return None
+        base, inicio, desde, count = rango
+        cap, datos = self.capacidad, self._datos
+        primero = (inicio + desde) % cap
+        ultimo = (inicio + count - 1) % cap
+        minimo = maximo = datos[base + cap + primero]
+        suma = 0.0
+        for k in range(desde, count):
+            valor = datos[base + cap + (inicio + k) % cap]
+            suma += valor
+            if valor < minimo:
+                minimo = valor
+            elif valor > maximo:
+                maximo = valor
+        t0, t1 = datos[base + primero], datos[base + ultimo]
+        v0, v1 = datos[base + cap + primero], datos[base + cap + ultimo]
+        n = count - desde
+        return {
+            'n': n,
+            'min': minimo,
+            'max': maximo,
+            'media': suma / n,
+            'ultimo': v1,
+            'tasa': (v1 - v0) / (t1 - t0) if t1 > t0 else 0.0,
+            'desde': t0,
+            'hasta': t1,
+        }
+
+    def buscar(self, metrica, etiquetas=None):
+        """
+        Devuelve [(etiquetas, nombre)] de las series de `metrica` que contienen
+        todas las `etiquetas` indicadas.
+        """
+        etiquetas = {k: str(v) for k, v in (etiquetas or {}).items()}
+        encontradas = []
+        for nombre in self.series():
+            m, e = separar_clave(nombre)
+            if m == metrica and all(e.get(k) == v for k, v in etiquetas.items()):
+                encontradas.append((e, nombre))
+        return encontradas
+
+    # -- Persistencia ----------------------------------------------------------------
+
+    def flush(self):
+        if self._mmap is not None and not self.solo_lectura:
+            self._mmap.flush()
+
+    def cerrar(self):
+        for vista in ('_directorio', '_datos', '_secuencia', '_vista'):
+            if getattr(self, vista, None) is not None:
+                getattr(self, vista).release()
+                setattr(self, vista, None)
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+
+def almacen_desde_config(config):
+    """
+    Crea el almacén desde la sección opcional [series] de Setting.ini.
+    Sin `ruta` el almacén vive solo en memoria.
+    """
+    ruta = config.get('series', 'ruta', fallback='') or None
+    capacidad = config.getint('series', 'capacidad', fallback=DEFAULT_CAPACIDAD)
+    max_series = config.getint('series', 'max_series', fallback=DEFAULT_MAX_SERIES)
+    return AlmacenSeries(capacidad, max_series, ruta)
+
+
+def colectores_con_series(config):
+    """
+    Nombres de los colectores cuyas muestras se guardan en el almacén.
+    """
+    nombres = config.get('series', 'colectores', fallback=','.join(COLECTORES_SERIES))
+    return {n.strip() for n in nombres.split(',') if n.strip()}
+
+
+def evaluar_tendencia(nombre, resumen, ventana, warning_tasa=None, critical_tasa=None):
+    """
+    Evalúa la tasa de cambio de la ventana y devuelve (estado, salida) para Nagios.
+    """
+    if resumen is None:
+        return 3, f"UNKNOWN: Sin muestras de {nombre} en los últimos {ventana:g} s"
+    tasa = resumen['tasa']
+    warning = "" if warning_tasa is None else f"{warning_tasa:g}"
+    critical = "" if critical_tasa is None else f"{critical_tasa:g}"
+    texto = (f"{nombre} últimos {ventana:g} s: min={resumen['min']:g} max={resumen['max']:g} "
+             f"media={resumen['media']:.2f} último={resumen['ultimo']:g} tasa={tasa:+.3f}/s (n={resumen['n']})")
+    performance_data = (f"min={resumen['min']:g} max={resumen['max']:g} media={resumen['media']:.2f} "
+                        f"ultimo={resumen['ultimo']:g} tasa={tasa:.4f};{warning};{critical};; muestras={resumen['n']}")
+    if critical_tasa is not None and tasa > critical_tasa:
+        return 2, f"CRITICAL: {texto} | {performance_data}"
+    if warning_tasa is not None and tasa > warning_tasa:
+        return 1, f"WARNING: {texto} | {performance_data}"
+    return 0, f"OK: {texto} | {performance_data}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta de tendencias sobre el almacén de series del exporter.")
+    parser.add_argument("--archivo", help="Archivo de series (default: [series] ruta de Setting.ini).")
+    parser.add_argument("--listar", action='store_true', help="Listar las series almacenadas.")
+    parser.add_argument("--metrica", help="Métrica a evaluar (p. ej. messages_in_queue).")
+    parser.add_argument("--etiqueta", action='append', default=[], metavar='NOMBRE=VALOR',
+                        help="Etiqueta de la serie (repetible).")
+    parser.add_argument("--ventana", type=float, default=DEFAULT_VENTANA,
+                        help=f"Segundos hacia atrás (default: {DEFAULT_VENTANA}).")
+    parser.add_argument("--warning-tasa", type=float, help="Tasa de cambio por segundo para WARNING.")
+    parser.add_argument("--critical-tasa", type=float, help="Tasa de cambio por segundo para CRITICAL.")
+    args = parser.parse_args()
+
+    ruta = args.archivo
+    if ruta is None:
+        from monitor_comun import DB_CONFIG_PATH, leer_configuracion
+        ruta = leer_configuracion(DB_CONFIG_PATH).get('series', 'ruta', fallback=None)
+    if not ruta:
+        print("UNKNOWN: Indicar --archivo o la clave ruta de la sección [series] en Setting.ini")
+        sys.exit(3)
+
+    try:
+        almacen = AlmacenSeries(ruta=ruta, solo_lectura=True)
+    except (OSError, ValueError) as e:
+        print(f"UNKNOWN: No se pudo abrir el archivo de series: {e}")
+        sys.exit(3)
+
+    if args.listar:
+        for nombre in almacen.series():
+            print(nombre)
+        sys.exit(0)
+    if not args.metrica:
+        parser.error("indicar --metrica o --listar")
+
+    try:
+        etiquetas = dict(e.split('=', 1) for e in args.etiqueta)
+    except ValueError:
+        parser.error("--etiqueta debe tener el formato NOMBRE=VALOR")
+    nombre = clave(args.metrica, etiquetas)
+    resumen = almacen.resumen(args.metrica, etiquetas, args.ventana)
+    estado, salida = evaluar_tendencia(nombre, resumen, args.ventana, args.warning_tasa, args.critical_tasa)
+    almacen.cerrar()
+    print(salida)
+    sys.exit(estado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+"""
+Script: sonda_smpp.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Sonda de latencia SMPP a nivel de aplicación. latencia_GW.py solo mide
+    el connect() TCP, por lo que un SMSC que acepta conexiones pero responde
+    lento al protocolo aparece como sano. Esta sonda mantiene una sesión
+    SMPP enlazada (bind) por SMSC y mide de forma continua el round-trip de
+    enquire_link → enquire_link_resp, sin reconectar ni volver a hacer bind
+    en cada check.
+    - Todas las sesiones corren en un solo loop asyncio en un hilo de fondo,
+      por lo que decenas de SMSC se sondean a la vez sin un hilo por sesión.
+    - Cada sesión guarda las últimas muestras (ms, o None si la respuesta
+      no llegó dentro del timeout) en un buffer circular; el check calcula
+      percentiles y pérdida por ventana sin tocar la red.
+    - Tras `max_perdidas` respuestas perdidas seguidas, o si el SMSC cierra
+      la conexión, la sesión se reconecta con backoff exponencial.
+    - Responde los enquire_link y deliver_sm que envíe el SMSC, y cierra
+      con unbind al detenerse.
+
+    La sonda está pensada para ejecutarse dentro de monitor_daemon.py (check
+    SMPP_enquire_link); ejecutada sola hace un bind, envía --muestras
+    enquire_link por SMSC, reporta y cierra (para pruebas o inspección).
+
+Uso:
+    python sonda_smpp.py [--smsc NOMBRE] [--muestras 5] [--intervalo 1]
+    python sonda_smpp.py --objetivo NOMBRE=HOST:PUERTO --system-id ID --password PWD
+
+Ejemplo:
+    python benchmarks/smsc_falso.py --puerto 2775 --latencia-ms 20
+    python sonda_smpp.py --objetivo local=127.0.0.1:2775 --system-id test --password test
+    python monitor_client.py SMPP_enquire_link --ventana 300 --warning 500
+
+Configuración (Setting.ini):
+    [smpp]                  → valores por defecto de todas las sesiones
+    intervalo = 10          → segundos entre enquire_link
+    timeout = 5             → segundos de espera de cada respuesta
+    capacidad = 360         → muestras guardadas por sesión
+    max_perdidas = 3        → respuestas perdidas seguidas antes de reconectar
+    [smpp:smsc01]           → una sección por SMSC
+    host, port, system_id, password, system_type, modo (transmitter | receiver | transceiver)
+
+Dependencias:
+    - Python 3.x
+    (solo librerías estándar: asyncio, struct, threading)
+
+Archivos requeridos:
+    - Setting.ini   → secciones [smpp:<nombre>] (solo en modo daemon o sin --objetivo)
+"""
+
+import sys
+import time
+import struct
+import asyncio
+import argparse
+import threading
+import collections
+
+from latencia_GW import percentil
+from monitor_comun import STATE_OK, STATE_WARNING, STATE_CRITICAL, STATE_UNKNOWN
+
+INTERVALO = 10.0            # segundos entre enquire_link
+TIMEOUT = 5.0               # segundos de espera de una respuesta
+CAPACIDAD = 360             # muestras por sesión (1 hora con intervalo 10)
+MAX_PERDIDAS = 3            # respuestas perdidas seguidas antes de reconectar
+BACKOFF_MAX = 60.0          # segundos máximos entre reintentos de conexión
+VENTANA = 300               # segundos evaluados por el check
+WARNING_MS = 500            # p95 sobre el cual se reporta WARNING
+CRITICAL_MS = 2000          # p95 sobre el cual se reporta CRITICAL
+CRITICAL_LOSS = 50.0        # pérdida (%) a partir de la cual se reporta CRITICAL
+
+# -- Protocolo SMPP 3.4 ----------------------------------------------------------
+
+GENERIC_NACK = 0x80000000
+BIND_RECEIVER = 0x00000001
+BIND_TRANSMITTER = 0x00000002
+BIND_TRANSCEIVER = 0x00000009
+DELIVER_SM = 0x00000005
+UNBIND = 0x00000006
+ENQUIRE_LINK = 0x00000015
+RESP = 0x80000000           # bit que distingue una respuesta de su petición
+
+MODOS = {
+    'receiver': BIND_RECEIVER,
+    'transmitter': BIND_TRANSMITTER,
+    'transceiver': BIND_TRANSCEIVER,
+}
+
+CABECERA = struct.Struct('>IIII')   # command_length, command_id, command_status, sequence_number
+MAX_PDU = 64 * 1024
+
+
+class ErrorSMPP(Exception):
+    pass
+
+
+def pdu(command_id, secuencia, cuerpo=b'', status=0):
+    """
+    Arma un PDU SMPP completo (cabecera + cuerpo).
+    """
+    return CABECERA.pack(CABECERA.size + len(cuerpo), command_id, status, secuencia) + cuerpo
+
+
+def _cstring(texto, maximo, campo):
+    """
+    C-Octet String de SMPP. Lanza ValueError si `texto` no es ASCII o no
+    cabe en `maximo` octetos (incluido el NUL final).
+    """
+    try:
+        dato = texto.encode('ascii')
+    except UnicodeEncodeError:
+        raise ValueError(f"{campo} debe contener solo caracteres ASCII") from None
+    if len(dato) > maximo - 1:
+        raise ValueError(f"{campo} admite hasta {maximo - 1} caracteres")
+    return dato + b'\x00'
+
+
+def cuerpo_bind(system_id, password, system_type=''):
+    """
+    Cuerpo de bind_*: system_id, password, system_type, interface_version 3.4,
+    addr_ton, addr_npi y address_range vacío.
+    Lanza ValueError si alguna credencial no es válida.
+    """
+    return (_cstring(system_id, 16, 'system_id') + _cstring(password, 9, 'password')
+            + _cstring(system_type, 13, 'system_type') + bytes((0x34, 0, 0)) + b'\x00')
+
+
+async def leer_pdu(reader):
+    """
+    Lee un PDU del stream y devuelve (command_id, status, secuencia, cuerpo).
+    """
+    cabecera = await reader.readexactly(CABECERA.size)
+    largo, command_id, status, secuencia = CABECERA.unpack(cabecera)
+    if largo < CABECERA.size or largo > MAX_PDU:
+        raise ErrorSMPP(f"command_length inválido: {largo}")
+    cuerpo = await reader.readexactly(largo - CABECERA.size) if largo > CABECERA.size else b''
+    return command_id, status, secuencia, cuerpo
+
+
+# -- Sesión persistente ----------------------------------------------------------
+
+class SesionSMPP:
+    """
+    Sesión SMPP enlazada contra un SMSC que envía enquire_link cada
+    `intervalo` segundos y guarda las muestras de round-trip.
+    Lanza ValueError si el modo o las credenciales no son válidos.
+    """
+
+    def __init__(self, nombre, host, port, system_id, password, system_type='', modo='transmitter',
+                 intervalo=INTERVALO, timeout=TIMEOUT, capacidad=CAPACIDAD, max_perdidas=MAX_PERDIDAS):
+        if modo not in MODOS:
+            raise ValueError(f"modo SMPP desconocido '{modo}'")
+        self.nombre = nombre
+        self.host = host
+        self.port = port
+        self.system_id = system_id
+        self.password = password
+        self.system_type = system_type
+        self.modo = modo
+        # Se codifica aquí: una credencial inválida es un error de configuración, no de la sesión
+        self._cuerpo_bind = cuerpo_bind(system_id, password, system_type)
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self.max_perdidas = max_perdidas
+        self.muestras = collections.deque(maxlen=capacidad)   # (epoch, ms | None)
+        self.enlazada = False
+        self.binds = 0
+        self.reconexiones = 0
+        self.tardias = 0
+        self.bind_ms = None
+        self.error = None
+        self._secuencia = 0
+        self._pendientes = {}
+        self._writer = None
+        self._cerrar = None
+
+    def _siguiente(self):
+        self._secuencia = self._secuencia % 0x7FFFFFFF + 1
+        return self._secuencia
+
+    async def _conectar(self):
+        reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        secuencia = self._siguiente()
+        inicio = time.perf_counter()
+        self._writer.write(pdu(MODOS[self.modo], secuencia, self._cuerpo_bind))
+        command_id, status, _, _ = await asyncio.wait_for(leer_pdu(reader), self.timeout)
+        if command_id != MODOS[self.modo] | RESP:
+            raise ErrorSMPP(f"respuesta inesperada al bind: 0x{command_id:08x}")
+        if status != 0:
+            raise ErrorSMPP(f"bind rechazado (command_status 0x{status:08x})")
+        self.bind_ms = (time.perf_counter() - inicio) * 1000
+        self.binds += 1
+        self.enlazada = True
+        self.error = None
+        return reader
+
+    async def _leer(self, reader):
+        """
+        Atiende los PDU entrantes: resuelve las respuestas pendientes por
+        número de secuencia y contesta las peticiones del SMSC.
+        """
+        while True:
+            command_id, status, secuencia, _ = await leer_pdu(reader)
+            recibido = time.perf_counter()
+            if command_id in (ENQUIRE_LINK | RESP, GENERIC_NACK):
+                futuro = self._pendientes.pop(secuencia, None)
+                if futuro is None:
+                    self.tardias += 1
+                elif not futuro.done():
+                    futuro.set_result((recibido, status))
+            elif command_id == ENQUIRE_LINK:
+                self._writer.write(pdu(ENQUIRE_LINK | RESP, secuencia))
+            elif command_id == DELIVER_SM:
+                self._writer.write(pdu(DELIVER_SM | RESP, secuencia, b'\x00'))
+            elif command_id == UNBIND:
+                self._writer.write(pdu(UNBIND | RESP, secuencia))
+                raise ErrorSMPP("el SMSC cerró la sesión (unbind)")
+            elif not command_id & RESP:
+                self._writer.write(pdu(GENERIC_NACK, secuencia, status=0x00000003))
+
+    async def _enquire_link(self, lectura):
+        secuencia = self._siguiente()
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes[secuencia] = futuro
+        inicio = time.perf_counter()
+        self._writer.write(pdu(ENQUIRE_LINK, secuencia))
+        await self._writer.drain()
+        hechos, _ = await asyncio.wait({futuro, lectura}, timeout=self.timeout,
+                                       return_when=asyncio.FIRST_COMPLETED)
+        if lectura in hechos:
+            # La lectura terminó: conexión cerrada o PDU inválido
+            lectura.result()
+            raise ErrorSMPP("la conexión terminó")
+        if futuro not in hechos:
+            self._pendientes.pop(secuencia, None)
+            return None
+        recibido, status = futuro.result()
+        if status != 0:
+            raise ErrorSMPP(f"enquire_link rechazado (command_status 0x{status:08x})")
+        return (recibido - inicio) * 1000
+
+    async def _sondear(self, reader, muestras=None):
+        lectura = asyncio.ensure_future(self._leer(reader))
+        perdidas = 0
+        try:
+            while not self._cerrar.is_set():
+                inicio = time.monotonic()
+                latencia = await self._enquire_link(lectura)
+                self.muestras.append((time.time(), latencia))
+                perdidas = perdidas + 1 if latencia is None else 0
+                if perdidas >= self.max_perdidas:
+                    raise ErrorSMPP(f"{perdidas} enquire_link sin respuesta seguidos")
+                if muestras is not None:
+                    muestras -= 1
+                    if muestras <= 0:
+                        return
+                try:
+                    await asyncio.wait_for(self._cerrar.wait(),
+                                           max(0.0, self.intervalo - (time.monotonic() - inicio)))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            lectura.cancel()
+
+    async def _desconectar(self, unbind):
+        self.enlazada = False
+        writer, self._writer = self._writer, None
+        for futuro in self._pendientes.values():
+            futuro.cancel()
+        self._pendientes.clear()
+        if writer is None:
+            return
+        try:
+            if unbind:
+                writer.write(pdu(UNBIND, self._siguiente()))
+                await asyncio.wait_for(writer.drain(), 1.0)
+            writer.close()
+            await asyncio.wait_for(writer.wait_closed(), 1.0)
+        except Exception:
+            pass
+
+    async def ejecutar(self, muestras=None):
+        """
+        Mantiene la sesión hasta cerrar(). Con `muestras` termina después de
+        ese número de enquire_link (modo de una sola ejecución, sin reconexión).
+        """
+        self._cerrar = asyncio.Event()
+        espera = 1.0
+        while not self._cerrar.is_set():
+            unbind = False
+            try:
+                reader = await self._conectar()
+                espera = 1.0
+                await self._sondear(reader, muestras)
+                unbind = True
+            except Exception as e:
+                # Cualquier falla queda en la sesión y se reintenta; no debe terminar el loop compartido
+                self.error = str(e) or e.__class__.__name__
+                unbind = self.enlazada and not isinstance(e, (OSError, EOFError, asyncio.TimeoutError))
+            finally:
+                await self._desconectar(unbind or self._cerrar.is_set())
+            if muestras is not None:
+                return
+            if self._cerrar.is_set():
+                break
+            self.reconexiones += 1
+            try:
+                await asyncio.wait_for(self._cerrar.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+            espera = min(espera * 2, BACKOFF_MAX)
+
+    def cerrar(self):
+        if self._cerrar is not None:
+            self._cerrar.set()
+
+    def resumen(self, ventana=VENTANA, ahora=None):
+        """
+        Devuelve dict con muestras, perdidas, loss (%), min/avg/p50/p95/p99/max (ms)
+        de la ventana y el estado de la sesión.
+        """
+        ahora = time.time() if ahora is None else ahora
+        valores = [ms for ts, ms in list(self.muestras) if ts >= ahora - ventana]
+        exitosas = sorted(ms for ms in valores if ms is not None)
+        r = {
+            'muestras': len(valores),
+            'perdidas': len(valores) - len(exitosas),
+            'loss': 100.0 * (len(valores) - len(exitosas)) / len(valores) if valores else 0.0,
+            'enlazada': self.enlazada,
+            'binds': self.binds,
+            'reconexiones': self.reconexiones,
+            'bind_ms': self.bind_ms,
+            'error': self.error,
+        }
+        for clave, p in (('p50', 50), ('p95', 95), ('p99', 99)):
+            r[clave] = percentil(exitosas, p)
+        r['min'] = exitosas[0] if exitosas else None
+        r['max'] = exitosas[-1] if exitosas else None
+        r['avg'] = sum(exitosas) / len(exitosas) if exitosas else None
+        return r
+
+
+class SondaSMPP:
+    """
+    Ejecuta todas las sesiones en un loop asyncio propio en un hilo de fondo.
+    """
+
+    def __init__(self, sesiones):
+        self.sesiones = {s.nombre: s for s in sesiones}
+        self._loop = None
+        self._hilo = None
+        self._listo = threading.Event()
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._ejecutar, name='sonda_smpp', daemon=True)
+        self._hilo.start()
+        self._listo.wait(5)
+
+    def _ejecutar(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        async def todas():
+            tareas = [asyncio.ensure_future(s.ejecutar()) for s in self.sesiones.values()]
+            self._listo.set()
+            await asyncio.gather(*tareas, return_exceptions=True)
+
+        try:
+            self._loop.run_until_complete(todas())
+        finally:
+            self._loop.close()
+
+    def detener(self, espera=3.0):
+        """
+        Cierra las sesiones con unbind y espera el fin del hilo.
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+        for sesion in self.sesiones.values():
+            try:
+                self._loop.call_soon_threadsafe(sesion.cerrar)
+            except RuntimeError:
+                return
+        if self._hilo is not None:
+            self._hilo.join(espera)
+
+
+def sesiones_desde_config(config, **kwargs):
+    """
+    Crea una SesionSMPP por cada sección [smpp:<nombre>] de Setting.ini,
+    con los valores por defecto de la sección [smpp].
+    Lanza ValueError si una sección no indica host o tiene valores inválidos.
+    """
+    defecto = {
+        'intervalo': config.getfloat('smpp', 'intervalo', fallback=INTERVALO),
+        'timeout': config.getfloat('smpp', 'timeout', fallback=TIMEOUT),
+        'capacidad': config.getint('smpp', 'capacidad', fallback=CAPACIDAD),
+        'max_perdidas': config.getint('smpp', 'max_perdidas', fallback=MAX_PERDIDAS),
+    }
+    defecto.update(kwargs)
+    sesiones = []
+    for seccion in config.sections():
+        if not seccion.startswith('smpp:'):
+            continue
+        s = config[seccion]
+        if not s.get('host', fallback='').strip():
+            raise ValueError(f"la sección [{seccion}] debe indicar host")
+        sesiones.append(SesionSMPP(
+            seccion.split(':', 1)[1], s.get('host'), s.getint('port', fallback=2775),
+            s.get('system_id', fallback=''), s.get('password', fallback=''),
+            s.get('system_type', fallback=''), s.get('modo', fallback='transmitter'),
+            intervalo=s.getfloat('intervalo', fallback=defecto['intervalo']),
+            timeout=s.getfloat('timeout', fallback=defecto['timeout']),
+            capacidad=s.getint('capacidad', fallback=defecto['capacidad']),
+            max_perdidas=s.getint('max_perdidas', fallback=defecto['max_perdidas']),
+        ))
+    return sesiones
+
+
+def sonda_desde_config(config):
+    """
+    Crea la sonda con las sesiones de Setting.ini, o None si no hay ninguna.
+    """
+    sesiones = sesiones_desde_config(config)
+    return SondaSMPP(sesiones) if sesiones else None
+
+
+# -- Check servido desde la sonda (monitor_daemon.py) --------------------------
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Round-trip de enquire_link sobre sesiones SMPP persistentes.")
+    parser.add_argument("smsc", nargs='*', help="SMSC a evaluar (default: todos los configurados).")
+    parser.add_argument("--ventana", type=float, default=VENTANA,
+                        help=f"Segundos de muestras evaluados (default: {VENTANA}).")
+    parser.add_argument("--warning", type=float, default=WARNING_MS,
+                        help=f"p95 en ms para WARNING (default: {WARNING_MS}).")
+    parser.add_argument("--critical", type=float, default=CRITICAL_MS,
+                        help=f"p95 en ms para CRITICAL (default: {CRITICAL_MS}).")
+    parser.add_argument("--critical-loss", type=float, default=CRITICAL_LOSS,
+                        help=f"Pérdida en %% a partir de la cual se reporta CRITICAL (default: {CRITICAL_LOSS:g}).")
+    return parser
+
+
+def _ms(valor):
+    return f"{valor:.2f}ms" if valor is not None else "U"
+
+
+def evaluar_resumenes(resumenes, warning_ms, critical_ms, critical_loss):
+    """
+    Evalúa {smsc: resumen} y devuelve (estado, salida). CRITICAL si una
+    sesión no está enlazada sin muestras, si la pérdida alcanza el umbral o
+    si el p95 supera el crítico; WARNING con pérdida o p95 sobre el umbral.
+    """
+    estado = STATE_OK
+    problemas, perfdata = [], []
+    for nombre, r in resumenes.items():
+        for clave in ('p50', 'p95', 'p99', 'max'):
+            umbral = f";{warning_ms:g};{critical_ms:g}" if clave == 'p95' else ""
+            perfdata.append(f"'{nombre}_{clave}'={_ms(r[clave])}{umbral}")
+        perfdata.append(f"'{nombre}_loss'={r['loss']:.0f}%;;{critical_loss:g};0;100")
+        perfdata.append(f"'{nombre}_reconexiones'={r['reconexiones']}c")
+
+        if not r['muestras']:
+            estado = STATE_CRITICAL if r['error'] else max(estado, STATE_WARNING)
+            problemas.append(f"{nombre} sin muestras ({r['error'] or 'sesión iniciando'})")
+        elif r['loss'] >= critical_loss or (r['p95'] is not None and r['p95'] > critical_ms):
+            estado = STATE_CRITICAL
+            problemas.append(f"{nombre} p95 {_ms(r['p95'])} pérdida {r['loss']:.0f}%")
+        elif r['loss'] > 0 or (r['p95'] is not None and r['p95'] > warning_ms):
+            estado = max(estado, STATE_WARNING)
+            problemas.append(f"{nombre} p95 {_ms(r['p95'])} pérdida {r['loss']:.0f}%")
+
+    performance_data = " ".join(perfdata)
+    total = len(resumenes)
+    if estado == STATE_CRITICAL:
+        return estado, f"CRITICAL: {len(problemas)}/{total} SMSC con problemas: {'; '.join(problemas)} | {performance_data}"
+    elif estado == STATE_WARNING:
+        return estado, f"WARNING: {len(problemas)}/{total} SMSC con problemas: {'; '.join(problemas)} | {performance_data}"
+    return estado, f"OK: {total} SMSC responden enquire_link | {performance_data}"
+
+
+def ejecutar_check(sonda, args):
+    """
+    Evalúa las muestras en memoria de la sonda y devuelve (estado, salida).
+    """
+    nombres = args.smsc or sorted(sonda.sesiones)
+    desconocidos = [n for n in nombres if n not in sonda.sesiones]
+    if desconocidos:
+        return STATE_UNKNOWN, f"UNKNOWN: SMSC no configurado: {', '.join(desconocidos)}"
+    ahora = time.time()
+    resumenes = {n: sonda.sesiones[n].resumen(args.ventana, ahora) for n in nombres}
+    return evaluar_resumenes(resumenes, args.warning, args.critical, args.critical_loss)
+
+
+def parse_objetivo(texto):
+    """
+    Convierte "NOMBRE=HOST:PUERTO" (o "HOST:PUERTO") en (nombre, host, puerto).
+    """
+    nombre, _, destino = texto.rpartition('=')
+    host, puerto = destino.rsplit(':', 1)
+    return nombre or f"{host}_{puerto}", host, int(puerto)
+
+
+def main():
+    parser = crear_parser()
+    parser.description = "Bind SMPP, N enquire_link por SMSC y unbind (modo de una sola ejecución)."
+    parser.add_argument("--objetivo", action='append', default=[], metavar='NOMBRE=HOST:PUERTO',
+                        help="SMSC a sondear sin usar Setting.ini (repetible).")
+    parser.add_argument("--system-id", default='', help="system_id para --objetivo.")
+    parser.add_argument("--password", default='', help="password para --objetivo.")
+    parser.add_argument("--modo", default='transmitter', choices=sorted(MODOS), help="Tipo de bind (default: transmitter).")
+    parser.add_argument("--muestras", type=int, default=5, help="enquire_link por SMSC (default: 5).")
+    parser.add_argument("--intervalo", type=float, default=1.0, help="Segundos entre enquire_link (default: 1).")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help=f"Segundos por respuesta (default: {TIMEOUT:g}).")
+    args = parser.parse_args()
+
+    try:
+        if args.objetivo:
+            sesiones = [SesionSMPP(n, h, p, args.system_id, args.password, modo=args.modo,
+                                   intervalo=args.intervalo, timeout=args.timeout, capacidad=args.muestras,
+                                   max_perdidas=args.muestras + 1)
+                        for n, h, p in (parse_objetivo(o) for o in args.objetivo)]
+        else:
+            from monitor_comun import DB_CONFIG_PATH, LICENSE_CONFIG_PATH, leer_configuracion, verificar_licencia_o_salir
+            db_config = leer_configuracion(DB_CONFIG_PATH)
+            verificar_licencia_o_salir(LICENSE_CONFIG_PATH)
+            sesiones = sesiones_desde_config(db_config, intervalo=args.intervalo, timeout=args.timeout,
+                                             capacidad=args.muestras, max_perdidas=args.muestras + 1)
+            if args.smsc:
+                sesiones = [s for s in sesiones if s.nombre in args.smsc]
+    except ValueError as e:
+        print(f"UNKNOWN: Configuración SMPP inválida: {e}")
+        sys.exit(STATE_UNKNOWN)
+    if not sesiones or args.muestras < 1:
+        print("UNKNOWN: No hay SMSC para sondear (--objetivo o secciones [smpp:<nombre>]).")
+        sys.exit(STATE_UNKNOWN)
+
+    async def todas():
+        await asyncio.gather(*(s.ejecutar(args.muestras) for s in sesiones), return_exceptions=True)
+
+    asyncio.run(todas())
+    sonda = SondaSMPP(sesiones)
+    args.smsc = [s.nombre for s in sesiones]
+    args.ventana = float('inf')
+    estado, salida = ejecutar_check(sonda, args)
+    print(salida)
+    sys.exit(estado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: sqlite_ro.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Acceso compartido de solo lectura a las bases SQLite de Diafaan
+    (MessageLog.sqlite y la base de SendQueue) para todos los checks.
+    - Abre la base en modo solo lectura por URI (mode=ro): el check nunca
+      toma locks de escritura ni compite como escritor con Diafaan.
+    - Modo autocommit: cada consulta es su propia transacción corta.
+    - Ante "database is locked" / "database is busy" reintenta con backoff
+      exponencial con jitter en lugar de esperas fijas de varios segundos.
+    - Mide el tiempo total perdido esperando locks (lock_wait) para
+      exponerlo como métrica en la perfdata de los checks.
+    - Registra las fases db_connect, lock_wait y query en instrumentacion.py.
+
+Dependencias:
+    - Python 3.x
+    - sqlite3 (incluido en la librería estándar)
+"""
+
+import time
+import random
+import sqlite3
+from pathlib import Path
+
+from instrumentacion import fase, registrar
+
+BUSY_TIMEOUT = 0.25     # segundos que SQLite espera internamente por intento
+BACKOFF_BASE = 0.05     # segundos del primer backoff
+BACKOFF_MAX = 1.0       # tope de cada espera entre intentos
+PRESUPUESTO = 10.0      # segundos máximos esperando locks antes de rendirse
+
+
+def uri_solo_lectura(db_path):
+    """
+    Construye la URI `file:` de solo lectura (válida también para rutas Windows).
+    """
+    return Path(db_path).absolute().as_uri() + "?mode=ro"
+
+
+def conectar_ro(db_path, timeout=BUSY_TIMEOUT, check_same_thread=True):
+    """
+    Abre la base SQLite en modo solo lectura y autocommit.
+    """
+    with fase('db_connect'):
+        return sqlite3.connect(uri_solo_lectura(db_path), uri=True, timeout=timeout,
+                               isolation_level=None, check_same_thread=check_same_thread)
+
+
+def _es_bloqueo(error):
+    mensaje = str(error).lower()
+    return 'locked' in mensaje or 'busy' in mensaje
+
+
+def consultar(conn, query, params=(), presupuesto=PRESUPUESTO):
+    """
+    Ejecuta una consulta sobre una conexión abierta y devuelve (filas, lock_wait),
+    donde lock_wait son los segundos perdidos en intentos bloqueados y esperas.
+    Reintenta con backoff exponencial con jitter completo mientras la base
+    esté bloqueada y no se agote el presupuesto; otros errores se propagan.
+    """
+    inicio = time.perf_counter()
+    intento = 0
+    while True:
+        inicio_intento = time.perf_counter()
+        try:
+            filas = conn.execute(query, params).fetchall()
+            registrar('query', time.perf_counter() - inicio_intento)
+            registrar('lock_wait', inicio_intento - inicio)
+            return filas, inicio_intento - inicio
+        except sqlite3.OperationalError as e:
+            if not _es_bloqueo(e):
+                raise
+            transcurrido = time.perf_counter() - inicio
+            if transcurrido >= presupuesto:
+                raise sqlite3.OperationalError(
+                    f"La base de datos sigue bloqueada tras {intento + 1} intentos ({transcurrido:.1f} s)") from e
+            espera = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** intento)))
+            time.sleep(min(espera, presupuesto - transcurrido))
+            intento += 1
+
+
+def ejecutar_consulta(db_path, query, params=(), presupuesto=PRESUPUESTO):
+    """
+    Abre una conexión de solo lectura, ejecuta la consulta y la cierra.
+    Devuelve (filas, lock_wait).
+    """
+    conn = conectar_ro(db_path)
+    try:
+        return consultar(conn, query, params, presupuesto)
+    finally:
+        conn.close()
+
+
+def perfdata_lock_wait(lock_wait):
+    return f"lock_wait={lock_wait:.3f}s"
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: sqlserver_db.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Capa de acceso a SQL Server para los checks de Diafaan (GW_TPS.py y daemon).
+    - Consultas siempre parametrizadas (`?`): SQL Server recibe un único texto
+      de sentencia por consulta y reutiliza su plan en lugar de compilar una
+      sentencia ad-hoc distinta por gateway.
+    - Pool de conexiones reutilizables con pooling ODBC habilitado y
+      verificación de salud (SELECT 1) de las conexiones inactivas.
+    - Cada conexión mantiene un cursor por sentencia, de modo que pyodbc
+      reutiliza la sentencia ya preparada en ejecuciones siguientes. La
+      caché es LRU y acotada (max_cursores): los cursores desalojados se
+      cierran, por lo que textos SQL generados (p. ej. listas IN de largo
+      variable) no acumulan cursores abiertos en el servidor.
+    - Cada consulta devuelve sus tiempos (espera, conexión, ejecución, lectura),
+      que también se registran como fases pool_wait, db_connect y query en
+      instrumentacion.py.
+
+Configuración (Setting.ini, sección [sqlodbc]):
+    driver, server, database, uid, pwd   → parámetros de conexión
+    pool_size = 4                        → conexiones máximas del pool (opcional)
+    health_interval = 60                 → segundos de inactividad antes de verificar la conexión (opcional)
+    max_cursores = 32                    → sentencias preparadas guardadas por conexión (opcional)
+
+Dependencias:
+    - Python 3.x
+    - pyodbc
+"""
+
+import time
+import threading
+from collections import OrderedDict, deque
+
+import pyodbc
+
+from instrumentacion import registrar
+
+# Pooling del driver manager ODBC; debe fijarse antes de la primera conexión
+pyodbc.pooling = True
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_HEALTH_INTERVAL = 60   # segundos
+DEFAULT_TIMEOUT = 10           # segundos de espera de conexión / consulta
+DEFAULT_MAX_CURSORES = 32      # cursores preparados por conexión
+HEALTH_QUERY = "SELECT 1;"
+
+
+def _ms(inicio):
+    return (time.perf_counter() - inicio) * 1000
+
+
+class _Conexion:
+    """
+    Conexión del pool con su caché LRU de cursores preparados por sentencia.
+    """
+
+    def __init__(self, conn, max_cursores=DEFAULT_MAX_CURSORES):
+        self.conn = conn
+        self.max_cursores = max_cursores
+        self.cursores = OrderedDict()
+        self.ultimo_uso = time.monotonic()
+
+    def cursor(self, sql):
+        """
+        Devuelve (cursor, reutilizado). pyodbc conserva la última sentencia
+        preparada de cada cursor, por lo que usar siempre el mismo cursor para
+        el mismo texto SQL evita volver a prepararla. Al superar
+        `max_cursores` se cierra el cursor usado hace más tiempo.
+        """
+        cursor = self.cursores.get(sql)
+        if cursor is not None:
+            self.cursores.move_to_end(sql)
+            return cursor, True
+        cursor = self.conn.cursor()
+        self.cursores[sql] = cursor
+        while len(self.cursores) > self.max_cursores:
+            _, desalojado = self.cursores.popitem(last=False)
+            try:
+                desalojado.close()
+            except pyodbc.Error:
+                pass
+        return cursor, False
+
+    def cerrar(self):
+        try:
+            self.conn.close()
+        except pyodbc.Error:
+            pass
+
+
+class SQLServerDB:
+    """
+    Pool de conexiones a SQL Server, seguro para uso desde varios hilos.
+    """
+
+    def __init__(self, conn_str, pool_size=DEFAULT_POOL_SIZE, health_interval=DEFAULT_HEALTH_INTERVAL,
+                 timeout=DEFAULT_TIMEOUT, max_cursores=DEFAULT_MAX_CURSORES):
+        self.conn_str = conn_str
+        self.pool_size = pool_size
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self.max_cursores = max_cursores
+        self._libres = deque()
+        self._creadas = 0
+        self._cond = threading.Condition()
+
+    # -- Pool ----------------------------------------------------------------
+
+    def _conectar(self):
+        conn = pyodbc.connect(self.conn_str, timeout=self.timeout)
+        conn.timeout = self.timeout
+        return _Conexion(conn, self.max_cursores)
+
+    def _saludable(self, conexion):
+        try:
+            cursor = conexion.conn.cursor()
+            cursor.execute(HEALTH_QUERY)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _adquirir(self, tiempos):
+        inicio = time.perf_counter()
+        with self._cond:
+            while not self._libres and self._creadas >= self.pool_size:
+                if not self._cond.wait(self.timeout):
+                    raise pyodbc.OperationalError("HYT00", "Tiempo de espera agotado esperando una conexión del pool")
+            conexion = self._libres.pop() if self._libres else None
+            if conexion is None:
+                self._creadas += 1
+        tiempos['espera_ms'] = _ms(inicio)
+        registrar('pool_wait', tiempos['espera_ms'] / 1000)
+
+        if conexion is not None and time.monotonic() - conexion.ultimo_uso > self.health_interval:
+            if not self._saludable(conexion):
+                # La plaza del pool se reutiliza para la conexión nueva
+                conexion.cerrar()
+                conexion = None
+
+        if conexion is None:
+            inicio = time.perf_counter()
+            try:
+                conexion = self._conectar()
+            finally:
+                if conexion is None:
+                    # La conexión no se creó (cualquier excepción): se devuelve la plaza
+                    self._descartar(None)
+            tiempos['conexion_ms'] = _ms(inicio)
+            registrar('db_connect', tiempos['conexion_ms'] / 1000)
+        else:
+            tiempos['conexion_ms'] = 0.0
+        return conexion
+
+    def _liberar(self, conexion):
+        conexion.ultimo_uso = time.monotonic()
+        with self._cond:
+            self._libres.append(conexion)
+            self._cond.notify()
+
+    def _descartar(self, conexion):
+        if conexion is not None:
+            conexion.cerrar()
+        with self._cond:
+            self._creadas -= 1
+            self._cond.notify()
+
+    # -- API pública ---------------------------------------------------------
+
+    def consulta(self, sql, params=()):
+        """
+        Ejecuta una consulta parametrizada y devuelve (filas, tiempos).
+        `tiempos` contiene espera_ms, conexion_ms, ejecucion_ms, lectura_ms y
+        preparada (True si se reutilizó la sentencia ya preparada).
+        Ante un error de pyodbc la conexión se descarta y el error se propaga;
+        con cualquier otra excepción la conexión vuelve al pool.
+        """
+        tiempos = {}
+        conexion = self._adquirir(tiempos)
+        descartar = False
+        try:
+            cursor, reutilizado = conexion.cursor(sql)
+            inicio = time.perf_counter()
+            cursor.execute(sql, params)
+            tiempos['ejecucion_ms'] = _ms(inicio)
+
+            inicio = time.perf_counter()
+            filas = cursor.fetchall()
+            tiempos['lectura_ms'] = _ms(inicio)
+            tiempos['preparada'] = reutilizado
+            registrar('query', (tiempos['ejecucion_ms'] + tiempos['lectura_ms']) / 1000)
+        except pyodbc.Error:
+            descartar = True
+            raise
+        finally:
+            if descartar:
+                self._descartar(conexion)
+            else:
+                self._liberar(conexion)
+        return filas, tiempos
+
+    def cerrar(self):
+        with self._cond:
+            while self._libres:
+                self._libres.pop().cerrar()
+                self._creadas -= 1
+
+
+def perfdata_tiempos(tiempos):
+    """
+    Formatea los tiempos de una consulta como perfdata adicional para Nagios.
+    """
+    return (f"db_espera={tiempos.get('espera_ms', 0):.1f}ms "
+            f"db_conexion={tiempos.get('conexion_ms', 0):.1f}ms "
+            f"db_ejecucion={tiempos.get('ejecucion_ms', 0):.1f}ms "
+            f"db_lectura={tiempos.get('lectura_ms', 0):.1f}ms")
+
+
+def db_desde_config(db_config, conn_str):
+    """
+    Crea el pool con los parámetros opcionales de la sección [sqlodbc].
+    """
+    pool_size = db_config.getint('sqlodbc', 'pool_size', fallback=DEFAULT_POOL_SIZE)
+    health_interval = db_config.getfloat('sqlodbc', 'health_interval', fallback=DEFAULT_HEALTH_INTERVAL)
+    max_cursores = db_config.getint('sqlodbc', 'max_cursores', fallback=DEFAULT_MAX_CURSORES)
+    return SQLServerDB(conn_str, pool_size=pool_size, health_interval=health_interval,
+                       max_cursores=max_cursores)
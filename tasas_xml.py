@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+Script: tasas_xml.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    TPS y tasa de fallos por gateway a partir de los contadores del XML de
+    estado de Diafaan (Statistics/SentMessages y FailedMessages), sin
+    consultar SQL Server. En cada muestra se guarda una instantánea de los
+    contadores de todas las gateways; la tasa es la diferencia con la
+    instantánea anterior dividida por el tiempo transcurrido:
+        envío = ΔSentMessages / Δt
+        fallo = ΔFailedMessages / Δt
+        error = ΔFailedMessages / (ΔSentMessages + ΔFailedMessages) en %
+    Si un contador baja (reinicio de Diafaan o de la gateway) se asume que
+    volvió a contar desde cero y su valor actual se toma como la diferencia.
+    Una sola descarga del XML (caché de diafaan_xml.py) alcanza para todas
+    las gateways, a diferencia de GW_TPS.py que recorre dbo.messagelog.
+    Como check de Nagios la instantánea anterior se guarda en un archivo
+    JSON (--estado); en el exporter (colector tps_xml) queda en memoria.
+    Mientras la copia de la caché siga vigente (TTL) se reportan las tasas
+    del último intervalo medido; si el servidor la revalida (304) los
+    contadores no cambiaron y las tasas se calculan hasta ese instante.
+    Una gateway que aparece en el XML sin instantánea anterior se toma
+    como primera muestra, no como gateway faltante.
+
+Uso:
+    python tasas_xml.py <GatewayName> | --todas | --gateways GW1,GW2
+                        [--warning 4] [--critical 1]
+                        [--error-warning 5] [--error-critical 20]
+                        [--umbral GW=WARN:CRIT] [--estado tasas_xml.json]
+
+Ejemplo:
+    python tasas_xml.py --todas --error-warning 10 --error-critical 30
+
+Dependencias:
+    - Python 3.x
+    - requests
+
+Archivos requeridos:
+    - Setting.ini   → sección [URL] (url), opcional [cache] y [tps_umbrales]
+                      (los mismos umbrales de TPS de GW_TPS.py)
+    - License.py    → contiene función get_expiration_date()
+"""
+
+import os
+import json
+import time
+import argparse
+import xml.etree.ElementTree as ET
+
+import requests
+
+from diafaan_xml import cache_desde_config, iterar_gateways
+from monitor_comun import (
+    DB_CONFIG_PATH, LICENSE_CONFIG_PATH, STATE_OK, STATE_WARNING,
+    STATE_CRITICAL, STATE_UNKNOWN, leer_configuracion, salir,
+    verificar_licencia_o_salir,
+)
+
+warning_threshold = 4           # TPS mínimo (mismos defaults que GW_TPS.py)
+critical_threshold = 1
+error_warning_threshold = 5     # % de fallos
+error_critical_threshold = 20
+
+estado_path = os.path.join(os.path.dirname(DB_CONFIG_PATH), 'tasas_xml.json')
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        description="TPS y tasa de fallos por gateway desde los contadores del XML de Diafaan."
+    )
+    parser.add_argument("gateway_name", nargs='?', help="Nombre del gateway a verificar.")
+    parser.add_argument("--todas", action='store_true', help="Evaluar todas las gateways del XML.")
+    parser.add_argument("--gateways", help="Lista de gateways separados por coma.")
+    parser.add_argument("--umbral", action='append', default=[], metavar='GW=WARN:CRIT',
+                        help="Umbral de TPS por gateway (repetible).")
+    parser.add_argument("--warning", type=float, default=warning_threshold,
+                        help=f"TPS mínimo para OK (default: {warning_threshold}).")
+    parser.add_argument("--critical", type=float, default=critical_threshold,
+                        help=f"TPS bajo el cual se reporta CRITICAL (default: {critical_threshold}).")
+    parser.add_argument("--error-warning", type=float, default=error_warning_threshold,
+                        help=f"Porcentaje de fallos para WARNING (default: {error_warning_threshold}).")
+    parser.add_argument("--error-critical", type=float, default=error_critical_threshold,
+                        help=f"Porcentaje de fallos para CRITICAL (default: {error_critical_threshold}).")
+    parser.add_argument("--estado", default=estado_path,
+                        help=f"Archivo con la instantánea anterior de contadores (default: {estado_path}).")
+    return parser
+
+
+def validar_args(args):
+    """
+    Devuelve un mensaje de error si la combinación de argumentos no es válida, o None.
+    """
+    multiple = args.todas or args.gateways
+    if args.gateway_name and multiple:
+        return "ERROR: Indicar un gateway o --todas/--gateways, no ambos."
+    if not args.gateway_name and not multiple:
+        return "ERROR: Indicar el nombre del gateway, --todas o --gateways."
+    return None
+
+
+def cargar_umbrales(db_config, args):
+    """
+    Umbrales de TPS de [tps_umbrales] y --umbral, con el formato de GW_TPS.py.
+    Devuelve un dict {nombre_en_minúsculas: (warning, critical)}.
+    """
+    umbrales = {}
+    if db_config is not None and 'tps_umbrales' in db_config:
+        for nombre, valor in db_config.items('tps_umbrales'):
+            warning, critical = (float(v) for v in valor.split(','))
+            umbrales[nombre.lower()] = (warning, critical)
+    for definicion in args.umbral:
+        nombre, valor = definicion.rsplit('=', 1)
+        warning, critical = (float(v) for v in valor.split(':'))
+        umbrales[nombre.lower()] = (warning, critical)
+    return umbrales
+
+
+def _contador(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _delta(actual, previo):
+    # Un contador que baja se reinició: contó desde cero hasta el valor actual
+    if actual >= previo:
+        return actual - previo, False
+    return actual, True
+
+
+class ContadoresXML:
+    """
+    Instantánea de los contadores SentMessages/FailedMessages por gateway y
+    tasas calculadas contra la instantánea anterior.
+    """
+
+    def __init__(self, datos=None):
+        datos = datos or {}
+        self.ts = datos.get('ts')
+        self.version = datos.get('version')
+        self.contadores = datos.get('contadores', {})
+        self.tasas = datos.get('tasas', {})
+
+    def actualizar(self, gateways, ts, version=None):
+        """
+        Registra una nueva instantánea y devuelve {gateway: tasa}, donde cada
+        tasa es un dict {envio, fallo, error, intervalo, reinicio}, o None
+        para una gateway sin instantánea anterior (primera muestra). Con la
+        misma copia del XML (`version` y `ts`) ya registrada se devuelven
+        las tasas previas.
+        """
+        if version is not None and version == self.version and ts == self.ts:
+            return self.tasas
+
+        contadores = {}
+        for gw in gateways:
+            enviados = _contador(gw.get('SentMessages'))
+            fallidos = _contador(gw.get('FailedMessages'))
+            if enviados is not None and fallidos is not None:
+                contadores[gw['Name']] = (enviados, fallidos)
+
+        tasas = {}
+        intervalo = ts - self.ts if self.ts is not None else 0
+        if intervalo > 0:
+            for nombre, (enviados, fallidos) in contadores.items():
+                previo = self.contadores.get(nombre)
+                if previo is None:
+                    tasas[nombre] = None
+                    continue
+                d_enviados, reinicio_enviados = _delta(enviados, previo[0])
+                d_fallidos, reinicio_fallidos = _delta(fallidos, previo[1])
+                total = d_enviados + d_fallidos
+                tasas[nombre] = {
+                    'envio': d_enviados / intervalo,
+                    'fallo': d_fallidos / intervalo,
+                    'error': 100.0 * d_fallidos / total if total else 0.0,
+                    'intervalo': intervalo,
+                    'reinicio': reinicio_enviados or reinicio_fallidos,
+                }
+
+        self.ts = ts
+        self.version = version
+        self.contadores = contadores
+        self.tasas = tasas
+        return tasas
+
+    def a_dict(self):
+        return {'ts': self.ts, 'version': self.version,
+                'contadores': self.contadores, 'tasas': self.tasas}
+
+    @classmethod
+    def cargar(cls, ruta):
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        if not isinstance(datos, dict):
+            return cls()
+        datos['contadores'] = {n: tuple(v) for n, v in datos.get('contadores', {}).items()}
+        return cls(datos)
+
+    def guardar(self, ruta):
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self.a_dict(), f)
+        os.replace(temporal, ruta)
+
+
+def muestrear(cache, url, contadores):
+    """
+    Descarga (o reutiliza de la caché) el XML y actualiza `contadores`.
+    El instante de la muestra es el de la última confirmación del XML por
+    el servidor (descarga o 304), no el de la lectura de la caché.
+    Lanza requests.RequestException o ET.ParseError.
+    """
+    contenido, version, revisado = cache.obtener_muestra(url)
+    ts = revisado if revisado is not None else time.time()
+    return contadores.actualizar(iterar_gateways(contenido), ts, version)
+
+
+def evaluar_tasas(tasas, nombres, umbrales, args):
+    """
+    Evalúa TPS y porcentaje de fallos de las gateways `nombres` y devuelve (estado, salida).
+    """
+    primera = "UNKNOWN: Primera instantánea de contadores del XML; las tasas se calculan desde la próxima muestra."
+    if not any(tasas.values()):
+        return STATE_UNKNOWN, primera
+
+    estado = STATE_OK
+    criticos, advertencias, faltantes, primeras, perfdata = [], [], [], [], []
+    for nombre in nombres:
+        coincidencias = [t for n, t in tasas.items() if n.lower() == nombre.lower()]
+        if not coincidencias:
+            faltantes.append(nombre)
+            continue
+        tasa = coincidencias[0]
+        if tasa is None:
+            # Gateway nueva en el XML: se evalúa desde la próxima muestra
+            primeras.append(nombre)
+            continue
+        warning, critical = umbrales.get(nombre.lower(), (args.warning, args.critical))
+        etiqueta = nombre.lower()
+        perfdata.append(f"'tps_{etiqueta}'={tasa['envio']:.2f};{warning:g};{critical:g};0;")
+        perfdata.append(f"'fps_{etiqueta}'={tasa['fallo']:.2f};;;0;")
+        perfdata.append(f"'error_{etiqueta}'={tasa['error']:.1f}%;{args.error_warning:g};{args.error_critical:g};0;100")
+        detalle = f"{nombre}={tasa['envio']:.2f} TPS/{tasa['error']:.1f}% fallos"
+        if tasa['reinicio']:
+            detalle += " (contador reiniciado)"
+        ultimo = detalle
+        if tasa['envio'] < critical or tasa['error'] >= args.error_critical:
+            criticos.append(detalle)
+            estado = STATE_CRITICAL
+        elif tasa['envio'] < warning or tasa['error'] >= args.error_warning:
+            advertencias.append(detalle)
+            estado = max(estado, STATE_WARNING)
+
+    if primeras and len(primeras) == len(nombres):
+        return STATE_UNKNOWN, primera
+    if faltantes:
+        criticos.extend(f"{nombre} no está en el XML" for nombre in faltantes)
+        estado = STATE_CRITICAL if len(faltantes) < len(nombres) else STATE_UNKNOWN
+
+    intervalo = max((t['intervalo'] for t in tasas.values() if t), default=0.0)
+    perfdata.append(f"intervalo={intervalo:.1f}s")
+    total = len(nombres)
+    nota = f" (primera muestra: {', '.join(primeras)})" if primeras else ""
+    performance_data = " ".join(perfdata)
+    if estado == STATE_UNKNOWN:
+        return estado, f"UNKNOWN: No se encontraron en el XML las gateways {', '.join(faltantes)} | {performance_data}"
+    if total == 1:
+        etiqueta = {STATE_OK: 'OK', STATE_WARNING: 'WARNING', STATE_CRITICAL: 'CRITICAL'}[estado]
+        return estado, f"{etiqueta}: {ultimo} en {intervalo:.0f} s | {performance_data}"
+    if estado == STATE_CRITICAL:
+        detalle = ", ".join(criticos + advertencias)
+        return estado, f"CRITICAL: {len(criticos)}/{total} gateways con TPS o fallos fuera de umbral crítico ({detalle}){nota} | {performance_data}"
+    elif estado == STATE_WARNING:
+        return estado, f"WARNING: {len(advertencias)}/{total} gateways con TPS o fallos fuera de umbral ({', '.join(advertencias)}){nota} | {performance_data}"
+    return estado, f"OK: TPS y fallos dentro de umbral en {total - len(primeras)} gateways{nota} | {performance_data}"
+
+
+def _nombres(args, tasas):
+    if args.gateway_name:
+        return [args.gateway_name]
+    if args.gateways:
+        return [g.strip() for g in args.gateways.split(',') if g.strip()]
+    return sorted(tasas)
+
+
+def evaluar_check(tasas, args, db_config=None):
+    """
+    Evalúa las tasas ya calculadas según los argumentos del check y devuelve (estado, salida).
+    """
+    try:
+        umbrales = cargar_umbrales(db_config, args)
+    except ValueError as e:
+        return STATE_UNKNOWN, f"UNKNOWN: Umbral de TPS inválido: {e}"
+    return evaluar_tasas(tasas, _nombres(args, tasas), umbrales, args)
+
+
+def tomar_muestra(cache, url, ruta_estado):
+    """
+    Lee la instantánea anterior de `ruta_estado`, toma una muestra y la guarda.
+    Devuelve (tasas, None) o (None, (estado, salida)) si falla.
+    """
+    contadores = ContadoresXML.cargar(ruta_estado)
+    try:
+        tasas = muestrear(cache, url, contadores)
+    except requests.RequestException as e:
+        return None, (STATE_UNKNOWN, f"UNKNOWN: Error al obtener el XML de estado: {e}")
+    except ET.ParseError as e:
+        return None, (STATE_UNKNOWN, f"UNKNOWN: XML de estado inválido: {e}")
+    try:
+        contadores.guardar(ruta_estado)
+    except OSError as e:
+        return None, (STATE_UNKNOWN, f"UNKNOWN: No se pudo guardar la instantánea de contadores: {e}")
+    return tasas, None
+
+
+def ejecutar_check(cache, url, args, db_config=None):
+    """
+    Ejecuta el check completo y devuelve (estado, salida).
+    """
+    tasas, error = tomar_muestra(cache, url, args.estado)
+    if error:
+        return error
+    return evaluar_check(tasas, args, db_config)
+
+
+def main():
+    db_config = leer_configuracion(DB_CONFIG_PATH)
+    verificar_licencia_o_salir(LICENSE_CONFIG_PATH)
+
+    args = crear_parser().parse_args()
+    error = validar_args(args)
+    if error:
+        salir(STATE_UNKNOWN, error)
+
+    url = db_config.get('URL', 'url', fallback=None)
+    if url is None:
+        salir(1, "ERROR: No se encontró la sección [URL] o la clave url en Setting.ini")
+
+    salir(*ejecutar_check(cache_desde_config(db_config), url, args, db_config))
+
+
+if __name__ == "__main__":
+    main()
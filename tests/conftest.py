@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Configuración común de las pruebas: los scripts son módulos planos en la
+raíz del repositorio.
+"""
+
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+import monitor_comun  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def sin_cache(monkeypatch):
+    """
+    Las pruebas no leen ni escriben la caché de Setting.ini / License.py
+    (ni en este proceso ni en los subprocesos que lanzan).
+    """
+    monkeypatch.setenv('DIAFAAN_CACHE', 'off')
+    monkeypatch.setattr(monitor_comun, 'CACHE_PATH', 'off')
+    monkeypatch.setattr(monitor_comun, '_cache', None)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Un ciclo de nagios_pasivo.py sobre una base SQLite local: los servicios se
+agrupan por check, comparten consultas y sus resultados se escriben como
+líneas PROCESS_SERVICE_CHECK_RESULT.
+"""
+
+import sqlite3
+
+import pytest
+
+import nagios_pasivo
+import SMS_GW_Status
+from monitor_daemon import MonitorState
+
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    db_path = tmp_path / 'MessageLog.sqlite'
+    conn = sqlite3.connect(str(db_path))
+    conn.executescript("""
+        CREATE TABLE sendqueue (gatewayid INTEGER, Priority INTEGER);
+        CREATE TABLE MessageOut (GatewayId INTEGER, StatusCode INTEGER, SendTime TEXT);
+    """)
+    conn.executemany("INSERT INTO sendqueue VALUES (?, ?)", [(2, 1), (2, 1), (3, 5), (None, None)])
+    conn.executemany("INSERT INTO MessageOut VALUES (?, ?, datetime('now', 'localtime'))",
+                     [(2, 300)] * 3 + [(3, 500), (None, 300)])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(SMS_GW_Status, 'db_path', str(db_path))
+
+    (tmp_path / 'Setting.ini').write_text(f"[BDSQLite]\ndb_path = {db_path}\n", encoding='utf-8')
+    (tmp_path / 'License.py').write_text("def get_expiration_date():\n    return '2099-12-31'\n")
+    (tmp_path / 'servicios.txt').write_text(
+        "# host;servicio;check argumentos\n"
+        "Cola;queue\n"
+        "Prioridad 1;priority 1\n"
+        "Prioridad 5;priority 5\n"
+        "Prioridades;priority --todas --warning 10 --critical 20\n"
+        "Errores 300 gw2;errors 2 300 --error_threshold 1 --critical_threshold 5\n"
+        "Matriz;errors --matriz\n"
+        "otro;Desconocido;inexistente\n", encoding='utf-8')
+    return tmp_path
+
+
+def test_ciclo_con_base_local(entorno):
+    state = MonitorState(str(entorno / 'Setting.ini'), str(entorno / 'License.py'))
+    servicios = nagios_pasivo.leer_servicios(str(entorno / 'servicios.txt'), 'diafaan')
+    try:
+        consultas = nagios_pasivo.ejecutar_ciclo(state, servicios)
+    finally:
+        state.cerrar_conexiones()
+
+    resultados = {s.descripcion: (s.estado, s.salida) for s in servicios}
+    assert resultados['Cola'][0] == 0 and resultados['Cola'][1].startswith("2=2  3=1")
+    assert resultados['Prioridad 1'][0] == 2 and "2 mensajes con prioridad 1" in resultados['Prioridad 1'][1]
+    assert resultados['Prioridad 5'][0] == 2
+    assert resultados['Prioridades'][0] == 0 and "'priority_1'=2" in resultados['Prioridades'][1]
+    assert resultados['Errores 300 gw2'][0] == 1
+    assert resultados['Matriz'][0] == 0 and "'err_300_gw_2'=3" in resultados['Matriz'][1]
+    assert resultados['Desconocido'][0] == 3 and "Check desconocido" in resultados['Desconocido'][1]
+    # Las prioridades individuales y --todas comparten el histograma: cola, histograma, errores y matriz
+    assert consultas == 4
+
+    command_file = entorno / 'nagios.cmd'
+    nagios_pasivo.escribir_command_file(str(command_file), servicios, 1700000000)
+    lineas = command_file.read_text(encoding='utf-8').splitlines()
+    assert len(lineas) == len(servicios)
+    assert lineas[0].startswith("[1700000000] PROCESS_SERVICE_CHECK_RESULT;diafaan;Cola;0;2=2")
+    assert lineas[-1].startswith("[1700000000] PROCESS_SERVICE_CHECK_RESULT;otro;Desconocido;3;")
+
+
+def test_errores_por_instancia(tmp_path):
+    # Dos instancias con su propio MessageLog y el mismo archivo de marcas
+    estado = tmp_path / 'marcas.json'
+    resultados = []
+    for nombre, filas in (('nodo01', 2), ('nodo02', 5)):
+        directorio = tmp_path / nombre
+        directorio.mkdir()
+        db_path = directorio / 'MessageLog.sqlite'
+        conn = sqlite3.connect(str(db_path))
+        conn.execute("CREATE TABLE MessageOut (GatewayId INTEGER, StatusCode INTEGER, SendTime TEXT)")
+        conn.commit()
+        conn.close()
+        (directorio / 'Setting.ini').write_text(f"[BDSQLite]\nmessagelog_path = {db_path}\n", encoding='utf-8')
+        (directorio / 'License.py').write_text("def get_expiration_date():\n    return '2099-12-31'\n")
+        (directorio / 'servicios.txt').write_text(
+            f"Matriz;errors --matriz\nIncremental;errors --matriz --incremental --estado {estado}\n",
+            encoding='utf-8')
+        state = MonitorState(str(directorio / 'Setting.ini'), str(directorio / 'License.py'))
+        servicios = nagios_pasivo.leer_servicios(str(directorio / 'servicios.txt'), nombre)
+        try:
+            nagios_pasivo.ejecutar_ciclo(state, servicios)
+            conn = sqlite3.connect(str(db_path))
+            conn.executemany("INSERT INTO MessageOut VALUES (?, ?, datetime('now', 'localtime'))",
+                             [(2, 300)] * filas)
+            conn.commit()
+            conn.close()
+            nagios_pasivo.ejecutar_ciclo(state, servicios)
+        finally:
+            state.cerrar_conexiones()
+        resultados.append({s.descripcion: s.salida for s in servicios})
+
+    for (nodo, filas) in zip(resultados, (2, 5)):
+        assert f"'err_300_gw_2'={filas}" in nodo['Matriz']
+        assert f"'err_300_gw_2'={filas}" in nodo['Incremental']
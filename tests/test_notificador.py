@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Spool de alertas: un proceso encola y notificador.py --una-vez lo drena
+contra el SMTP local de prueba, usando las rutas por defecto (el spool
+junto al Setting.ini de monitor_comun.py).
+"""
+
+import os
+import sys
+import threading
+import subprocess
+
+import pytest
+
+from conftest import RAIZ
+import notificador
+
+
+@pytest.fixture
+def smtp_prueba():
+    server = notificador.crear_servidor_prueba(0)
+    hilo = threading.Thread(target=server.serve_forever, daemon=True)
+    hilo.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def entorno(tmp_path, smtp_prueba):
+    (tmp_path / 'Setting.ini').write_text(
+        "[URL]\nurl = http://127.0.0.1:9/\n"
+        f"[smtp]\nhost = 127.0.0.1\nport = {smtp_prueba}\nssl = no\n"
+        "destinatarios = soporte@example.com\nventana = 0\n", encoding='utf-8')
+    (tmp_path / 'License.py').write_text("def get_expiration_date():\n    return '2099-12-31'\n")
+    env = dict(os.environ, PYTHONPATH=RAIZ, DIAFAAN_CACHE='off',
+               DIAFAAN_SETTING=str(tmp_path / 'Setting.ini'), DIAFAAN_LICENSE=str(tmp_path / 'License.py'))
+    return tmp_path, env
+
+
+def _python(codigo, env):
+    return subprocess.run([sys.executable, '-c', codigo], env=env, capture_output=True, text=True, timeout=60)
+
+
+def _despachar(env):
+    return subprocess.run([sys.executable, os.path.join(RAIZ, 'notificador.py'), '--una-vez'],
+                          env=env, capture_output=True, text=True, timeout=60)
+
+
+def _pendientes(tmp_path):
+    spool = notificador.Spool(str(tmp_path / 'notificaciones.sqlite'))
+    try:
+        return spool.pendientes(100)
+    finally:
+        spool.cerrar()
+
+
+def test_spool_compartido_se_drena(entorno):
+    tmp_path, env = entorno
+    productor = _python(
+        "from monitor_comun import DB_CONFIG_PATH, leer_configuracion\n"
+        "from notificador import Spool, ruta_spool\n"
+        "Spool(ruta_spool(leer_configuracion(DB_CONFIG_PATH))).encolar('ALERTA: prueba', 'cuerpo')\n", env)
+    assert productor.returncode == 0, productor.stderr
+    assert len(_pendientes(tmp_path)) == 1
+
+    despacho = _despachar(env)
+    assert despacho.returncode == 0, despacho.stdout + despacho.stderr
+    assert "Enviado: ALERTA: prueba" in despacho.stdout
+    assert _pendientes(tmp_path) == []
+
+
+def test_alerta_de_gw_status_email_llega_al_despachador(entorno):
+    pytest.importorskip('requests')
+    tmp_path, env = entorno
+    productor = _python("import GW_status_email\nGW_status_email.send_email('ALERTA: Gateway X inactiva', 'cuerpo')\n",
+                        env)
+    assert productor.returncode == 0, productor.stdout + productor.stderr
+
+    despacho = _despachar(env)
+    assert despacho.returncode == 0, despacho.stdout + despacho.stderr
+    assert "Enviado: ALERTA: Gateway X inactiva" in despacho.stdout
+    assert _pendientes(tmp_path) == []
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Sesiones SMPP de sonda_smpp.py contra el SMSC falso de benchmarks/:
+bind, round-trip de enquire_link, respuestas perdidas y reconexión.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import configparser
+
+import pytest
+
+from conftest import RAIZ
+from sonda_smpp import SesionSMPP, sesiones_desde_config
+
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+from smsc_falso import SMSCFalso, iniciar_servidor  # noqa: E402
+
+
+async def _con_smsc(smsc, prueba):
+    server = await iniciar_servidor(smsc)
+    try:
+        return await prueba(server.sockets[0].getsockname()[1])
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+async def _esperar(condicion, plazo=10.0):
+    limite = time.monotonic() + plazo
+    while not condicion():
+        if time.monotonic() > limite:
+            raise AssertionError("la condición no se cumplió a tiempo")
+        await asyncio.sleep(0.02)
+
+
+def test_bind_y_round_trip():
+    smsc = SMSCFalso(latencia_ms=20, password='clave')
+
+    async def prueba(puerto):
+        sesion = SesionSMPP('local', '127.0.0.1', puerto, 'test', 'clave', intervalo=0.01, timeout=2.0)
+        await sesion.ejecutar(muestras=3)
+        return sesion
+
+    sesion = asyncio.run(_con_smsc(smsc, prueba))
+    assert sesion.error is None
+    assert sesion.binds == 1 and smsc.binds == 1 and smsc.conexiones == 1
+    assert sesion.bind_ms is not None
+    r = sesion.resumen(ventana=float('inf'))
+    assert r['muestras'] == 3 and r['perdidas'] == 0
+    assert r['min'] >= 15
+
+
+def test_bind_rechazado():
+    smsc = SMSCFalso(password='clave')
+
+    async def prueba(puerto):
+        sesion = SesionSMPP('local', '127.0.0.1', puerto, 'test', 'otra', timeout=2.0)
+        await sesion.ejecutar(muestras=1)
+        return sesion
+
+    sesion = asyncio.run(_con_smsc(smsc, prueba))
+    assert sesion.binds == 0 and not sesion.muestras
+    assert "bind rechazado" in sesion.error
+
+
+def test_respuestas_perdidas_provocan_reconexion():
+    smsc = SMSCFalso(perdida=1.0)
+
+    async def prueba(puerto):
+        sesion = SesionSMPP('local', '127.0.0.1', puerto, 'test', 'clave',
+                            intervalo=0.01, timeout=0.1, max_perdidas=2)
+        tarea = asyncio.ensure_future(sesion.ejecutar())
+        await _esperar(lambda: sesion.reconexiones >= 1)
+        error = sesion.error
+        # Tras el backoff la sesión vuelve a conectarse y hace un bind nuevo
+        await _esperar(lambda: sesion.binds >= 2)
+        sesion.cerrar()
+        await asyncio.wait_for(tarea, 5)
+        return sesion, error
+
+    sesion, error = asyncio.run(_con_smsc(smsc, prueba))
+    assert "sin respuesta" in error
+    assert smsc.conexiones >= 2
+    r = sesion.resumen(ventana=float('inf'))
+    assert r['perdidas'] >= 2 and r['loss'] == 100.0
+    assert not sesion.enlazada
+
+
+def test_credenciales_invalidas():
+    with pytest.raises(ValueError):
+        SesionSMPP('local', '127.0.0.1', 2775, 'tést', 'clave')
+    with pytest.raises(ValueError):
+        SesionSMPP('local', '127.0.0.1', 2775, 'test', 'clave_demasiado_larga')
+
+
+def test_config_sin_host():
+    config = configparser.ConfigParser()
+    config.read_dict({'smpp:smsc01': {'port': '2775', 'system_id': 'test'}})
+    with pytest.raises(ValueError, match='host'):
+        sesiones_desde_config(config)
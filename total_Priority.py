@@ -1,52 +1,11 @@
-import sys
 import sqlite3
-import datetime
-import time
-import importlib.util
-
-# Rutas de configuración
-db_config_path = r'C:/turuta\Monitor\OTP\Setting.ini'
-license_config_path = r'C:\turuta\Monitor\OTP\License.py'  # Ruta modificada a License.py
-
-# Configuración de reintentos y tiempo de espera
-RETRIES = 3       # Número de reintentos en caso de bloqueo
-TIMEOUT = 30      # Tiempo de espera en segundos para la conexión
-
-# Verificar el número de argumentos
-if len(sys.argv) != 2:
-    print("Uso: python script.py <prioridad>")
-    sys.exit(1)
-
-# Obtener la prioridad del argumento
-prioridad = sys.argv[1]
-
-# Leer configuración de la base de datos desde Setting.ini
-import configparser
-db_config = configparser.ConfigParser()
-db_config.read(db_config_path)
-
-if 'BDSQLite' in db_config and 'db_path' in db_config['BDSQLite']:
-    db_path = db_config.get('BDSQLite', 'db_path')
-else:
-    print("Error: La sección o clave de ruta de la base de datos no se encontró en Setting.ini")
-    sys.exit(1)
-
-# Cargar License.py desde la ruta especificada
-spec = importlib.util.spec_from_file_location("license_config", license_config_path)
-license_config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(license_config)
-
-# Comprobar si la fecha de expiración es válida desde License.py
-try:
-    expiration_date_str = license_config.get_expiration_date()
-    expiration_date = datetime.datetime.strptime(expiration_date_str, '%Y-%m-%d').date()
-
-    if datetime.date.today().date() > expiration_date:
-        print("CRITICAL: El script ha caducado.")
-        sys.exit(2)
-except AttributeError:
-    print("ERROR: No se encontró la fecha de expiración en License.py")
-    sys.exit(1)
+import argparse
+
+from sqlite_ro import consultar, ejecutar_consulta, perfdata_lock_wait
+from monitor_comun import (
+    DB_CONFIG_PATH, LICENSE_CONFIG_PATH, STATE_OK, STATE_WARNING, STATE_CRITICAL,
+    leer_configuracion, salir, verificar_licencia_o_salir,
+)
 
 # Consultar la base de datos
 query = """
@@ -57,29 +16,131 @@ WHERE Priority = ?
 GROUP BY Priority;
 """
 
-# Función para ejecutar consulta con reintentos
-def execute_query_with_retries(db_path, query, params):
-    attempt = 0
-    while attempt < RETRIES:
-        try:
-            conn = sqlite3.connect(db_path, timeout=TIMEOUT)
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            resultados = cursor.fetchall()
-            conn.close()
-            return resultados
-        except sqlite3.OperationalError as e:
-            if 'database is locked' in str(e):
-                print(f"Advertencia: La base de datos está bloqueada. Intento {attempt + 1}/{RETRIES}")
-                attempt += 1
-                time.sleep(2)  # Esperar antes del siguiente intento
-            else:
-                raise e
-    raise sqlite3.OperationalError("No se pudo ejecutar la consulta debido al bloqueo de la base de datos.")
+# Histograma completo de prioridades en una sola consulta agrupada
+# (las filas sin Priority no corresponden a ninguna prioridad evaluable)
+histogram_query = """
+SELECT Priority,
+       COUNT(*) AS total_registros
+FROM SendQueue
+WHERE Priority IS NOT NULL
+GROUP BY Priority;
+"""
+
+# Histograma de prioridades cruzado con gatewayid (como Q_completo.py)
+histogram_gateway_query = """
+SELECT Priority,
+       gatewayid,
+       COUNT(*) AS total_registros
+FROM SendQueue
+WHERE Priority IS NOT NULL
+GROUP BY Priority, gatewayid;
+"""
+
+# Prioridades reportadas siempre en modo --todas (con 0 si no hay mensajes)
+prioridades_esperadas = list(range(10))
+
+# Umbrales por defecto: cualquier mensaje pendiente es crítico, igual que el modo de una prioridad
+warning_threshold = 0
+critical_threshold = 0
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        description="Valida los mensajes pendientes en SendQueue por prioridad."
+    )
+    parser.add_argument("prioridad", nargs='?', help="Prioridad a verificar.")
+    parser.add_argument("--todas", action='store_true',
+                        help="Histograma de todas las prioridades con una sola consulta agrupada.")
+    parser.add_argument("--por-gateway", action='store_true',
+                        help="En modo --todas, desglosar cada prioridad por gatewayid.")
+    parser.add_argument("--umbral", action='append', default=[], metavar='PRIORIDAD=WARN:CRIT',
+                        help="Umbral por prioridad en modo --todas (repetible).")
+    parser.add_argument("--warning", type=int, default=warning_threshold,
+                        help=f"Mensajes sobre los que una prioridad queda en WARNING (default: {warning_threshold}).")
+    parser.add_argument("--critical", type=int, default=critical_threshold,
+                        help=f"Mensajes sobre los que una prioridad queda en CRITICAL (default: {critical_threshold}).")
+    return parser
+
+
+def validar_args(args):
+    """
+    Devuelve un mensaje de error si la combinación de argumentos no es válida, o None.
+    """
+    if args.prioridad is not None and args.todas:
+        return "Uso: python script.py <prioridad> | --todas [--por-gateway]"
+    if args.prioridad is None and not args.todas:
+        return "Uso: python script.py <prioridad> | --todas [--por-gateway]"
+    if args.por_gateway and not args.todas:
+        return "Error: --por-gateway solo aplica con --todas"
+    return None
 
-# Ejecutar la consulta con reintentos
-try:
-    resultados = execute_query_with_retries(db_path, query, (prioridad,))
+
+def cargar_umbrales(db_config, args):
+    """
+    Combina los umbrales de la sección [priority_umbrales] (`3 = warn, crit`)
+    y de --umbral. Devuelve un dict {prioridad: (warning, critical)}.
+    """
+    umbrales = {}
+    if db_config is not None and 'priority_umbrales' in db_config:
+        for prioridad, valor in db_config.items('priority_umbrales'):
+            warning, critical = (int(v) for v in valor.split(','))
+            umbrales[int(prioridad)] = (warning, critical)
+    for definicion in args.umbral:
+        prioridad, valor = definicion.split('=', 1)
+        warning, critical = (int(v) for v in valor.split(':'))
+        umbrales[int(prioridad)] = (warning, critical)
+    return umbrales
+
+
+def evaluar_histograma(resultados, umbrales, default_warning, default_critical,
+                       por_gateway=False, lock_wait=0.0):
+    """
+    Evalúa el histograma de prioridades y devuelve (estado, salida).
+    `resultados` son filas (Priority, total) o, con por_gateway,
+    (Priority, gatewayid, total). Los umbrales se aplican al total de cada
+    prioridad; el desglose por gateway solo se agrega a la perfdata (las
+    filas sin gatewayid cuentan en el total de su prioridad).
+    """
+    totales = {p: 0 for p in prioridades_esperadas}
+    desglose = {}
+    for fila in resultados:
+        prioridad = int(fila[0])
+        totales[prioridad] = totales.get(prioridad, 0) + fila[-1]
+        if por_gateway and fila[1] is not None:
+            desglose[(prioridad, int(fila[1]))] = fila[-1]
+
+    estado = STATE_OK
+    criticos, advertencias, perfdata = [], [], []
+    for prioridad in sorted(totales):
+        total_registros = totales[prioridad]
+        warning, critical = umbrales.get(prioridad, (default_warning, default_critical))
+        perfdata.append(f"'priority_{prioridad}'={total_registros};{warning};{critical};0;")
+        if total_registros > critical:
+            criticos.append(f"{prioridad}={total_registros}")
+            estado = STATE_CRITICAL
+        elif total_registros > warning:
+            advertencias.append(f"{prioridad}={total_registros}")
+            estado = max(estado, STATE_WARNING)
+    for (prioridad, gatewayid), total_registros in sorted(desglose.items()):
+        perfdata.append(f"'priority_{prioridad}_gw_{gatewayid}'={total_registros};;;0;")
+    perfdata.append(perfdata_lock_wait(lock_wait))
+
+    total = sum(totales.values())
+    performance_data = " ".join(perfdata)
+    if estado == STATE_CRITICAL:
+        detalle = ", ".join(criticos + advertencias)
+        return estado, (f'CRITICAL: {len(criticos)} prioridades sobre el umbral crítico ({detalle}), '
+                        f'{total} mensajes en cola\n| {performance_data}')
+    elif estado == STATE_WARNING:
+        return estado, (f'WARNING: {len(advertencias)} prioridades sobre el umbral ({", ".join(advertencias)}), '
+                        f'{total} mensajes en cola\n| {performance_data}')
+    return estado, f'OK: {total} mensajes en cola, todas las prioridades bajo el umbral\n| {performance_data}'
+
+
+# Evaluar resultados y generar salida para Nagios
+# (la consulta se ejecuta en solo lectura con reintentos y backoff, ver sqlite_ro.py)
+def evaluar_prioridad(prioridad, resultados, lock_wait=0.0):
+    espera = perfdata_lock_wait(lock_wait)
     if resultados:
         for fila in resultados:
             prioridad_actual = fila[0]
@@ -87,17 +148,58 @@ try:
             
             # Salida para Nagios
             if total_registros > 0:
-                print(f'CRITICAL: Hay {total_registros} mensajes con prioridad {prioridad_actual}')
-                print(f'| total_registros={total_registros};0;100;0;')
-                sys.exit(2)
+                return STATE_CRITICAL, (f'CRITICAL: Hay {total_registros} mensajes con prioridad {prioridad_actual}\n'
+                                        f'| total_registros={total_registros};0;100;0; {espera}')
             else:
-                print(f'OK: No hay mensajes con prioridad {prioridad_actual}')
-                print(f'| total_registros={total_registros};0;100;0;')
-                sys.exit(0)
+                return STATE_OK, (f'OK: No hay mensajes con prioridad {prioridad_actual}\n'
+                                  f'| total_registros={total_registros};0;100;0; {espera}')
+    return STATE_OK, (f'OK: No hay mensajes con prioridad {prioridad}\n'
+                      f'| total_registros=0;0;100;0; {espera}')
+
+# Ejecutar el check con una función consulta(sql, params) -> (filas, lock_wait):
+# conexión abierta, archivo o las consultas compartidas de nagios_pasivo.py
+def ejecutar_con_consulta(consulta, args, db_config=None):
+    try:
+        if args.todas:
+            sql = histogram_gateway_query if args.por_gateway else histogram_query
+            resultados, lock_wait = consulta(sql, ())
+        else:
+            resultados, lock_wait = consulta(query, (args.prioridad,))
+    except sqlite3.Error as e:
+        return 1, f"Error: {e}"
+    if args.todas:
+        try:
+            umbrales = cargar_umbrales(db_config, args)
+        except ValueError:
+            return 1, "Error: Umbral de prioridad inválido (formato PRIORIDAD=WARN:CRIT)"
+        return evaluar_histograma(resultados, umbrales, args.warning, args.critical,
+                                  args.por_gateway, lock_wait)
+    return evaluar_prioridad(args.prioridad, resultados, lock_wait)
+
+# Ejecutar el check sobre una conexión ya abierta (usado por monitor_daemon.py)
+def ejecutar_check(conn, args, db_config=None):
+    return ejecutar_con_consulta(lambda sql, params: consultar(conn, sql, params), args, db_config)
+
+def main():
+    # Leer y validar los argumentos
+    args = crear_parser().parse_args()
+    mensaje = validar_args(args)
+    if mensaje:
+        salir(1, mensaje)
+
+    # Leer configuración de la base de datos desde Setting.ini
+    db_config = leer_configuracion(DB_CONFIG_PATH)
+
+    if 'BDSQLite' in db_config and 'db_path' in db_config['BDSQLite']:
+        db_path = db_config.get('BDSQLite', 'db_path')
     else:
-        print(f'OK: No hay mensajes con prioridad {prioridad}')
-        print(f'| total_registros=0;0;100;0;')
-        sys.exit(0)
-except sqlite3.OperationalError as e:
-    print(f"Error: {e}")
-    sys.exit(1)
+        salir(1, "Error: La sección o clave de ruta de la base de datos no se encontró en Setting.ini")
+
+    # Comprobar si la fecha de expiración es válida desde License.py
+    verificar_licencia_o_salir(LICENSE_CONFIG_PATH)
+
+    # Ejecutar la consulta con reintentos
+    salir(*ejecutar_con_consulta(lambda sql, params: ejecutar_consulta(db_path, sql, params), args, db_config))
+
+if __name__ == "__main__":
+    main()
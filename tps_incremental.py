@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: tps_incremental.py
+Autor: Diego Oyarzun Retamal
+Fecha de creación: 2026-10-17
+Versión: 1.0
+Descripción:
+    Cálculo incremental de TPS por gateway con ventanas deslizantes.
+    En lugar de contar cada minuto todas las filas de los últimos 60 segundos,
+    cada fuente recuerda su marca de agua (high-water mark) y en cada sondeo
+    lee solo las filas nuevas, acumulándolas en un buffer circular de
+    contadores por segundo. Con eso se obtiene el TPS de 1s/10s/60s/5m sin
+    volver a consultar la base de datos.
+
+    Fuentes soportadas:
+        - FuenteSQLServer → dbo.messagelog (GW_TPS.py). Marca de agua por SendTime;
+          los buckets usan el reloj de SQL Server y los últimos segundos se
+          releen en cada sondeo para incluir commits tardíos.
+        - FuenteSQLite    → MessageOut en MessageLog.sqlite (SMS_GW_Status.py).
+          Marca de agua por rowid; las filas nuevas se reparten entre los
+          segundos transcurridos desde el sondeo anterior. El buffer empieza
+          vacío: hasta cubrir la ventana, el TPS se calcula sobre los
+          segundos cubiertos.
+
+    El motor está pensado para ejecutarse dentro de un proceso residente
+    (monitor_daemon.py); también puede ejecutarse solo para inspección.
+
+Uso:
+    python tps_incremental.py --sqlite <MessageLog.sqlite> [--intervalo 1]
+    python tps_incremental.py --sqlserver [--intervalo 1]
+
+Dependencias:
+    - Python 3.x
+    - sqlite3 (incluido en la librería estándar)
+    - pyodbc (solo para la fuente SQL Server)
+"""
+
+import sys
+import time
+import argparse
+import threading
+
+from sqlite_ro import conectar_ro
+from monitor_comun import STATE_OK, STATE_WARNING, STATE_CRITICAL, STATE_UNKNOWN
+
+CAPACIDAD = 300                 # segundos guardados en el buffer (5 minutos)
+VENTANAS = (1, 10, 60, 300)     # ventanas reportadas, en segundos
+MARGEN_SQLSERVER = 5            # segundos que se releen en cada sondeo de SQL Server
+SONDEOS_VENCIDO = 3             # sondeos sin éxito tras los cuales el buffer se considera vencido
+
+warning_threshold = 4
+critical_threshold = 1
+
+
+class VentanaTPS:
+    """
+    Buffer circular de contadores por segundo para cada gateway.
+    Cada posición guarda el segundo (epoch) al que pertenece, de modo que
+    las posiciones antiguas se reconocen y se ignoran sin recorrer el buffer.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self._conteos = {}
+        self._segundos = {}
+
+    def _slots(self, gateway):
+        conteos = self._conteos.get(gateway)
+        if conteos is None:
+            conteos = self._conteos[gateway] = [0] * self.capacidad
+            self._segundos[gateway] = [-1] * self.capacidad
+        return conteos, self._segundos[gateway]
+
+    def sumar(self, gateway, segundo, cantidad):
+        conteos, segundos = self._slots(gateway)
+        i = segundo % self.capacidad
+        if segundos[i] != segundo:
+            segundos[i] = segundo
+            conteos[i] = 0
+        conteos[i] += cantidad
+
+    def fijar(self, gateway, segundo, cantidad):
+        """
+        Reemplaza el contador de un segundo (relecturas idempotentes).
+        """
+        conteos, segundos = self._slots(gateway)
+        i = segundo % self.capacidad
+        segundos[i] = segundo
+        conteos[i] = cantidad
+
+    def total(self, gateway, ventana, ahora):
+        """
+        Suma de mensajes del gateway en los segundos (ahora - ventana, ahora].
+        """
+        if gateway not in self._conteos:
+            return 0
+        conteos, segundos = self._conteos[gateway], self._segundos[gateway]
+        ventana = min(ventana, self.capacidad)
+        total = 0
+        for segundo in range(ahora - ventana + 1, ahora + 1):
+            i = segundo % self.capacidad
+            if segundos[i] == segundo:
+                total += conteos[i]
+        return total
+
+    def gateways(self):
+        return list(self._conteos)
+
+
+class _Fuente:
+    """
+    Base de las fuentes: mantiene la ventana, el último segundo sondeado y
+    el segundo desde el que el buffer tiene datos (`inicio`, exclusivo).
+    """
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.ventana = VentanaTPS(capacidad)
+        self.ahora = None
+        self.inicio = None
+        self.ultimo_sondeo = None
+        self._lock = threading.Lock()
+
+    def _cubierto(self, segundos):
+        return max(0, min(segundos, self.ventana.capacidad, self.ahora - self.inicio))
+
+    def cubierto(self, segundos):
+        """
+        Segundos de la ventana indicada que el buffer ya cubre (menos que la
+        ventana tras el arranque o una recarga del daemon), o 0 sin sondeos.
+        """
+        with self._lock:
+            if self.ahora is None:
+                return 0
+            return self._cubierto(segundos)
+
+    def _tps(self, gateway, segundos):
+        cubierto = self._cubierto(segundos)
+        if not cubierto:
+            return None
+        return self.ventana.total(gateway, segundos, self.ahora) / float(cubierto)
+
+    def tps(self, gateway, segundos):
+        """
+        TPS del gateway en la ventana indicada, sobre los segundos que el
+        buffer cubre; None si aún no cubre ninguno.
+        """
+        with self._lock:
+            if self.ahora is None:
+                return None
+            return self._tps(str(gateway), segundos)
+
+    def resumen(self, ventanas=VENTANAS):
+        """
+        Devuelve {gateway: {ventana: tps}} para todos los gateways vistos.
+        """
+        with self._lock:
+            if self.ahora is None:
+                return {}
+            return {
+                gateway: {v: self._tps(gateway, v) for v in ventanas}
+                for gateway in self.ventana.gateways()
+            }
+
+    def actualizar(self):
+        with self._lock:
+            self._actualizar()
+            self.ultimo_sondeo = time.time()
+
+    def cerrar(self):
+        with self._lock:
+            self._cerrar()
+
+
+class FuenteSQLServer(_Fuente):
+    """
+    Fuente incremental sobre dbo.messagelog a través de sqlserver_db.SQLServerDB.
+    """
+
+    ahora_query = "SELECT DATEDIFF(second, '19700101', GETDATE());"
+    conteo_query = """
+        SELECT Gateway, DATEDIFF(second, '19700101', SendTime) AS segundo, COUNT(*)
+        FROM dbo.messagelog
+        WHERE SendTime >= DATEADD(second, ?, '19700101')
+        GROUP BY Gateway, DATEDIFF(second, '19700101', SendTime);
+    """
+
+    def __init__(self, db, capacidad=CAPACIDAD, margen=MARGEN_SQLSERVER):
+        super().__init__(capacidad)
+        self.db = db
+        self.margen = margen
+        self.marca = None
+
+    def _actualizar(self):
+        filas, _ = self.db.consulta(self.ahora_query)
+        ahora = int(filas[0][0])
+        if self.marca is None:
+            # Primer sondeo: se carga el buffer completo una sola vez
+            self.marca = ahora - self.ventana.capacidad + 1
+            self.inicio = ahora - self.ventana.capacidad
+
+        filas, _ = self.db.consulta(self.conteo_query, (self.marca,))
+        for gateway, segundo, cantidad in filas:
+            self.ventana.fijar(str(gateway), int(segundo), int(cantidad))
+
+        self.ahora = ahora
+        self.marca = ahora - self.margen
+
+    def _cerrar(self):
+        self.db.cerrar()
+
+
+class FuenteSQLite(_Fuente):
+    """
+    Fuente incremental sobre MessageOut (MessageLog.sqlite) por rowid.
+    """
+
+    maximo_query = "SELECT MAX(rowid) FROM MessageOut;"
+    conteo_query = """
+        SELECT GatewayId, COUNT(*), MAX(rowid)
+        FROM MessageOut
+        WHERE rowid > ?
+        GROUP BY GatewayId;
+    """
+
+    def __init__(self, conn, capacidad=CAPACIDAD):
+        super().__init__(capacidad)
+        self.conn = conn
+        self.marca = None
+
+    def _actualizar(self):
+        ahora = int(time.time())
+        if self.marca is None:
+            # Primer sondeo: solo se fija la marca; el historial se acumula desde aquí
+            self.marca = self.conn.execute(self.maximo_query).fetchone()[0] or 0
+            self.ahora = self.inicio = ahora
+            return
+
+        filas = self.conn.execute(self.conteo_query, (self.marca,)).fetchall()
+        anterior = self.ahora if self.ahora is not None else ahora - 1
+        transcurridos = max(1, min(ahora - anterior, self.ventana.capacidad))
+        for gateway, cantidad, maximo in filas:
+            # Reparte las filas nuevas entre los segundos transcurridos
+            base, resto = divmod(int(cantidad), transcurridos)
+            for k in range(transcurridos):
+                segundo = ahora - transcurridos + 1 + k
+                n = base + (1 if k < resto else 0)
+                if n:
+                    self.ventana.sumar(str(gateway), segundo, n)
+            self.marca = max(self.marca, maximo)
+        self.ahora = ahora
+
+    def _cerrar(self):
+        self.conn.close()
+
+
+class MotorTPS:
+    """
+    Ejecuta el sondeo de una fuente en un hilo de fondo cada `intervalo` segundos.
+    """
+
+    def __init__(self, fuente, intervalo=1.0):
+        self.fuente = fuente
+        self.intervalo = intervalo
+        self.error = None
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._bucle, name='tps_incremental', daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """
+        Detiene el sondeo y cierra las conexiones de la fuente. Si el sondeo
+        en curso no termina a tiempo, la fuente queda abierta para no cerrar
+        una conexión en uso; el hilo es daemon y termina con el proceso.
+        """
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=max(self.intervalo, 1.0) * 2)
+            if self._hilo.is_alive():
+                return
+        self.fuente.cerrar()
+
+    def edad(self):
+        """
+        Segundos desde el último sondeo exitoso, o None si no hubo ninguno.
+        """
+        ultimo = self.fuente.ultimo_sondeo
+        return None if ultimo is None else time.time() - ultimo
+
+    def vencimiento(self, ventana):
+        """
+        Edad máxima del buffer para evaluar `ventana`: la ventana misma o
+        SONDEOS_VENCIDO sondeos, lo que sea menor, pero nunca menos de dos
+        sondeos (un sondeo lento no debe dar UNKNOWN).
+        """
+        return max(2 * self.intervalo, min(ventana, SONDEOS_VENCIDO * self.intervalo))
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            inicio = time.monotonic()
+            try:
+                self.fuente.actualizar()
+                self.error = None
+            except Exception as e:
+                self.error = e
+            self._detener.wait(max(0.0, self.intervalo - (time.monotonic() - inicio)))
+
+
+# -- Check servido desde el motor (monitor_daemon.py) ------------------------
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="TPS incremental por gateway desde el buffer en memoria.")
+    parser.add_argument("gateway_name", help="Nombre (SQL Server) o GatewayId (SQLite) del gateway.")
+    parser.add_argument("--ventana", type=int, default=60, choices=VENTANAS,
+                        help="Ventana evaluada contra los umbrales, en segundos (default: 60).")
+    parser.add_argument("--warning", type=float, default=warning_threshold,
+                        help=f"Umbral de advertencia (default: {warning_threshold}).")
+    parser.add_argument("--critical", type=float, default=critical_threshold,
+                        help=f"Umbral crítico (default: {critical_threshold}).")
+    return parser
+
+
+def ejecutar_check(motor, args):
+    """
+    Evalúa el TPS del gateway desde el buffer y devuelve (estado, salida).
+    """
+    fuente = motor.fuente
+    if fuente.ahora is None:
+        if motor.error is not None:
+            return STATE_UNKNOWN, f"UNKNOWN: Error en el sondeo incremental de TPS: {motor.error}"
+        return STATE_UNKNOWN, "UNKNOWN: El motor de TPS incremental aún no completa su primer sondeo."
+
+    # Con el sondeo fallando, el buffer ya no representa la ventana evaluada
+    edad = motor.edad()
+    if edad is not None and edad > motor.vencimiento(args.ventana):
+        detalle = f": {motor.error}" if motor.error is not None else ""
+        return STATE_UNKNOWN, (f"UNKNOWN: El buffer de TPS incremental tiene {edad:.0f} s sin "
+                               f"sondeos exitosos{detalle}")
+
+    # Tras el arranque (la fuente SQLite empieza con el buffer vacío) el TPS
+    # se calcula sobre los segundos cubiertos, no sobre la ventana completa
+    cubierto = fuente.cubierto(args.ventana)
+    if not cubierto:
+        return STATE_UNKNOWN, "UNKNOWN: El buffer de TPS incremental aún no cubre ningún segundo."
+
+    valores = {v: fuente.tps(args.gateway_name, v) for v in VENTANAS}
+    tps = valores[args.ventana]
+    perfdata = []
+    for v in VENTANAS:
+        if valores[v] is None:
+            continue
+        etiqueta = f"tps_{v}s" if v < 300 else "tps_5m"
+        umbrales = f"{args.warning:g};{args.critical:g}" if v == args.ventana else ";"
+        perfdata.append(f"{etiqueta}={valores[v]:.2f};{umbrales};0;")
+    performance_data = " ".join(perfdata)
+
+    aviso = ""
+    if cubierto < args.ventana:
+        aviso = f" (ventana de {args.ventana} s con {cubierto} s de datos)"
+    if motor.error is not None:
+        aviso += f" (último sondeo con error: {motor.error})"
+    if tps < args.critical:
+        return STATE_CRITICAL, f"CRITICAL: {tps:.2f} TPS en gateway {args.gateway_name}{aviso} | {performance_data}"
+    elif tps < args.warning:
+        return STATE_WARNING, f"WARNING: {tps:.2f} TPS en gateway {args.gateway_name}{aviso} | {performance_data}"
+    return STATE_OK, f"OK: {tps:.2f} TPS en gateway {args.gateway_name}{aviso} | {performance_data}"
+
+
+def motor_desde_config(config):
+    """
+    Crea el motor según la sección [tps_incremental] de Setting.ini:
+        fuente = sqlserver | sqlite   (default: sqlserver)
+        intervalo = 1                 (segundos entre sondeos)
+        capacidad = 300               (segundos guardados en el buffer)
+        db_path = ...                 (solo sqlite; default: ruta de SMS_GW_Status.py)
+    El motor usa sus propias conexiones, independientes de las de los checks.
+    Devuelve None si la fuente no puede configurarse.
+    """
+    tipo = config.get('tps_incremental', 'fuente', fallback='sqlserver')
+    intervalo = config.getfloat('tps_incremental', 'intervalo', fallback=1.0)
+    capacidad = config.getint('tps_incremental', 'capacidad', fallback=CAPACIDAD)
+
+    if tipo == 'sqlite':
+        import SMS_GW_Status
+        db_path = config.get('tps_incremental', 'db_path', fallback=SMS_GW_Status.db_path)
+        conn = conectar_ro(db_path, check_same_thread=False)
+        fuente = FuenteSQLite(conn, capacidad=capacidad)
+    else:
+        import GW_TPS
+        from sqlserver_db import SQLServerDB
+        conn_str = GW_TPS.cadena_conexion(config)
+        if conn_str is None:
+            return None
+        fuente = FuenteSQLServer(SQLServerDB(conn_str, pool_size=1), capacidad=capacidad)
+    return MotorTPS(fuente, intervalo=intervalo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Muestra el TPS incremental por gateway en cada sondeo.")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--sqlite", metavar="DB_PATH", help="Ruta de MessageLog.sqlite.")
+    grupo.add_argument("--sqlserver", action='store_true', help="Usar la sección [sqlodbc] de Setting.ini.")
+    parser.add_argument("--intervalo", type=float, default=1.0, help="Segundos entre sondeos (default: 1).")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        conn = conectar_ro(args.sqlite)
+        fuente = FuenteSQLite(conn)
+    else:
+        from monitor_comun import DB_CONFIG_PATH, leer_configuracion
+        from sqlserver_db import db_desde_config
+        import GW_TPS
+        db_config = leer_configuracion(DB_CONFIG_PATH)
+        conn_str = GW_TPS.cadena_conexion(db_config)
+        if conn_str is None:
+            print("ERROR: No se encontró la sección 'sqlodbc' en el archivo de configuración.")
+            sys.exit(1)
+        fuente = FuenteSQLServer(db_desde_config(db_config, conn_str))
+
+    try:
+        while True:
+            fuente.actualizar()
+            for gateway, valores in sorted(fuente.resumen().items()):
+                print(f"{gateway}: " + "  ".join(f"{v}s={t:.2f}" for v, t in valores.items() if t is not None))
+            print("-" * 40)
+            time.sleep(args.intervalo)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()